@@ -0,0 +1,207 @@
+"""Offline benchmarks for the detection and analytics hot paths in main.py.
+
+Runs each hot function against synthetic P2P order books (1k to 1M ads,
+several sources, configurable churn between snapshots) and reports wall
+time, throughput and tracemalloc peak memory, compared to a stored baseline.
+
+    python benchmark.py                       # all sizes, compare to benchmark_baseline.json
+    python benchmark.py --sizes 1000,10000    # quick subset
+    python benchmark.py --save-baseline       # record these numbers as the new baseline
+
+Everything runs in a throwaway directory, so no state files in the repo are touched.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import main
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+SOURCES = {'BINANCE': 0.5, 'MEXC': 0.2, 'OKX': 0.3}  # Share of ads per source
+PEG = 1.0
+OFFICIAL = 155.0
+
+# --- SYNTHETIC ORDER BOOKS ---
+def synthetic_book(n, rng, sources=SOURCES):
+    """n ads spread over sources; roughly 3 ads per advertiser, prices around 180 ETB"""
+    names = list(sources)
+    weights = [sources[name] for name in names]
+    advertisers = max(n // 3, 1)
+    book = []
+    for i in range(n):
+        ad_type = 'SELL' if rng.random() < 0.6 else 'BUY'
+        mid = 182.0 if ad_type == 'SELL' else 178.0
+        book.append({
+            'source': rng.choices(names, weights)[0],
+            'ad_type': ad_type,
+            'advertiser': f"trader{rng.randrange(advertisers)}",
+            'price': round(rng.gauss(mid, 3.0), 2),
+            'available': round(rng.lognormvariate(6.0, 1.2), 2)
+        })
+    return book
+
+def churn_book(book, rng, fills=0.05, reprices=0.02, new_ads=0.02, removals=0.01):
+    """Next snapshot of a book: partial fills, reprices, delisted and newly posted ads"""
+    out = []
+    for ad in book:
+        roll = rng.random()
+        if roll < removals:
+            continue
+        ad = dict(ad)
+        if roll < removals + fills:
+            ad['available'] = round(ad['available'] * rng.uniform(0.2, 0.95), 2)
+        elif roll < removals + fills + reprices:
+            ad['price'] = round(ad['price'] + rng.choice([-0.5, -0.1, 0.1, 0.5]), 2)
+        out.append(ad)
+    out.extend(synthetic_book(int(len(book) * new_ads), rng))
+    return out
+
+def grouped(book):
+    groups = {source: [] for source in SOURCES}
+    for ad in book:
+        groups[ad['source']].append(ad)
+    return groups
+
+# --- BENCHMARKS ---
+# Each benchmark: setup(ctx) runs untimed before every repetition, run(ctx) is measured.
+def _reset_outputs(ctx):
+    main._artifact_hashes = {}
+    main._section_cache.clear()
+
+def _prime_snapshot(ctx):
+    main._artifact_hashes = {}
+    main.save_market_state(ctx['book'])
+
+def _clear_trades(ctx):
+    main._artifact_hashes = {}
+    if os.path.exists(main.TRADES_FILE):
+        os.remove(main.TRADES_FILE)
+
+def _render(ctx):
+    book = ctx['churned']
+    stats = main.analyze([ad['price'] for ad in book], PEG)
+    ladder = main.calculate_slippage_ladder(main.build_liquidity_book(book, PEG))
+    main.update_website_html(stats, OFFICIAL, "BENCH", book, grouped(book), PEG, slippage_ladder=ladder)
+
+BENCHMARKS = [
+    {'name': 'analyze', 'run': lambda ctx: main.analyze([ad['price'] for ad in ctx['book']], PEG)},
+    {'name': 'remove_outliers', 'run': lambda ctx: [main.remove_outliers(ads, PEG) for ads in grouped(ctx['book']).values()]},
+    {'name': 'detect_real_trades', 'setup': _prime_snapshot, 'run': lambda ctx: main.detect_real_trades(ctx['churned'], PEG)},
+    {'name': 'calculate_market_depth_by_price', 'run': lambda ctx: main.calculate_market_depth_by_price(ctx['book'], PEG)},
+    {'name': 'save_trades', 'setup': _clear_trades, 'run': lambda ctx: main.save_trades(ctx['trades'])},
+    {'name': 'update_website_html', 'setup': _reset_outputs, 'run': _render}
+]
+
+def measure(bench, ctx, repeats):
+    """Best-of-N wall time, then one extra run under tracemalloc for the peak"""
+    setup = bench.get('setup')
+    best = float('inf')
+    for _ in range(repeats):
+        if setup:
+            setup(ctx)
+        start = time.perf_counter()
+        bench['run'](ctx)
+        best = min(best, time.perf_counter() - start)
+
+    if setup:
+        setup(ctx)
+    tracemalloc.start()
+    bench['run'](ctx)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'ads_per_sec': ctx['n'] / best if best > 0 else 0, 'peak_kb': peak / 1024}
+
+def run_suite(sizes, repeats, seed, only=None):
+    results = {}
+    for n in sizes:
+        rng = random.Random(seed + n)
+        book = synthetic_book(n, rng)
+        churned = churn_book(book, rng)
+
+        # Detected events from this churn are the save_trades workload
+        with open(os.devnull, "w") as sink, contextlib.redirect_stderr(sink):
+            main.save_market_state(book)
+            trades = main.detect_real_trades(churned, PEG)
+        ctx = {'n': n, 'book': book, 'churned': churned, 'trades': trades}
+
+        print(f"📦 {n:,} ads ({len(trades):,} events after churn)", file=sys.stderr)
+        for bench in BENCHMARKS:
+            if only and bench['name'] not in only:
+                continue
+            reps = repeats if n < 1000000 else 1
+            with open(os.devnull, "w") as sink, contextlib.redirect_stderr(sink):
+                result = measure(bench, ctx, reps)
+            results[f"{bench['name']}@{n}"] = result
+            print(f"   {bench['name']:<34} {result['seconds']*1000:>10.1f} ms  {result['ads_per_sec']:>12,.0f} ads/s  {result['peak_kb']:>10,.0f} KB peak", file=sys.stderr)
+
+    with open(os.devnull, "w") as sink, contextlib.redirect_stderr(sink):
+        main.finish_precompression()
+    return results
+
+def compare(results, baseline, max_regression):
+    """Print current vs baseline; return the keys that got slower than max_regression×"""
+    regressions = []
+    print(f"\n📊 vs baseline ({baseline.get('recorded_at', 'unknown')}):", file=sys.stderr)
+    for key, result in results.items():
+        base = baseline.get('results', {}).get(key)
+        if not base:
+            print(f"   {key:<45} (no baseline)", file=sys.stderr)
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] > 0 else 1
+        mem_ratio = result['peak_kb'] / base['peak_kb'] if base['peak_kb'] > 0 else 1
+        flag = "🔴" if ratio > max_regression else "🟢" if ratio < 1 / max_regression else "⚪"
+        print(f"   {flag} {key:<43} time {ratio:>5.2f}×  memory {mem_ratio:>5.2f}×", file=sys.stderr)
+        if ratio > max_regression:
+            regressions.append(key)
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark main.py hot paths on synthetic order books")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="Comma-separated ad counts")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per benchmark (best is kept; 1 at 1M ads)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="Fail when a benchmark is this much slower than baseline")
+    args = parser.parse_args()
+
+    sizes = [int(n) for n in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="etb-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            results = run_suite(sizes, args.repeats, args.seed, only)
+        finally:
+            os.chdir(cwd)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({'recorded_at': time.strftime("%Y-%m-%d %H:%M:%S"), 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"\n💾 Baseline saved to {BASELINE_FILE}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(BASELINE_FILE):
+        print("\n📋 No baseline yet; run with --save-baseline to record one", file=sys.stderr)
+        return 0
+
+    with open(BASELINE_FILE, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.max_regression)
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed beyond {args.max_regression}×", file=sys.stderr)
+        return 1
+    print("\n✅ No regressions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
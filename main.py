@@ -12,6 +12,8 @@
 """
 
 import requests
+import argparse
+import base64
 import statistics
 import sys
 import time
@@ -21,17 +23,38 @@ import datetime
 import json
 import random
 import re
-from concurrent.futures import ThreadPoolExecutor
+import bisect
+import math
+import hashlib
+import heapq
+import glob
+import gzip
+import importlib.util
+import io
+import multiprocessing
+import threading
+import tracemalloc
+import http.server
+import asyncio
+import contextvars
+import struct
+from array import array
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlencode, parse_qsl
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
-# Try importing matplotlib
+# Matplotlib is only imported inside the chart workers; here we just check it exists
+GRAPH_ENABLED = importlib.util.find_spec("matplotlib") is not None
+if not GRAPH_ENABLED:
+    print("⚠️ Matplotlib not found.", file=sys.stderr)
+
+# Brotli is optional: without it only .gz siblings are written
 try:
-    import matplotlib.pyplot as plt
-    import matplotlib.dates as mdates
-    import matplotlib.ticker as ticker
-    GRAPH_ENABLED = True
+    import brotli
+    BROTLI_ENABLED = True
 except ImportError:
-    GRAPH_ENABLED = False
-    print("⚠️ Matplotlib not found.", file=sys.stderr)
+    BROTLI_ENABLED = False
 
 # --- CONFIGURATION ---
 # API Keys from environment variables with fallbacks
@@ -43,15 +66,73 @@ HISTORY_FILE = "etb_history.csv"
 SNAPSHOT_FILE = "market_state.json"
 TRADES_FILE = "recent_trades.json"
 AI_SUMMARY_FILE = "ai_summary.json"
+AI_CONTEXT_FILE = "ai_context.json"
+SKETCH_FILE = "price_sketches.json"
+INDICATOR_FILE = "indicator_state.json"
+ANOMALY_FILE = "anomaly_state.json"
+ARBITRAGE_FILE = "arbitrage_state.json"
+PRECOMPRESS_FILE = "precompress_state.json"
+ARTIFACT_STATE_FILE = "artifact_state.json"
+METRICS_FILE = "run_metrics.json"
+PROFILE_HOT_FILE = "profile_hot.txt"
+PROFILE_ALLOC_FILE = "profile_alloc.txt"
+PROFILE_STACKS_FILE = "profile_stacks.collapsed"
 GRAPH_FILENAME = "etb_neon_terminal.png"
 GRAPH_LIGHT_FILENAME = "etb_light_terminal.png"
 HTML_FILENAME = "index.html"
+ASSET_DIR = "assets"
+DATA_DIR = "data"
 
 BURST_WAIT_TIME = 45
 TRADE_RETENTION_MINUTES = 1440  # 24 hours
 MAX_ADS_PER_SOURCE = 200
 HISTORY_POINTS = 288
 MAX_SINGLE_TRADE = 50000
+TRADE_BUCKET_SECONDS = 3600  # One data/trades-<bucket>.json chunk per hour
+FEED_PRICE_SCALE = 100  # Fixed-point prices in the columnar trade feed
+SLIPPAGE_LADDER = [100, 1000, 10000, 50000]  # USDT ticket sizes for effective-rate quotes
+ARB_MIN_SPREAD_PCT = 0.3  # Crossed spreads thinner than this are eaten by fees
+FEED_EVENT_TYPES = ['buy', 'sell', 'request', 'arbitrage', 'anomaly']
+FEED_PAGE_SIZE = 50  # Events rendered per feed page (server-side first page + each lazy page)
+SKETCH_K = 128  # KLL accuracy parameter (~1% rank error)
+SKETCH_BUCKET_SECONDS = 3600
+SKETCH_RETENTION_SECONDS = 7 * 86400 + 3600
+SKETCH_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400}
+EWMA_SPANS = {'1h': 12, '4h': 48, '24h': 288}  # In history points (one per 5-min run)
+ROC_WINDOWS = {'1h': 12, '4h': 48, '24h': 288}
+VOLATILITY_WINDOW = 48
+ANOMALY_WINDOW = 40  # Snapshots kept per metric for the rolling z-score
+ANOMALY_MIN_SAMPLES = 8
+ANOMALY_Z = 3.0
+ANOMALY_STD_FLOOR_PCT = 1.0  # Std never below this % of the mean, so a flat window (page-capped ad counts) still scores a step
+ANOMALY_MIN_MOVE_PCT = {'median': 1.0, 'depth': 40.0, 'ads': 30.0}
+AI_MAX_AGE = 6 * 3600  # Regenerate at least this often, however quiet the market
+AI_JOIN_TIMEOUT = 2  # Short grace period at the end of a run for a summary that is nearly done; never longer
+AI_REFRESH_THRESHOLDS = {  # ...and sooner once any input moves this far from generation time
+    'median_pct': 1.0,  # % move in the median rate
+    'premium_pts': 1.5,  # Percentage-point move in the black market premium
+    'buy_sell_ratio_pct': 30.0,  # % move in the 24h buy/sell volume ratio
+    'trend': True  # Any change of EWMA trend direction
+}
+PRECOMPRESS_EXTENSIONS = ('.html', '.json', '.css', '.js')  # PNGs are already deflated
+PRECOMPRESS_WORKERS = 2
+PROM_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]  # Seconds
+PROM_SNAPSHOT_BUCKETS = [1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0, 120.0]
+PUSH_REPLAY_SIZE = 1000  # Recent events kept for clients reconnecting with Last-Event-ID / ?since=
+PUSH_CLIENT_QUEUE = 256  # Undelivered events per client before it is dropped as too slow
+PUSH_HEARTBEAT = 15  # Seconds of silence before a keep-alive (SSE comment / WebSocket ping)
+API_CACHE_SIZE = 512  # Serialized responses kept (LRU), each valid until its market publishes again
+API_MAX_TRADES = 5000  # Cap on events per /trades response
+API_RESOURCES = ('stats', 'depth', 'history', 'trades')  # Per-market routes under /api/<market>/
+PUSH_PUBLIC_URL = os.environ.get("ETB_PUSH_URL", "")  # Push server as seen from the dashboard; empty = polling only
+PROFILE_SAMPLE_INTERVAL = 0.01  # Seconds between stack samples in --profile mode
+PROFILE_TRACE_FRAMES = 1  # tracemalloc frames per allocation; 1 keeps overhead low
+PROFILE_TOP = 40  # Rows in the hot-function and allocation reports
+METRICS_HISTORY = 288  # Past runs kept in run_metrics.json (24h at one run per 5 min)
+CHART_THEMES = {
+    GRAPH_FILENAME: {'bg': '#000000', 'card': '#1C1C1E', 'text': '#FFFFFF', 'muted': '#8E8E93', 'grid': '#38383A', 'median': '#00C805', 'band': '#0A84FF', 'official': '#FF9500'},
+    GRAPH_LIGHT_FILENAME: {'bg': '#F2F2F7', 'card': '#FFFFFF', 'text': '#000000', 'muted': '#8E8E93', 'grid': '#C6C6C8', 'median': '#34C759', 'band': '#007AFF', 'official': '#FF9500'}
+}
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
@@ -59,33 +140,830 @@ HEADERS = {
     "Accept": "application/json"
 }
 
+NUM_SNAPSHOTS = 8
+WAIT_TIME = 15
+HOST_CONCURRENCY = {  # In-flight requests per upstream host, shared by every market
+    'binance-p2p-api.p.rapidapi.com': 3,
+    'mexc-p2p-api.p.rapidapi.com': 4,
+    'p2p.army': 6
+}
+DEFAULT_HOST_CONCURRENCY = 8
+SHARD_WORKERS = int(os.environ.get("ETB_SHARDS", "0") or 0)  # Detection/analytics worker processes (0 = inline)
+WORKER_START_METHOD = "forkserver"  # Pools start after HTTP/AI threads are running; forking those can deadlock
+SHARED_FETCH_TTL = 60  # Seconds market-independent lookups (USD rates, USDT peg) are shared
+
+# --- MARKETS ---
+# One entry per fiat/asset pair. ETB keeps the top-level file names; every other
+# market writes its state, page, assets and feed under its own namespace directory.
+MARKETS = {
+    'ETB': {
+        'code': 'ETB', 'fiat': 'ETB', 'asset': 'USDT', 'flag': '🇪🇹', 'demonym': 'Ethiopian',
+        'central_bank': 'NBE', 'price_band': (10, 500), 'mexc_currency_id': '58', 'namespace': '',
+        'context': [
+            "Ethiopia recently unified exchange rates (March 2024)",
+            "IMF monitoring economic reforms",
+            "Diaspora remittances are major USD source",
+            "Foreign currency shortage affects businesses"
+        ],
+        'official_factors': [
+            "NBE monetary policy and forex reserves",
+            "IMF program requirements and reform timeline"
+        ]
+    },
+    'KES': {
+        'code': 'KES', 'fiat': 'KES', 'asset': 'USDT', 'flag': '🇰🇪', 'demonym': 'Kenyan',
+        'central_bank': 'CBK', 'price_band': (50, 400), 'mexc_currency_id': None, 'namespace': 'markets/kes',
+        'context': [
+            "The shilling floats freely; CBK intervenes to smooth volatility",
+            "Diaspora remittances and M-Pesa rails drive retail USD flows"
+        ],
+        'official_factors': [
+            "CBK monetary policy and forex reserves",
+            "Eurobond repayments and external debt service"
+        ]
+    },
+    'NGN': {
+        'code': 'NGN', 'fiat': 'NGN', 'asset': 'USDT', 'flag': '🇳🇬', 'demonym': 'Nigerian',
+        'central_bank': 'CBN', 'price_band': (500, 5000), 'mexc_currency_id': None, 'namespace': 'markets/ngn',
+        'context': [
+            "CBN unified the official and parallel FX windows in 2023",
+            "Oil export receipts and CBN FX sales drive official liquidity"
+        ],
+        'official_factors': [
+            "CBN monetary policy and forex reserves",
+            "Oil export receipts and CBN FX interventions"
+        ]
+    }
+}
+DEFAULT_MARKET = 'ETB'
+_market = contextvars.ContextVar('market', default=DEFAULT_MARKET)
+
+def current_market():
+    return MARKETS[_market.get()]
+
+def market_path(name):
+    """Namespace a per-market file or directory name"""
+    namespace = current_market()['namespace']
+    return os.path.join(namespace, name) if namespace else name
+
+def run_in_market(code, fn, *args):
+    """Call fn(*args) with `code` as the current market"""
+    token = _market.set(code)
+    try:
+        return fn(*args)
+    finally:
+        _market.reset(token)
+
+def submit_in_market(ex, fn, *args):
+    """Executor submit that carries the caller's market into the worker thread"""
+    return ex.submit(contextvars.copy_context().run, fn, *args)
+
+# --- INSTRUMENTATION ---
+_metrics = {'started': time.perf_counter(), 'spans': {}, 'counters': {}}
+_metrics_lock = threading.Lock()
+
+def record_span(name, ms):
+    with _metrics_lock:
+        entry = _metrics['spans'].setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += ms
+        entry['max_ms'] = max(entry['max_ms'], ms)
+
+def count_metric(name, n=1):
+    with _metrics_lock:
+        _metrics['counters'][name] = _metrics['counters'].get(name, 0) + n
+
+@contextmanager
+def span(name):
+    """Time a block on the monotonic clock; repeated spans of one name aggregate"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, (time.perf_counter() - start) * 1000)
+
+def timed(name, fn, *args):
+    """Call fn(*args) inside a span (for thread pool submits)"""
+    with span(name):
+        return fn(*args)
+
+def http_request(method, url, **kwargs):
+    """Shared-session request with per-host timing, request, byte and error counts.
+    
+    Goes through the configured transport, so a recorded run can be replayed offline.
+    Concurrent markets queue on a per-host slot instead of each opening its own burst.
+    """
+    host = urlsplit(url).hostname or "unknown"
+    with host_slot(host):
+        start = time.perf_counter()
+        with span(f"http.{host}"):
+            try:
+                if HTTP['mode'] == 'replay':
+                    r = replay_response(method, url, host, kwargs)
+                elif HTTP['mode'] == 'record':
+                    r = record_response(method, url, host, kwargs)
+                else:
+                    r = HTTP['session'].request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                count_metric(f"http.{host}.failures")
+                raise
+            finally:
+                prom_observe("etb_upstream_request_seconds", time.perf_counter() - start, {'host': host})
+    count_metric(f"http.{host}.requests")
+    count_metric(f"http.{host}.bytes", len(r.content))
+    if r.status_code >= 400:
+        count_metric(f"http.{host}.status_{r.status_code}")
+    return r
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def host_slot(host):
+    """Semaphore bounding in-flight requests to one upstream host across all markets"""
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY))
+    return slot
+
+_shared_fetches = {}
+_shared_fetch_locks = {}
+_shared_fetches_lock = threading.Lock()
+
+def shared_fetch(key, fn):
+    """Result of fn() shared by every market for SHARED_FETCH_TTL seconds (None is not cached)
+    
+    Markets asking for the same key wait on its fetch; different keys fetch in parallel.
+    """
+    with _shared_fetches_lock:
+        lock = _shared_fetch_locks.get(key)
+        if lock is None:
+            lock = _shared_fetch_locks[key] = threading.Lock()
+    with lock:
+        cached = _shared_fetches.get(key)
+        if cached and time.time() - cached[0] < SHARED_FETCH_TTL:
+            return cached[1]
+        value = fn()
+        if value is not None:
+            _shared_fetches[key] = (time.time(), value)
+        return value
+
+def reset_run_metrics():
+    """Start a fresh span/counter window (daemon mode runs main() repeatedly)"""
+    with _metrics_lock:
+        _metrics['started'] = time.perf_counter()
+        _metrics['spans'] = {}
+        _metrics['counters'] = {}
+
+def save_run_metrics():
+    """Write this run's spans/counters to run_metrics.json with a rolling per-run history"""
+    total_ms = (time.perf_counter() - _metrics['started']) * 1000
+    run = {
+        'finished_at': datetime.datetime.now().isoformat(),
+        'total_ms': round(total_ms, 1),
+        'spans': {
+            name: {'count': e['count'], 'total_ms': round(e['total_ms'], 1), 'max_ms': round(e['max_ms'], 1)}
+            for name, e in sorted(_metrics['spans'].items())
+        },
+        'counters': dict(sorted(_metrics['counters'].items()))
+    }
+    
+    history = []
+    if os.path.exists(METRICS_FILE):
+        try:
+            with open(METRICS_FILE, 'r') as f:
+                history = json.load(f).get('history', [])
+        except:
+            history = []
+    
+    history.append({
+        'finished_at': run['finished_at'],
+        'total_ms': run['total_ms'],
+        'spans': {name: e['total_ms'] for name, e in run['spans'].items()},
+        'http_bytes': sum(v for k, v in run['counters'].items() if k.endswith('.bytes')),
+        'http_requests': sum(v for k, v in run['counters'].items() if k.endswith('.requests'))
+    })
+    
+    write_artifact(METRICS_FILE, {'latest': run, 'history': history[-METRICS_HISTORY:]})
+    prom_set("etb_run_seconds", round(total_ms / 1000, 3))
+    prom_set("etb_last_run_timestamp_seconds", round(time.time(), 3))
+    
+    slowest = sorted(run['spans'].items(), key=lambda item: -item[1]['total_ms'])[:3]
+    print(f"   ⏱️ Run took {total_ms/1000:.1f}s; slowest: " + ", ".join(f"{name} {e['total_ms']/1000:.1f}s" for name, e in slowest), file=sys.stderr)
+
+# --- HTTP TRANSPORT ---
+# Every upstream call shares one pooled session. In record mode each response
+# (body, status, latency) is captured per host into a gzip fixture archive; in
+# replay mode those fixtures are served back with sampled latencies and
+# optional injected 429/5xx errors, so whole runs can be profiled offline.
+REDACTED_PARAMS = {'key'}  # Never written into fixtures (Gemini API key)
+REPLAY_ERROR_STATUSES = [429, 500, 502, 503]
+
+def new_http_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+HTTP = {
+    'mode': 'live',
+    'session': new_http_session(),
+    'archive': None,  # Fixture path for record/replay
+    'fixtures': {},  # host -> [entry]
+    'cursors': {},  # match key -> next entry index
+    'latency_scale': 1.0,
+    'error_rate': 0.0,
+    'rng': random.Random(0),
+    'lock': threading.Lock()
+}
+
+def _fixture_keys(method, url, kwargs):
+    """(exact, loose) match keys: exact includes query + body, loose is method + host + path"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k not in REDACTED_PARAMS]
+    query += sorted((kwargs.get('params') or {}).items())
+    body = json.dumps(kwargs.get('json'), sort_keys=True) if kwargs.get('json') is not None else ""
+    loose = f"{method} {parts.hostname}{parts.path}"
+    return f"{loose}?{urlencode(sorted(query))} {body}", loose
+
+def _redact_url(url):
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k not in REDACTED_PARAMS])
+    return parts._replace(query=query).geturl()
+
+def configure_http(mode, archive=None, latency_scale=1.0, error_rate=0.0, seed=0):
+    HTTP.update({'mode': mode, 'archive': archive, 'latency_scale': latency_scale, 'error_rate': error_rate, 'rng': random.Random(seed)})
+    HTTP['fixtures'] = {}
+    HTTP['cursors'] = {}
+    if mode == 'replay':
+        with gzip.open(archive, "rt", encoding="utf-8") as f:
+            HTTP['fixtures'] = json.load(f)['hosts']
+        total = sum(len(entries) for entries in HTTP['fixtures'].values())
+        print(f"   📼 Replaying {total} responses from {archive} (latency ×{latency_scale}, {error_rate:.0%} injected errors)", file=sys.stderr)
+    elif mode == 'record':
+        print(f"   ⏺️ Recording upstream responses to {archive}", file=sys.stderr)
+
+def record_response(method, url, host, kwargs):
+    exact, loose = _fixture_keys(method, url, kwargs)
+    entry = {'method': method, 'url': _redact_url(url), 'exact': exact, 'loose': loose}
+    start = time.perf_counter()
+    try:
+        r = HTTP['session'].request(method, url, **kwargs)
+        entry.update({
+            'status': r.status_code,
+            'content_type': r.headers.get('Content-Type', ''),
+            'body': base64.b64encode(r.content).decode("ascii")
+        })
+        return r
+    except requests.exceptions.RequestException as e:
+        entry['exception'] = type(e).__name__
+        raise
+    finally:
+        entry['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        with HTTP['lock']:
+            HTTP['fixtures'].setdefault(host, []).append(entry)
+
+def finish_recording():
+    """Write the captured responses as a gzip JSON archive, grouped per host"""
+    if HTTP['mode'] != 'record':
+        return
+    with HTTP['lock']:
+        archive = {'recorded_at': datetime.datetime.now().isoformat(), 'hosts': HTTP['fixtures']}
+        data = gzip.compress(json.dumps(archive).encode("utf-8"), mtime=0)
+    _atomic_write(HTTP['archive'], data)
+    total = sum(len(entries) for entries in HTTP['fixtures'].values())
+    print(f"   ⏺️ Recorded {total} responses from {len(HTTP['fixtures'])} hosts → {HTTP['archive']} ({len(data)/1024:.0f} KB)", file=sys.stderr)
+
+def _fake_response(url, status, body, content_type="application/json"):
+    r = requests.models.Response()
+    r.status_code = status
+    r._content = body
+    r.headers['Content-Type'] = content_type
+    r.url = url
+    r.encoding = "utf-8"
+    return r
+
+def replay_response(method, url, host, kwargs):
+    """Serve the next recorded response for this request, after a latency sampled from the host's recordings"""
+    entries = HTTP['fixtures'].get(host, [])
+    exact, loose = _fixture_keys(method, url, kwargs)
+    
+    with HTTP['lock']:
+        rng = HTTP['rng']
+        candidates = [e for e in entries if e['exact'] == exact]
+        key = exact
+        if not candidates:
+            candidates = [e for e in entries if e['loose'] == loose]
+            key = loose
+        entry = None
+        if candidates:
+            index = HTTP['cursors'].get(key, 0)
+            entry = candidates[index % len(candidates)]
+            HTTP['cursors'][key] = index + 1
+        latencies = [e['elapsed_ms'] for e in entries] or [0]
+        delay = rng.choice(latencies) * HTTP['latency_scale'] / 1000
+        inject = rng.random() < HTTP['error_rate']
+        injected_status = rng.choice(REPLAY_ERROR_STATUSES)
+    
+    time.sleep(delay)
+    
+    if inject:
+        count_metric(f"http.{host}.injected")
+        return _fake_response(url, injected_status, b'{"error": "injected by replay"}')
+    if entry is None:
+        return _fake_response(url, 404, b'{"error": "no fixture recorded"}')
+    if 'exception' in entry:
+        raise getattr(requests.exceptions, entry['exception'], requests.exceptions.RequestException)(f"replayed {entry['exception']}")
+    return _fake_response(url, entry['status'], base64.b64decode(entry['body']), entry.get('content_type', 'application/json'))
+
+# --- PROMETHEUS METRICS ---
+# Counters, gauges and histograms kept in plain dicts; recording is a lock plus
+# a dict update (and a bisect for histograms). Exposed as text exposition format
+# over a local /metrics endpoint and as a node_exporter textfile dump.
+_prom = {}
+_prom_lock = threading.Lock()
+
+def prom_register(name, kind, help_text, buckets=None):
+    _prom[name] = {'kind': kind, 'help': help_text, 'buckets': buckets, 'values': {}}
+
+def _prom_labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def prom_inc(name, labels=None, n=1):
+    key = _prom_labels(labels)
+    with _prom_lock:
+        values = _prom[name]['values']
+        values[key] = values.get(key, 0) + n
+
+def prom_set(name, value, labels=None):
+    key = _prom_labels(labels)
+    with _prom_lock:
+        _prom[name]['values'][key] = value
+
+def prom_observe(name, value, labels=None):
+    metric = _prom[name]
+    key = _prom_labels(labels)
+    slot = bisect.bisect_left(metric['buckets'], value)
+    with _prom_lock:
+        hist = metric['values'].get(key)
+        if hist is None:
+            hist = metric['values'][key] = {'counts': [0] * (len(metric['buckets']) + 1), 'sum': 0.0, 'count': 0}
+        hist['counts'][slot] += 1
+        hist['sum'] += value
+        hist['count'] += 1
+
+def _prom_label_value(value):
+    """Escape a label value as the text format requires: backslash, double quote, newline"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_label_str(key, extra=None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_prom_label_value(v)}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    """Text exposition format (version 0.0.4)"""
+    lines = []
+    with _prom_lock:
+        for name, metric in _prom.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, value in metric['values'].items():
+                if metric['kind'] != 'histogram':
+                    lines.append(f"{name}{_prom_label_str(key)} {value}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(metric['buckets'] + ['+Inf'], value['counts']):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_prom_label_str(key, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_prom_label_str(key)} {value['sum']}")
+                lines.append(f"{name}_count{_prom_label_str(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_textfile(path):
+    """Dump for node_exporter's textfile collector (atomic, as the collector requires)"""
+    _atomic_write(path, render_prometheus().encode("utf-8"))
+
+def start_metrics_server(port):
+    """Serve GET /metrics on a daemon thread"""
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"   📡 Prometheus metrics on http://127.0.0.1:{port}/metrics", file=sys.stderr)
+    return server
+
+prom_register("etb_upstream_request_seconds", "histogram", "Upstream HTTP request latency by host", PROM_LATENCY_BUCKETS)
+prom_register("etb_fetch_total", "counter", "Order book fetches by exchange, side and provider")
+prom_register("etb_fetch_fallback_total", "counter", "RapidAPI fetches that fell back to p2p.army")
+prom_register("etb_fetch_errors_total", "counter", "Order book fetches that raised")
+prom_register("etb_ads", "gauge", "Ads in the latest snapshot by source and side")
+prom_register("etb_snapshot_seconds", "histogram", "capture_market_snapshot wall time", PROM_SNAPSHOT_BUCKETS)
+prom_register("etb_trades_detected_total", "counter", "Events detected by detect_real_trades by type")
+prom_register("etb_trades_last_round", "gauge", "Events detected in the latest detection round by type")
+prom_register("etb_ai_request_seconds", "histogram", "Gemini summary request latency", PROM_LATENCY_BUCKETS)
+prom_register("etb_run_seconds", "gauge", "Wall time of the latest full run")
+prom_register("etb_last_run_timestamp_seconds", "gauge", "Unix time the latest run finished")
+prom_register("etb_api_requests_total", "counter", "JSON API requests by route and status")
+prom_register("etb_push_clients", "gauge", "Connected push clients by transport")
+prom_register("etb_push_events_total", "counter", "Events broadcast by the push server")
+prom_register("etb_push_dropped_total", "counter", "Push clients disconnected for falling behind")
+
+# --- PUSH SERVER ---
+# Live delivery of detected events over Server-Sent Events (/events) and
+# WebSocket (/ws). The asyncio loop runs on its own thread; market threads hand
+# events over with call_soon_threadsafe. Every client has a bounded queue
+# drained at its own pace; one that falls PUSH_CLIENT_QUEUE events behind is
+# disconnected and catches up from the replay buffer when it reconnects.
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+PUSH = {
+    'loop': None,
+    'clients': {},  # handler task -> client
+    'buffer': deque(maxlen=PUSH_REPLAY_SIZE),  # (seq, kind, market, json)
+    'seq': 0
+}
+
+def push_enabled():
+    return PUSH['loop'] is not None
+
+def publish_event(kind, data):
+    """Broadcast an event to push clients (thread-safe; a no-op when the server isn't running)"""
+    loop = PUSH['loop']
+    if loop is None:
+        return
+    loop.call_soon_threadsafe(_broadcast, kind, _market.get(), json.dumps(dict(data, market=_market.get()), default=str))
+
+def _broadcast(kind, market, payload):
+    PUSH['seq'] += 1
+    event = (PUSH['seq'], kind, market, payload)
+    PUSH['buffer'].append(event)
+    prom_inc("etb_push_events_total")
+    
+    for client in list(PUSH['clients'].values()):
+        if client['market'] and client['market'] != market:
+            continue
+        try:
+            client['queue'].put_nowait(event)
+        except asyncio.QueueFull:
+            PUSH['clients'].pop(client['task'], None)
+            client['task'].cancel()
+            prom_inc("etb_push_dropped_total")
+
+def _sse_frame(event):
+    seq, kind, market, payload = event
+    return f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n".encode("utf-8")
+
+def _ws_frame(payload, opcode=0x1):
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+def _ws_event_frame(event):
+    seq, kind, market, payload = event
+    return _ws_frame(f'{{"id":{seq},"event":"{kind}","data":{payload}}}'.encode("utf-8"))
+
+async def _watch_sse(reader, task):
+    """SSE clients never send anything; EOF means they went away"""
+    try:
+        while await reader.read(4096):
+            pass
+    except ConnectionError:
+        pass
+    task.cancel()
+
+async def _watch_ws(reader, writer, task):
+    """Read client frames: answer pings, stop on close or EOF"""
+    try:
+        while True:
+            head = await reader.readexactly(2)
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await reader.readexactly(8))[0]
+            if length > 65536:
+                break
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b""
+            payload = await reader.readexactly(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x8:
+                break
+            if opcode == 0x9:
+                writer.write(_ws_frame(payload, 0xA))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    task.cancel()
+
+async def _push_client(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+        lines = request.decode("latin-1").split("\r\n")
+        target = lines[0].split(" ")[1]
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError, IndexError):
+        writer.close()
+        return
+    
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    parts = urlsplit(target)
+    query = dict(parse_qsl(parts.query))
+    since = headers.get('last-event-id') or query.get('since')
+    since = int(since) if since and since.isdigit() else None
+    
+    if parts.path == "/events":
+        transport = 'sse'
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+        frame, heartbeat = _sse_frame, b": ping\n\n"
+    elif parts.path == "/ws" and headers.get('upgrade', '').lower() == "websocket" and headers.get('sec-websocket-key'):
+        transport = 'ws'
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        frame, heartbeat = _ws_event_frame, _ws_frame(b"", 0x9)
+    else:
+        writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        writer.close()
+        return
+    
+    client = {'queue': asyncio.Queue(PUSH_CLIENT_QUEUE), 'market': query.get('market', '').upper(), 'task': asyncio.current_task()}
+    watcher = asyncio.ensure_future(_watch_sse(reader, client['task']) if transport == 'sse' else _watch_ws(reader, writer, client['task']))
+    PUSH['clients'][client['task']] = client
+    prom_inc("etb_push_clients", {'transport': transport})
+    
+    try:
+        # Reconnecting clients first get whatever they missed that is still buffered
+        if since is not None:
+            for event in list(PUSH['buffer']):
+                if event[0] > since and (not client['market'] or event[2] == client['market']):
+                    writer.write(frame(event))
+        await writer.drain()
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(client['queue'].get(), PUSH_HEARTBEAT)
+                writer.write(frame(event))
+            except asyncio.TimeoutError:
+                writer.write(heartbeat)
+            await writer.drain()
+    except (asyncio.CancelledError, ConnectionError):
+        pass
+    finally:
+        PUSH['clients'].pop(client['task'], None)
+        prom_inc("etb_push_clients", {'transport': transport}, -1)
+        watcher.cancel()
+        writer.close()
+
+def start_push_server(port, host="127.0.0.1"):
+    """Run the SSE/WebSocket server on a daemon thread with its own event loop"""
+    started = {}
+    ready = threading.Event()
+    
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(asyncio.start_server(_push_client, host, port))
+        except OSError as e:
+            started['error'] = e
+            ready.set()
+            return
+        PUSH['loop'] = loop
+        ready.set()
+        loop.run_forever()
+    
+    threading.Thread(target=serve, name="push-server", daemon=True).start()
+    ready.wait()
+    if 'error' in started:
+        raise started['error']
+    print(f"   📣 Live events on http://{host}:{port}/events (SSE) and ws://{host}:{port}/ws", file=sys.stderr)
+
+# --- JSON API ---
+# Read-only HTTP API over the latest published state of each market. Every
+# run swaps in a fresh in-memory snapshot (stats, depth, history, events), so
+# requests never touch disk or re-run analyze(). Serialized bodies are cached
+# per (market version, path, query) and carry an ETag for If-None-Match.
+API = {
+    'markets': {},  # code -> published state
+    'cache': OrderedDict(),  # request key -> (etag, body)
+    'lock': threading.Lock(),
+    'server': None
+}
+
+def api_enabled():
+    return API['server'] is not None
+
+def _public_stats(stats):
+    return {k: v for k, v in stats.items() if k != 'raw_data'} if stats else None
+
+def publish_api_state(stats, official, analytics, slippage_ladder=None, price_windows=None, indicators=None, quotes=None):
+    """Swap in this run's state for the current market (loaded once here, served from memory)"""
+    trades = sorted(load_recent_trades(), key=lambda t: t.get('timestamp', 0))
+    dates, medians, q1s, q3s, offs = load_history(limit=None)
+    state = {
+        'version': API['markets'].get(_market.get(), {}).get('version', 0) + 1,
+        'updated_at': datetime.datetime.now().isoformat(),
+        'stats': {
+            'market': _market.get(),
+            'fiat': current_market()['fiat'],
+            'asset': current_market()['asset'],
+            'official': official,
+            'premium_pct': (stats['median'] - official) / official * 100 if official else None,
+            'overall': _public_stats(stats),
+            'sources': {source: _public_stats(s) for source, s in analytics['source_stats'].items()},
+            'windows': price_windows,
+            'indicators': {k: v for k, v in indicators.items() if k != 'series'} if indicators else None
+        },
+        'depth': {'depth': analytics['depth'], 'slippage': slippage_ladder, 'quotes': quotes},
+        'history': {
+            'ts': [d.timestamp() for d in dates],
+            'rows': [{'timestamp': d.isoformat(), 'median': m, 'q1': q1, 'q3': q3, 'official': o}
+                     for d, m, q1, q3, o in zip(dates, medians, q1s, q3s, offs)]
+        },
+        'trades': trades,
+        'trade_ts': [t.get('timestamp', 0) for t in trades]
+    }
+    API['markets'][_market.get()] = state
+
+def _api_range(timestamps, query):
+    """Index range of a sorted timestamp column for ?since=&until= (unix seconds)"""
+    lo = bisect.bisect_right(timestamps, float(query['since'])) if 'since' in query else 0
+    hi = bisect.bisect_right(timestamps, float(query['until'])) if 'until' in query else len(timestamps)
+    return lo, max(lo, hi)
+
+def api_response(path, query):
+    """(status, payload) for one API request"""
+    parts = [p for p in path.split("/") if p]
+    if parts[:1] != ['api']:
+        return 404, {'error': 'not found'}
+    if len(parts) == 2 and parts[1] == 'markets':
+        return 200, {code: {'updated_at': state['updated_at'], 'version': state['version']} for code, state in API['markets'].items()}
+    if len(parts) != 3:
+        return 404, {'error': 'not found'}
+    
+    code, resource = parts[1].upper(), parts[2]
+    state = API['markets'].get(code)
+    if code not in MARKETS:
+        return 404, {'error': f'unknown market {code}'}
+    if state is None:
+        return 503, {'error': f'no data published for {code} yet'}
+    
+    if resource == 'stats':
+        return 200, state['stats']
+    if resource == 'depth':
+        return 200, state['depth']
+    if resource == 'history':
+        lo, hi = _api_range(state['history']['ts'], query)
+        return 200, {'market': code, 'rows': state['history']['rows'][lo:hi]}
+    if resource == 'trades':
+        lo, hi = _api_range(state['trade_ts'], query)
+        events = state['trades'][lo:hi]
+        if 'source' in query:
+            sources = set(query['source'].upper().split(","))
+            events = [t for t in events if t.get('source', '').upper() in sources]
+        if 'type' in query:
+            types = set(query['type'].split(","))
+            events = [t for t in events if t.get('type') in types]
+        limit = min(int(query.get('limit', API_MAX_TRADES)), API_MAX_TRADES)
+        return 200, {'market': code, 'count': len(events), 'trades': events[-limit:] if limit > 0 else []}
+    return 404, {'error': 'not found'}
+
+def api_cached(path, query):
+    """(status, etag, body) with the serialized body reused until the market's state changes"""
+    parts = [p for p in path.split("/") if p]
+    code = parts[1].upper() if len(parts) > 2 else None
+    version = API['markets'][code]['version'] if code in API['markets'] else None
+    key = (code, version, path, tuple(sorted(query.items())))
+    
+    with API['lock']:
+        hit = API['cache'].get(key)
+        if hit is not None:
+            API['cache'].move_to_end(key)
+            return 200, hit[0], hit[1]
+    
+    try:
+        status, payload = api_response(path, query)
+    except ValueError:
+        status, payload = 400, {'error': 'bad query parameter'}
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+    
+    # /api/markets changes whenever any market publishes, so only per-market routes are cached
+    if status == 200 and code is not None:
+        with API['lock']:
+            API['cache'][key] = (etag, body)
+            if len(API['cache']) > API_CACHE_SIZE:
+                API['cache'].popitem(last=False)
+    return status, etag, body
+
+def api_route(path):
+    """Bounded metrics label for a request path: the resource it resolves to, else 'other'"""
+    parts = [p for p in path.split("/") if p]
+    if not parts:
+        return "root"
+    if parts == ['api', 'markets']:
+        return "markets"
+    if len(parts) == 3 and parts[0] == 'api' and parts[2] in API_RESOURCES:
+        return parts[2]
+    return "other"
+
+def start_api_server(port, host="127.0.0.1"):
+    """Serve the JSON API on a daemon thread"""
+    class ApiHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            status, etag, body = api_cached(parts.path, dict(parse_qsl(parts.query)))
+            route = api_route(parts.path)
+            
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                prom_inc("etb_api_requests_total", {'route': route, 'status': 304})
+                return
+            
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if status == 200:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+            prom_inc("etb_api_requests_total", {'route': route, 'status': status})
+        
+        def log_message(self, *args):
+            pass
+    
+    server = API['server'] = http.server.ThreadingHTTPServer((host, port), ApiHandler)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    print(f"   🔌 JSON API on http://{host}:{port}/api/markets", file=sys.stderr)
+    return server
+
 # --- FETCHERS ---
+def fetch_usd_rates():
+    """USD reference rates for every fiat, fetched once and shared across markets"""
+    def fetch():
+        try:
+            return http_request("GET", "https://open.er-api.com/v6/latest/USD", timeout=5).json()["rates"]
+        except:
+            return None
+    return shared_fetch("usd_rates", fetch)
+
 def fetch_official_rate():
     try:
-        return float(requests.get("https://open.er-api.com/v6/latest/USD", timeout=5).json()["rates"]["ETB"])
+        return float(fetch_usd_rates()[current_market()['fiat']])
     except:
         return None
 
 def fetch_usdt_peg():
-    try:
-        return float(requests.get("https://api.coingecko.com/api/v3/simple/price?ids=tether&vs_currencies=usd", timeout=5).json()["tether"]["usd"])
-    except:
-        return 1.00
+    def fetch():
+        try:
+            return float(http_request("GET", "https://api.coingecko.com/api/v3/simple/price?ids=tether&vs_currencies=usd", timeout=5).json()["tether"]["usd"])
+        except:
+            return None
+    peg = shared_fetch("usdt_peg", fetch)
+    return peg if peg is not None else 1.00
 
 def fetch_remittance_rates():
     """Fetch estimated remittance rates for ticker display"""
     rates = {}
+    central_bank = current_market()['central_bank']
     
     try:
-        # Get official NBE rate as base
-        r = requests.get("https://open.er-api.com/v6/latest/USD", timeout=5)
-        nbe_rate = r.json()["rates"]["ETB"]
+        # Get official central bank rate as base
+        nbe_rate = fetch_usd_rates()[current_market()['fiat']]
         
         # Remittance services typically offer rates close to official + small margin
         # These are estimates - actual rates vary by amount and payment method
-        rates['NBE_OFFICIAL'] = {
+        rates['OFFICIAL'] = {
             'rate': nbe_rate,
-            'name': 'NBE Official',
+            'name': f'{central_bank} Official',
             'emoji': '🏛️',
             'color': '#34C759'
         }
@@ -111,7 +989,7 @@ def fetch_remittance_rates():
             'color': '#FF6B00'
         }
         
-        print(f"   💱 Remittance rates fetched (NBE base: {nbe_rate:.2f})", file=sys.stderr)
+        print(f"   💱 Remittance rates fetched ({central_bank} base: {nbe_rate:.2f})", file=sys.stderr)
         
     except Exception as e:
         print(f"   ⚠️ Error fetching remittance rates: {e}", file=sys.stderr)
@@ -133,11 +1011,12 @@ def fetch_binance_rapidapi(side="SELL"):
     page = 1
     max_pages = 20
     use_fallback = False
+    prom_inc("etb_fetch_total", {'market': _market.get(), 'exchange': 'BINANCE', 'side': side, 'provider': 'rapidapi'})
     
     while page <= max_pages:
         payload = {
-            "asset": "USDT",
-            "fiat": "ETB",
+            "asset": current_market()['asset'],
+            "fiat": current_market()['fiat'],
             "page": page,
             "rows": 20,
             "payTypes": [],
@@ -145,7 +1024,7 @@ def fetch_binance_rapidapi(side="SELL"):
         }
         
         try:
-            r = requests.post(url, headers=headers, json=payload, timeout=15)
+            r = http_request("POST", url, headers=headers, json=payload, timeout=15)
             
             # Check for 502 or other server errors - use fallback
             if r.status_code in [502, 503, 500, 429]:
@@ -204,6 +1083,7 @@ def fetch_binance_rapidapi(side="SELL"):
     # If RapidAPI failed, use p2p.army fallback
     if use_fallback or len(all_ads) == 0:
         print(f"   🔄 Using p2p.army fallback for Binance {side}...", file=sys.stderr)
+        prom_inc("etb_fetch_fallback_total", {'market': _market.get(), 'exchange': 'BINANCE', 'side': side})
         fallback_ads = fetch_p2p_army_exchange("binance", side)
         if fallback_ads:
             return fallback_ads
@@ -213,9 +1093,9 @@ def fetch_binance_rapidapi(side="SELL"):
 
 def fetch_binance_both_sides():
     """Fetch BOTH buy and sell ads from Binance"""
-    sell_ads = fetch_binance_rapidapi("SELL")
+    sell_ads = timed("fetch.BINANCE.SELL", fetch_binance_rapidapi, "SELL")
     time.sleep(2)
-    buy_ads = fetch_binance_rapidapi("BUY")
+    buy_ads = timed("fetch.BINANCE.BUY", fetch_binance_rapidapi, "BUY")
     
     all_ads = sell_ads + buy_ads
     seen = set()
@@ -236,10 +1116,11 @@ def fetch_p2p_army_exchange(market, side="SELL"):
     ads = []
     h = HEADERS.copy()
     h["X-APIKEY"] = P2P_ARMY_KEY
+    prom_inc("etb_fetch_total", {'market': _market.get(), 'exchange': market.upper(), 'side': side, 'provider': 'p2p_army'})
     
     try:
-        payload = {"market": market, "fiat": "ETB", "asset": "USDT", "side": side, "limit": 100}
-        r = requests.post(url, headers=h, json=payload, timeout=10)
+        payload = {"market": market, "fiat": current_market()['fiat'], "asset": current_market()['asset'], "side": side, "limit": 100}
+        r = http_request("POST", url, headers=h, json=payload, timeout=10)
         data = r.json()
         
         candidates = data.get("result", data.get("data", data.get("ads", [])))
@@ -286,6 +1167,7 @@ def fetch_p2p_army_exchange(market, side="SELL"):
         print(f"   {market.upper()} {side} (p2p.army): {len(ads)} ads", file=sys.stderr)
     except Exception as e:
         print(f"   {market.upper()} {side} error: {e}", file=sys.stderr)
+        prom_inc("etb_fetch_errors_total", {'market': _market.get(), 'exchange': market.upper(), 'side': side, 'provider': 'p2p_army'})
     
     return ads
 
@@ -309,10 +1191,10 @@ def fetch_mexc_rapidapi(side="SELL"):
         
         seen_ids = set()
         
-        strategies = [
-            {"name": "Text", "params": {"currency": "ETB", "coin": "USDT"}},
-            {"name": "ID",   "params": {"currencyId": "58", "coinId": "1"}}
-        ]
+        strategies = [{"name": "Text", "params": {"currency": current_market()['fiat'], "coin": current_market()['asset']}}]
+        if current_market()['mexc_currency_id']:
+            strategies.append({"name": "ID", "params": {"currencyId": current_market()['mexc_currency_id'], "coinId": "1"}})
+        prom_inc("etb_fetch_total", {'market': _market.get(), 'exchange': 'MEXC', 'side': side, 'provider': 'rapidapi'})
         
         for strategy in strategies:
             page = 1
@@ -327,7 +1209,7 @@ def fetch_mexc_rapidapi(side="SELL"):
                 params.update(strategy["params"])
                 
                 try:
-                    r = requests.get(url, headers=headers, params=params, timeout=10)
+                    r = http_request("GET", url, headers=headers, params=params, timeout=10)
                     
                     # Check for server errors - use fallback
                     if r.status_code in [502, 503, 500]:
@@ -390,6 +1272,7 @@ def fetch_mexc_rapidapi(side="SELL"):
         # If RapidAPI failed, use p2p.army fallback
         if use_fallback or len(ads) == 0:
             print(f"   🔄 Using p2p.army fallback for MEXC {side}...", file=sys.stderr)
+            prom_inc("etb_fetch_fallback_total", {'market': _market.get(), 'exchange': 'MEXC', 'side': side})
             fallback_ads = fetch_p2p_army_exchange("mexc", side)
             if fallback_ads:
                 return fallback_ads
@@ -397,6 +1280,8 @@ def fetch_mexc_rapidapi(side="SELL"):
         print(f"   MEXC {side} (RapidAPI): {len(ads)} ads", file=sys.stderr)
     except Exception as e:
         print(f"   MEXC {side} error: {e}, trying p2p.army fallback...", file=sys.stderr)
+        prom_inc("etb_fetch_errors_total", {'market': _market.get(), 'exchange': 'MEXC', 'side': side, 'provider': 'rapidapi'})
+        prom_inc("etb_fetch_fallback_total", {'market': _market.get(), 'exchange': 'MEXC', 'side': side})
         return fetch_p2p_army_exchange("mexc", side)
     
     return ads
@@ -404,8 +1289,8 @@ def fetch_mexc_rapidapi(side="SELL"):
 def fetch_mexc_both_sides():
     """Fetch BOTH buy and sell ads from MEXC"""
     with ThreadPoolExecutor(max_workers=2) as ex:
-        f_sell = ex.submit(lambda: fetch_mexc_rapidapi("SELL"))
-        f_buy = ex.submit(lambda: fetch_mexc_rapidapi("BUY"))
+        f_sell = submit_in_market(ex, timed, "fetch.MEXC.SELL", fetch_mexc_rapidapi, "SELL")
+        f_buy = submit_in_market(ex, timed, "fetch.MEXC.BUY", fetch_mexc_rapidapi, "BUY")
         
         sell_ads = f_sell.result() or []
         buy_ads = f_buy.result() or []
@@ -425,8 +1310,8 @@ def fetch_mexc_both_sides():
 def fetch_exchange_both_sides(exchange_name):
     """Fetch BOTH buy and sell ads for any exchange via p2p.army"""
     with ThreadPoolExecutor(max_workers=2) as ex:
-        f_sell = ex.submit(lambda: fetch_p2p_army_exchange(exchange_name, "SELL"))
-        f_buy = ex.submit(lambda: fetch_p2p_army_exchange(exchange_name, "BUY"))
+        f_sell = submit_in_market(ex, timed, f"fetch.{exchange_name.upper()}.SELL", fetch_p2p_army_exchange, exchange_name, "SELL")
+        f_buy = submit_in_market(ex, timed, f"fetch.{exchange_name.upper()}.BUY", fetch_p2p_army_exchange, exchange_name, "BUY")
         
         sell_ads = f_sell.result() or []
         buy_ads = f_buy.result() or []
@@ -436,7 +1321,45 @@ def fetch_exchange_both_sides(exchange_name):
         return all_ads
 
 # --- GEMINI AI INTEGRATION ---
-def generate_ai_summary(stats, official, trade_stats, volume_by_exchange, history_data):
+def ai_signals(stats, official, trade_stats, indicators=None):
+    """The market inputs an AI summary is judged stale against"""
+    median = stats.get('median', 0)
+    total_buy = trade_stats.get('overall_buy_volume', 0)
+    total_sell = trade_stats.get('overall_sell_volume', 0)
+    return {
+        'median': median,
+        'premium': ((median - official) / official * 100) if official > 0 else 0,
+        'buy_sell_ratio': total_buy / total_sell if total_sell > 0 else 1,
+        'trend': indicators.get('trend') if indicators else None
+    }
+
+def ai_refresh_reason(cached, context):
+    """Why the cached summary should be regenerated, or None to keep it"""
+    if not cached:
+        return "no cached summary"
+    
+    generated_at = datetime.datetime.fromisoformat(cached.get('generated_at', '2000-01-01'))
+    age = (datetime.datetime.now() - generated_at).total_seconds()
+    if age >= AI_MAX_AGE:
+        return f"older than {AI_MAX_AGE // 3600}h"
+    
+    if not context:
+        return None
+    
+    then = cached.get('signals') or {'median': cached.get('rate_at_generation')}
+    now = ai_signals(context['stats'], context['official'], context['trade_stats'], context.get('indicators'))
+    
+    if then.get('median') and abs(now['median'] - then['median']) / then['median'] * 100 >= AI_REFRESH_THRESHOLDS['median_pct']:
+        return f"rate moved {then['median']:.2f} → {now['median']:.2f}"
+    if then.get('premium') is not None and abs(now['premium'] - then['premium']) >= AI_REFRESH_THRESHOLDS['premium_pts']:
+        return f"premium moved {then['premium']:.1f}% → {now['premium']:.1f}%"
+    if then.get('buy_sell_ratio') and abs(now['buy_sell_ratio'] - then['buy_sell_ratio']) / then['buy_sell_ratio'] * 100 >= AI_REFRESH_THRESHOLDS['buy_sell_ratio_pct']:
+        return f"buy/sell ratio moved {then['buy_sell_ratio']:.2f} → {now['buy_sell_ratio']:.2f}"
+    if AI_REFRESH_THRESHOLDS['trend'] and then.get('trend') and now['trend'] and now['trend'] != then['trend']:
+        return f"trend turned {then['trend']} → {now['trend']}"
+    return None
+
+def generate_ai_summary(stats, official, trade_stats, volume_by_exchange, history_data, indicators=None):
     """Generate AI market analysis using Google Gemini API with forecasting"""
     
     print(f"   🤖 Starting AI Summary generation...", file=sys.stderr)
@@ -447,6 +1370,8 @@ def generate_ai_summary(stats, official, trade_stats, volume_by_exchange, histor
         return create_fallback_summary(stats, official, trade_stats)
     
     try:
+        m = current_market()
+        fiat = m['fiat']
         black_market_rate = stats.get('median', 0)
         premium = ((black_market_rate - official) / official * 100) if official > 0 else 0
         
@@ -461,22 +1386,40 @@ def generate_ai_summary(stats, official, trade_stats, volume_by_exchange, histor
             elif trend_change < -2:
                 trend_direction = "decreasing"
         
+        indicator_text = "- Not enough history yet"
+        if indicators:
+            trend_direction = indicators['trend']
+            ewma = indicators['ewma_median']
+            ewma_prem = indicators['ewma_premium']
+            roc = indicators['roc_pct']
+            vol = indicators['volatility_pct']
+            indicator_text = "\n".join([
+                "- EWMA Rate: " + ", ".join(f"{k} {v:.2f}" for k, v in ewma.items() if v is not None) + f" {fiat}",
+                "- EWMA Premium: " + ", ".join(f"{k} {v:.1f}%" for k, v in ewma_prem.items() if v is not None),
+                "- Rate of Change: " + ", ".join(f"{k} {v:+.2f}%" if v is not None else f"{k} n/a" for k, v in roc.items()),
+                f"- Realized Volatility: {vol:.3f}% per 5-min interval ({indicators['volatility_window']} intervals)" if vol is not None else "- Realized Volatility: n/a"
+            ])
+        
         # Calculate volume trends
         total_buy = trade_stats.get('overall_buy_volume', 0)
         total_sell = trade_stats.get('overall_sell_volume', 0)
         buy_sell_ratio = total_buy / total_sell if total_sell > 0 else 1
         
         # Build comprehensive prompt with forecasting request
-        prompt = f"""You are an expert Ethiopian financial market analyst specializing in ETB/USD exchange rates and remittance markets. Analyze the current market data and provide insights WITH FORECASTING.
+        market_context = "\n".join(f"- {line}" for line in m['context'])
+        prompt = f"""You are an expert {m['demonym']} financial market analyst specializing in {fiat}/USD exchange rates and remittance markets. Analyze the current market data and provide insights WITH FORECASTING.
 
 CURRENT MARKET DATA (as of {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}):
-- Black Market Rate: {black_market_rate:.2f} ETB per USD
-- Official NBE Rate: {official:.2f} ETB per USD  
+- Black Market Rate: {black_market_rate:.2f} {fiat} per USD
+- Official {m['central_bank']} Rate: {official:.2f} {fiat} per USD  
 - Black Market Premium: {premium:.1f}%
-- Price Range: {stats.get('min', 0):.2f} - {stats.get('max', 0):.2f} ETB
-- 24h Trend: {trend_direction} ({'+' if trend_change > 0 else ''}{trend_change:.2f} ETB)
+- Price Range: {stats.get('min', 0):.2f} - {stats.get('max', 0):.2f} {fiat}
+- 24h Trend: {trend_direction} ({'+' if trend_change > 0 else ''}{trend_change:.2f} {fiat})
 - Active P2P Ads: {stats.get('count', 0)}
 
+TECHNICAL INDICATORS:
+{indicator_text}
+
 TRADING ACTIVITY (24h):
 - Buy Volume: ${total_buy:,.0f} USDT
 - Sell Volume: ${total_sell:,.0f} USDT
@@ -484,18 +1427,15 @@ TRADING ACTIVITY (24h):
 - Total Trades: {trade_stats.get('overall_buys', 0) + trade_stats.get('overall_sells', 0)}
 
 MARKET CONTEXT:
-- Ethiopia recently unified exchange rates (March 2024)
-- IMF monitoring economic reforms
-- Diaspora remittances are major USD source
-- Foreign currency shortage affects businesses
+{market_context}
 
-Based on this data and your knowledge of Ethiopian economic conditions, provide analysis in this EXACT JSON format:
+Based on this data and your knowledge of {m['demonym']} economic conditions, provide analysis in this EXACT JSON format:
 {{
     "market_sentiment": "bullish/bearish/neutral",
     "summary": "2-3 sentence market summary explaining current conditions",
     "key_insights": ["insight 1", "insight 2", "insight 3"],
     "black_market_drivers": ["factor driving black market rate up/down 1", "factor 2", "factor 3"],
-    "official_rate_factors": ["factor affecting official NBE rate 1", "factor 2"],
+    "official_rate_factors": ["factor affecting official {m['central_bank']} rate 1", "factor 2"],
     "gap_explanation": "Why is there a {premium:.1f}% gap between black market and official rate? Explain the key reasons.",
     "short_term_forecast": "Detailed 1-7 day price prediction with specific range",
     "medium_term_forecast": "1-4 week outlook based on trends",
@@ -519,7 +1459,10 @@ Focus on actionable insights. Be specific about price forecasts. Explain what ec
         }
         
         print(f"   📡 Calling Gemini API...", file=sys.stderr)
-        response = requests.post(url, json=payload, timeout=30)
+        ai_start = time.perf_counter()
+        with span("ai.gemini"):
+            response = http_request("POST", url, json=payload, timeout=30)
+        prom_observe("etb_ai_request_seconds", time.perf_counter() - ai_start)
         print(f"   📡 Gemini API Status: {response.status_code}", file=sys.stderr)
         
         if response.status_code == 200:
@@ -553,9 +1496,9 @@ Focus on actionable insights. Be specific about price forecasts. Explain what ec
                     ai_data = json.loads(json_str)
                     ai_data['generated_at'] = datetime.datetime.now().isoformat()
                     ai_data['rate_at_generation'] = black_market_rate
+                    ai_data['signals'] = ai_signals(stats, official, trade_stats, indicators)
                     
-                    with open(AI_SUMMARY_FILE, 'w') as f:
-                        json.dump(ai_data, f)
+                    write_artifact(market_path(AI_SUMMARY_FILE), ai_data)
                     
                     print(f"   ✅ AI Summary generated successfully!", file=sys.stderr)
                     return ai_data
@@ -583,6 +1526,8 @@ def create_fallback_summary(stats, official, trade_stats):
     """Create a rule-based fallback summary when AI is unavailable"""
     print(f"   📋 Using fallback rule-based summary", file=sys.stderr)
     
+    fiat = current_market()['fiat']
+    central_bank = current_market()['central_bank']
     black_market_rate = stats.get('median', 0)
     premium = ((black_market_rate - official) / official * 100) if official > 0 else 0
     
@@ -592,36 +1537,33 @@ def create_fallback_summary(stats, official, trade_stats):
     if buy_vol > sell_vol * 1.5:
         sentiment = "bullish"
         sentiment_text = "Strong buying pressure indicates demand for USDT/USD"
-        forecast = f"Rate likely to increase to {black_market_rate + 2:.2f}-{black_market_rate + 5:.2f} ETB"
+        forecast = f"Rate likely to increase to {black_market_rate + 2:.2f}-{black_market_rate + 5:.2f} {fiat}"
     elif sell_vol > buy_vol * 1.5:
         sentiment = "bearish"
         sentiment_text = "Strong selling pressure indicates USDT supply increase"
-        forecast = f"Rate may decrease to {black_market_rate - 3:.2f}-{black_market_rate - 1:.2f} ETB"
+        forecast = f"Rate may decrease to {black_market_rate - 3:.2f}-{black_market_rate - 1:.2f} {fiat}"
     else:
         sentiment = "neutral"
         sentiment_text = "Balanced buy/sell activity with stable market conditions"
-        forecast = f"Rate expected to stay within {black_market_rate - 2:.2f}-{black_market_rate + 2:.2f} ETB"
+        forecast = f"Rate expected to stay within {black_market_rate - 2:.2f}-{black_market_rate + 2:.2f} {fiat}"
     
     return {
         "market_sentiment": sentiment,
-        "summary": f"The ETB black market rate is currently {black_market_rate:.2f} ETB/USD, representing a {premium:.1f}% premium over the official rate of {official:.2f} ETB. {sentiment_text}.",
+        "summary": f"The {fiat} black market rate is currently {black_market_rate:.2f} {fiat}/USD, representing a {premium:.1f}% premium over the official rate of {official:.2f} {fiat}. {sentiment_text}.",
         "key_insights": [
             f"Black market premium: {premium:.1f}% above official rate",
             f"24h volume: ${buy_vol + sell_vol:,.0f} USDT traded",
-            f"Market spread: {stats.get('min', 0):.2f} - {stats.get('max', 0):.2f} ETB"
+            f"Market spread: {stats.get('min', 0):.2f} - {stats.get('max', 0):.2f} {fiat}"
         ],
         "black_market_drivers": [
             "High demand for USD from importers and businesses",
             "Limited forex availability through official channels",
             "Diaspora remittance preferences for better rates"
         ],
-        "official_rate_factors": [
-            "NBE monetary policy and forex reserves",
-            "IMF program requirements and reform timeline"
-        ],
+        "official_rate_factors": list(current_market()['official_factors']),
         "gap_explanation": f"The {premium:.1f}% gap exists primarily due to foreign currency shortage in official banking channels, forcing businesses to seek USD through parallel markets at premium rates.",
         "short_term_forecast": forecast,
-        "medium_term_forecast": "Market expected to remain volatile. Monitor NBE policy announcements for direction.",
+        "medium_term_forecast": f"Market expected to remain volatile. Monitor {central_bank} policy announcements for direction.",
         "risk_factors": [
             "Exchange rate volatility during policy changes",
             "P2P transaction counterparty risks"
@@ -633,20 +1575,20 @@ def create_fallback_summary(stats, official, trade_stats):
         "is_fallback": True
     }
 
-def load_cached_ai_summary():
-    """Load cached AI summary if recent (within 1 hour)"""
-    if not os.path.exists(AI_SUMMARY_FILE):
+def load_cached_ai_summary(max_age=AI_MAX_AGE):
+    """Load cached AI summary if recent (within max_age seconds; None accepts any age)"""
+    if not os.path.exists(market_path(AI_SUMMARY_FILE)):
         print(f"   📋 No cached AI summary found", file=sys.stderr)
         return None
     
     try:
-        with open(AI_SUMMARY_FILE, 'r') as f:
+        with open(market_path(AI_SUMMARY_FILE), 'r') as f:
             data = json.load(f)
         
         generated_at = datetime.datetime.fromisoformat(data.get('generated_at', '2000-01-01'))
         age = datetime.datetime.now() - generated_at
         
-        if age.total_seconds() < 3600:
+        if max_age is None or age.total_seconds() < max_age:
             print(f"   📋 Using cached AI summary ({int(age.total_seconds()/60)}min old)", file=sys.stderr)
             return data
         else:
@@ -656,23 +1598,124 @@ def load_cached_ai_summary():
         print(f"   ⚠️ Error loading cached summary: {e}", file=sys.stderr)
         return None
 
+# The summary is generated off the critical path: a daemon thread started at
+# the top of the run works from the inputs the previous run saved, and the page
+# renders with whatever summary is on hand when it's ready to publish. The only
+# wait is finish_ai_workers' AI_JOIN_TIMEOUT grace period at the very end.
+_ai_workers = {}  # market code -> {'thread', 'result'}
+
+def ai_worker():
+    return _ai_workers.setdefault(_market.get(), {'thread': None, 'result': None})
+
+def save_ai_context(stats, official, trade_stats, volume_by_exchange, indicators):
+    """Persist this run's AI inputs so the next run can start the summary immediately"""
+    write_artifact(market_path(AI_CONTEXT_FILE), {
+        'stats': {key: stats.get(key) for key in ('median', 'min', 'max', 'count')},
+        'official': official,
+        'trade_stats': trade_stats,
+        'volume_by_exchange': volume_by_exchange,
+        'indicators': {key: value for key, value in indicators.items() if key != 'series'} if indicators else None
+    })
+
+def load_ai_context():
+    if not os.path.exists(market_path(AI_CONTEXT_FILE)):
+        return None
+    try:
+        with open(market_path(AI_CONTEXT_FILE), 'r') as f:
+            return json.load(f)
+    except:
+        return None
+
+def start_ai_worker():
+    """Kick off AI summary generation in the background once the cached one is stale"""
+    worker = ai_worker()
+    if worker['thread'] and worker['thread'].is_alive():
+        return
+    context = load_ai_context()
+    reason = ai_refresh_reason(load_cached_ai_summary(max_age=None), context)
+    if not reason:
+        print("   📋 Market within AI refresh thresholds, keeping cached summary", file=sys.stderr)
+        return
+    
+    if not context:
+        print("   📋 No saved AI inputs yet, summary starts next run", file=sys.stderr)
+        return
+    print(f"   🔄 AI summary stale: {reason}", file=sys.stderr)
+    
+    def work():
+        worker['result'] = generate_ai_summary(
+            context['stats'], context['official'], context['trade_stats'],
+            context['volume_by_exchange'], load_history(), context.get('indicators')
+        )
+    
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(work,), name=f"ai-summary-{_market.get()}", daemon=True)
+    thread.start()
+    worker['thread'] = thread
+    print("   🤖 AI summary generating in background", file=sys.stderr)
+
+def current_ai_summary():
+    """Never waits: the worker's result if it has finished, else the cached summary at any age"""
+    worker = ai_worker()
+    thread = worker['thread']
+    if thread is not None and not thread.is_alive() and worker['result']:
+        return worker['result']
+    if thread is not None and thread.is_alive():
+        print("   ⏳ AI summary still generating, publishing with cached one", file=sys.stderr)
+    return load_cached_ai_summary(max_age=None)
+
+def finish_ai_workers(timeout=AI_JOIN_TIMEOUT):
+    """Bounded grace period (AI_JOIN_TIMEOUT in total, shared by all markets) before the artifact hashes are saved.
+    
+    A summary finishing inside it lands in this run's hashes. One that is still
+    generating is left alone: in --loop mode its write is saved with the next
+    iteration's hashes, and a one-shot run exits without it, so the next run
+    sees the cached summary as still stale and regenerates it.
+    """
+    deadline = time.monotonic() + timeout
+    for code, worker in list(_ai_workers.items()):
+        thread = worker['thread']
+        if thread is None or not thread.is_alive():
+            continue
+        thread.join(max(deadline - time.monotonic(), 0))
+        if thread.is_alive():
+            print(f"   ⏳ {code} AI summary still generating after {timeout}s, not waiting for it", file=sys.stderr)
+
 # --- MARKET SNAPSHOT ---
-def capture_market_snapshot():
-    """Capture market snapshot: Binance, MEXC, OKX (NO Bybit)"""
+def capture_market_snapshot(spread_book=None, peg=1.0):
+    """Capture market snapshot: Binance, MEXC, OKX (NO Bybit)
+    
+    If a spread_book is given, each exchange is folded into it as soon as its
+    book arrives instead of waiting for the slowest one.
+    """
+    snapshot_start = time.perf_counter()
     with ThreadPoolExecutor(max_workers=6) as ex:
-        f_binance = ex.submit(fetch_binance_both_sides)
-        f_mexc = ex.submit(fetch_mexc_both_sides)
-        f_okx = ex.submit(fetch_exchange_both_sides, "okx")
+        futures = {
+            submit_in_market(ex, fetch_binance_both_sides): 'BINANCE',
+            submit_in_market(ex, fetch_mexc_both_sides): 'MEXC',
+            submit_in_market(ex, fetch_exchange_both_sides, "okx"): 'OKX'
+        }
         f_peg = ex.submit(fetch_usdt_peg)
         
-        binance_data = f_binance.result() or []
-        mexc_data = f_mexc.result() or []
-        okx_data = f_okx.result() or []
-        peg = f_peg.result() or 1.0
+        books = {}
+        for future in as_completed(futures):
+            source = futures[future]
+            books[source] = future.result() or []
+            if spread_book is not None:
+                update_spread_book(spread_book, source, books[source], peg)
+        
+        binance_data = books['BINANCE']
+        mexc_data = books['MEXC']
+        okx_data = books['OKX']
+        f_peg.result()
         
         total = len(binance_data) + len(mexc_data) + len(okx_data)
         print(f"   📊 Collected {total} ads total (Binance, MEXC, OKX)", file=sys.stderr)
         
+        for source, book in books.items():
+            for side in ('BUY', 'SELL'):
+                prom_set("etb_ads", sum(1 for ad in book if ad.get('ad_type') == side), {'market': _market.get(), 'source': source, 'side': side})
+        prom_observe("etb_snapshot_seconds", time.perf_counter() - snapshot_start, {'market': _market.get()})
+        
         return binance_data + mexc_data + okx_data
 
 def remove_outliers(ads, peg):
@@ -686,9 +1729,9 @@ def remove_outliers(ads, peg):
     return filtered
 
 def load_market_state():
-    if os.path.exists(SNAPSHOT_FILE):
+    if os.path.exists(market_path(SNAPSHOT_FILE)):
         try:
-            with open(SNAPSHOT_FILE, 'r') as f:
+            with open(market_path(SNAPSHOT_FILE), 'r') as f:
                 return json.load(f)
         except:
             return {}
@@ -703,8 +1746,7 @@ def save_market_state(current_ads):
             'ad_type': ad.get('ad_type', 'SELL')
         }
     
-    with open(SNAPSHOT_FILE, 'w') as f:
-        json.dump(state, f)
+    write_artifact(market_path(SNAPSHOT_FILE), state)
 
 def detect_real_trades(current_ads, peg):
     """CONSERVATIVE TRADE DETECTION - PARTIAL FILLS ONLY"""
@@ -767,7 +1809,7 @@ def detect_real_trades(current_ads, peg):
                 vol = prev_data
             
             if vol >= 100:
-                print(f"   ⚪ AD GONE (not counted): {source} - {username[:15]} had {vol:,.0f} USDT", file=sys.stderr)
+                print(f"   ⚪ AD GONE (not counted): {source} - {username[:15]} had {vol:,.0f} {current_market()['asset']}", file=sys.stderr)
     
     new_ads = set(current_state.keys()) - set(prev_state.keys())
     
@@ -805,7 +1847,7 @@ def detect_real_trades(current_ads, peg):
                 'vol_usd': vol,
                 'timestamp': time.time()
             })
-            print(f"   {emoji} {request_type}: {source} - {ad['advertiser'][:15]} posted {vol:,.0f} USDT @ {ad['price']/peg:.2f} ETB", file=sys.stderr)
+            print(f"   {emoji} {request_type}: {source} - {ad['advertiser'][:15]} posted {vol:,.0f} {current_market()['asset']} @ {ad['price']/peg:.2f} {current_market()['fiat']}", file=sys.stderr)
     
     for ad in current_ads:
         source = ad['source'].upper()
@@ -829,7 +1871,7 @@ def detect_real_trades(current_ads, peg):
             
             if curr_inventory < prev_inventory and diff >= 1:
                 if diff > MAX_SINGLE_TRADE:
-                    print(f"   ⚠️ SKIPPED (too large): {source} - {ad['advertiser'][:15]} claimed {diff:,.0f} USDT", file=sys.stderr)
+                    print(f"   ⚠️ SKIPPED (too large): {source} - {ad['advertiser'][:15]} claimed {diff:,.0f} {current_market()['asset']}", file=sys.stderr)
                     continue
                 
                 if ad_type.upper() in ['SELL', 'SELL_AD']:
@@ -851,38 +1893,48 @@ def detect_real_trades(current_ads, peg):
                     'reason': 'inventory_change',
                     'confidence': 'high'
                 })
-                print(f"   {emoji} {action_desc}: {source} - {ad['advertiser'][:15]} {diff:,.0f} USDT @ {ad['price']/peg:.2f} ETB", file=sys.stderr)
+                print(f"   {emoji} {action_desc}: {source} - {ad['advertiser'][:15]} {diff:,.0f} {current_market()['asset']} @ {ad['price']/peg:.2f} {current_market()['fiat']}", file=sys.stderr)
             
             elif curr_inventory > prev_inventory and diff >= 1:
-                print(f"   ➕ FUNDED: {source} - {ad['advertiser'][:15]} added {diff:,.0f} USDT", file=sys.stderr)
+                print(f"   ➕ FUNDED: {source} - {ad['advertiser'][:15]} added {diff:,.0f} {current_market()['asset']}", file=sys.stderr)
     
     print(f"\n   📊 DETECTION SUMMARY:", file=sys.stderr)
     print(f"   > Requests posted: {len(requests)}", file=sys.stderr)
     print(f"   > Trades detected: {len(trades)} ({len([t for t in trades if t['type']=='buy'])} buys 🟢, {len([t for t in trades if t['type']=='sell'])} sells 🔴)", file=sys.stderr)
     print(f"   > Checked: Binance={sources_checked.get('BINANCE', 0)}, MEXC={sources_checked.get('MEXC', 0)}, OKX={sources_checked.get('OKX', 0)}", file=sys.stderr)
     
+    record_detection_metrics(trades + requests)
     return trades + requests
 
+def record_detection_metrics(events):
+    for event_type in ('buy', 'sell', 'request'):
+        n = len([t for t in events if t['type'] == event_type])
+        prom_set("etb_trades_last_round", n, {'market': _market.get(), 'type': event_type})
+        if n:
+            prom_inc("etb_trades_detected_total", {'market': _market.get(), 'type': event_type}, n)
+
 def load_recent_trades():
-    if not os.path.exists(TRADES_FILE):
+    if not os.path.exists(market_path(TRADES_FILE)):
         return []
     
     try:
-        with open(TRADES_FILE, "r") as f:
+        with open(market_path(TRADES_FILE), "r") as f:
             all_trades = json.load(f)
         
         cutoff = time.time() - (TRADE_RETENTION_MINUTES * 60)
         
         valid_trades = []
         for t in all_trades:
-            if t.get("timestamp", 0) > cutoff and t.get("type") in ['buy', 'sell', 'request']:
+            if t.get("timestamp", 0) > cutoff and t.get("type") in FEED_EVENT_TYPES:
                 valid_trades.append(t)
         
         buys = len([t for t in valid_trades if t['type'] == 'buy'])
         sells = len([t for t in valid_trades if t['type'] == 'sell'])
         requests = len([t for t in valid_trades if t['type'] == 'request'])
+        arbs = len([t for t in valid_trades if t['type'] == 'arbitrage'])
+        anomalies = len([t for t in valid_trades if t['type'] == 'anomaly'])
         
-        print(f"   > Loaded {len(valid_trades)} events from last 24h ({buys} buys, {sells} sells, {requests} requests)", file=sys.stderr)
+        print(f"   > Loaded {len(valid_trades)} events from last 24h ({buys} buys, {sells} sells, {requests} requests, {arbs} arbitrage, {anomalies} anomalies)", file=sys.stderr)
         return valid_trades
     except Exception as e:
         print(f"   > Error loading trades: {e}", file=sys.stderr)
@@ -915,8 +1967,7 @@ def save_trades(new_trades):
     cutoff = time.time() - (TRADE_RETENTION_MINUTES * 60)
     filtered = [t for t in all_trades if t.get("timestamp", 0) > cutoff]
     
-    with open(TRADES_FILE, "w") as f:
-        json.dump(filtered, f)
+    write_artifact(market_path(TRADES_FILE), filtered)
     
     print(f"   > Saved {len(filtered)} events to history", file=sys.stderr)
 
@@ -933,7 +1984,8 @@ def analyze(prices, peg):
         elif isinstance(item, dict) and 'price' in item:
             prices_float.append(float(item['price']))
     
-    clean_prices = sorted([p for p in prices_float if 10 < p < 500])
+    low, high = current_market()['price_band']
+    clean_prices = sorted([p for p in prices_float if low < p < high])
     if len(clean_prices) < 2:
         return None
     
@@ -954,41 +2006,71 @@ def analyze(prices, peg):
         "raw_data": adj, "count": n
     }
 
-def calculate_price_distribution(ads, peg, bin_size=5):
-    if not ads:
-        return []
-    
-    prices = [ad['price'] / peg for ad in ads if isinstance(ad, dict) and 'price' in ad]
-    if not prices:
-        return []
-    
-    bins = {}
-    for price in prices:
-        bin_start = int(price / bin_size) * bin_size
-        bin_key = f"{bin_start}-{bin_start + bin_size}"
-        bins[bin_key] = bins.get(bin_key, 0) + 1
-    
-    return sorted(bins.items(), key=lambda x: float(x[0].split('-')[0]))
-
 # --- HISTORY ---
-def save_to_history(stats, official):
-    file_exists = os.path.isfile(HISTORY_FILE)
-    with open(HISTORY_FILE, "a", newline="") as f:
+def history_header():
+    header = ["Timestamp", "Median", "Q1", "Q3", "Official"]
+    for size in SLIPPAGE_LADDER:
+        header += [f"Buy_{size}", f"Sell_{size}"]
+    return header
+
+def migrate_history_header(path, header):
+    """Rewrite a history file whose header predates the current columns, padding old rows to full width"""
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        if next(reader, None) == header:
+            return
+        rows = list(reader)
+    
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    for row in rows:
+        if row:
+            w.writerow(row + [""] * (len(header) - len(row)))
+    _atomic_write(path, buf.getvalue().encode("utf-8"))
+    print(f"   🔧 Migrated {path} to {len(header)} columns", file=sys.stderr)
+
+def save_to_history(stats, official, slippage_ladder=None):
+    """Append one history row and advance the running indicators; returns the indicators"""
+    history_path = market_path(HISTORY_FILE)
+    file_exists = os.path.isfile(history_path)
+    if os.path.dirname(history_path):
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    indicator_state = load_indicator_state() or bootstrap_indicator_state()
+    
+    # Combined-book effective rates ride along after the original 5 columns
+    ladder_rows = (slippage_ladder or {}).get('ALL', [])
+    header = history_header()
+    if file_exists:
+        migrate_history_header(history_path, header)
+    
+    with open(history_path, "a", newline="") as f:
         w = csv.writer(f)
         if not file_exists:
-            w.writerow(["Timestamp", "Median", "Q1", "Q3", "Official"])
-        w.writerow([
+            w.writerow(header)
+        
+        row = [
             datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             round(stats["median"], 2), round(stats["q1"], 2),
             round(stats["q3"], 2), round(official, 2) if official else 0
-        ])
+        ]
+        for item in ladder_rows[:len(SLIPPAGE_LADDER)]:
+            row += [round(item['buy'], 2) if item['buy'] else "", round(item['sell'], 2) if item['sell'] else ""]
+        w.writerow(row + [""] * (len(header) - len(row)))
+    
+    premium = ((stats["median"] - official) / official * 100) if official else None
+    update_indicators(indicator_state, stats["median"], premium, row[0])
+    save_indicator_state(indicator_state)
+    
+    return compute_indicators(indicator_state)
 
-def load_history():
-    if not os.path.isfile(HISTORY_FILE):
+def load_history(limit=HISTORY_POINTS):
+    """History columns, the newest `limit` rows (None = all of them)"""
+    if not os.path.isfile(market_path(HISTORY_FILE)):
         return [], [], [], [], []
     
     d, m, q1, q3, off = [], [], [], [], []
-    with open(HISTORY_FILE, "r") as f:
+    with span("history.load"), open(market_path(HISTORY_FILE), "r") as f:
         reader = csv.reader(f)
         next(reader, None)
         for row in reader:
@@ -1001,8 +2083,150 @@ def load_history():
             except:
                 pass
     
-    return (d[-HISTORY_POINTS:], m[-HISTORY_POINTS:], 
-            q1[-HISTORY_POINTS:], q3[-HISTORY_POINTS:], off[-HISTORY_POINTS:])
+    if not limit:
+        return d, m, q1, q3, off
+    return (d[-limit:], m[-limit:], 
+            q1[-limit:], q3[-limit:], off[-limit:])
+
+# --- INDICATORS ---
+def new_indicator_state():
+    max_roc = max(ROC_WINDOWS.values())
+    return {
+        'count': 0,
+        'ewma_median': {name: None for name in EWMA_SPANS},
+        'ewma_premium': {name: None for name in EWMA_SPANS},
+        'medians': deque(maxlen=max_roc + 1),
+        'returns': deque(maxlen=VOLATILITY_WINDOW),
+        'ret_sum': 0.0,
+        'ret_sumsq': 0.0,
+        'series': {
+            'dates': deque(maxlen=HISTORY_POINTS),
+            'fast': deque(maxlen=HISTORY_POINTS),
+            'slow': deque(maxlen=HISTORY_POINTS)
+        }
+    }
+
+def update_indicators(state, median, premium, timestamp):
+    """O(1) update of EWMAs, rolling realized volatility and rate-of-change buffers (premium None = no official rate)"""
+    for name, span in EWMA_SPANS.items():
+        alpha = 2 / (span + 1)
+        for key, value in [('ewma_median', median), ('ewma_premium', premium)]:
+            if value is None:
+                continue
+            prev = state[key][name]
+            state[key][name] = value if prev is None else prev + alpha * (value - prev)
+    
+    medians = state['medians']
+    if medians and medians[-1] > 0 and median > 0:
+        ret = math.log(median / medians[-1])
+        returns = state['returns']
+        if len(returns) == returns.maxlen:
+            old = returns[0]
+            state['ret_sum'] -= old
+            state['ret_sumsq'] -= old * old
+        returns.append(ret)
+        state['ret_sum'] += ret
+        state['ret_sumsq'] += ret * ret
+    medians.append(median)
+    
+    names = list(EWMA_SPANS)
+    state['series']['dates'].append(timestamp)
+    state['series']['fast'].append(round(state['ewma_median'][names[0]], 3))
+    state['series']['slow'].append(round(state['ewma_median'][names[-1]], 3))
+    state['count'] += 1
+
+def compute_indicators(state):
+    """Current indicator values from the running state (no pass over history)"""
+    if not state or state['count'] == 0:
+        return None
+    
+    n = len(state['returns'])
+    volatility = None
+    if n >= 2:
+        mean = state['ret_sum'] / n
+        variance = max(state['ret_sumsq'] / n - mean * mean, 0.0)
+        volatility = math.sqrt(variance) * 100
+    
+    medians = state['medians']
+    roc = {}
+    for name, window in ROC_WINDOWS.items():
+        if len(medians) > window and medians[-1 - window] > 0:
+            roc[name] = (medians[-1] / medians[-1 - window] - 1) * 100
+        else:
+            roc[name] = None
+    
+    names = list(EWMA_SPANS)
+    fast = state['ewma_median'][names[0]]
+    slow = state['ewma_median'][names[-1]]
+    gap_pct = (fast - slow) / slow * 100 if slow else 0
+    if gap_pct > 0.5:
+        trend = "increasing"
+    elif gap_pct < -0.5:
+        trend = "decreasing"
+    else:
+        trend = "stable"
+    
+    return {
+        'ewma_median': dict(state['ewma_median']),
+        'ewma_premium': dict(state['ewma_premium']),
+        'volatility_pct': volatility,
+        'volatility_window': n,
+        'roc_pct': roc,
+        'trend': trend,
+        'series': {key: list(values) for key, values in state['series'].items()}
+    }
+
+def load_indicator_state():
+    if not os.path.exists(market_path(INDICATOR_FILE)):
+        return None
+    
+    try:
+        with open(market_path(INDICATOR_FILE), 'r') as f:
+            data = json.load(f)
+        
+        state = new_indicator_state()
+        state['count'] = data['count']
+        state['ewma_median'].update(data['ewma_median'])
+        state['ewma_premium'].update(data['ewma_premium'])
+        state['medians'].extend(data['medians'])
+        state['returns'].extend(data['returns'])
+        state['ret_sum'] = sum(state['returns'])
+        state['ret_sumsq'] = sum(r * r for r in state['returns'])
+        for key in state['series']:
+            state['series'][key].extend(data['series'].get(key, []))
+        return state
+    except Exception as e:
+        print(f"   ⚠️ Error loading indicator state: {e}", file=sys.stderr)
+        return None
+
+def save_indicator_state(state):
+    data = dict(state)
+    data['medians'] = list(state['medians'])
+    data['returns'] = list(state['returns'])
+    data['series'] = {key: list(values) for key, values in state['series'].items()}
+    
+    write_artifact(market_path(INDICATOR_FILE), data)
+
+def bootstrap_indicator_state():
+    """One-off replay of the history CSV when no indicator state exists yet"""
+    state = new_indicator_state()
+    if not os.path.isfile(market_path(HISTORY_FILE)):
+        return state
+    
+    with open(market_path(HISTORY_FILE), "r") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            try:
+                median = float(row[1])
+                official = float(row[4])
+                premium = ((median - official) / official * 100) if official > 0 else None
+                update_indicators(state, median, premium, row[0])
+            except:
+                pass
+    
+    print(f"   📐 Bootstrapped indicators from {state['count']} history rows", file=sys.stderr)
+    return state
 
 # --- STATISTICS CALCULATOR ---
 def calculate_trade_stats(trades):
@@ -1134,1794 +2358,1481 @@ def calculate_market_depth_by_price(ads, peg):
     
     return {'supply': supply_list, 'demand': demand_list}
 
-# --- HTML GENERATOR ---
-def update_website_html(stats, official, timestamp, current_ads, grouped_ads, peg, ai_summary=None, remittance_rates=None):
-    prem = ((stats["median"] - official) / official) * 100 if official else 0
-    cache_buster = int(time.time())
-    
-    dates, medians, q1s, q3s, offs = load_history()
-    price_change = 0
-    price_change_pct = 0
-    if len(medians) > 0:
-        old_median = medians[0]
-        price_change = stats["median"] - old_median
-        price_change_pct = (price_change / old_median * 100) if old_median > 0 else 0
-    
-    # Calculate premiums for each historical point
-    premiums = []
-    for i in range(len(medians)):
-        if i < len(offs) and offs[i] > 0:
-            prem_val = ((medians[i] - offs[i]) / offs[i]) * 100
-            premiums.append(prem_val)
-        else:
-            premiums.append(0)
+# --- ANOMALY DETECTION ---
+def snapshot_metrics(ads, peg, tracked=()):
+    """Single pass over a snapshot: median price, depth per side (total + per source), ads per source
     
-    arrow = "↗" if price_change > 0 else "↘" if price_change < 0 else "→"
-    change_color = "#00C805" if price_change > 0 else "#FF3B30" if price_change < 0 else "#8E8E93"
+    Depth/ad-count keys in `tracked` that this snapshot lacks come back as 0, so a
+    book that vanished entirely reads as a move to zero rather than going unseen.
+    """
+    metrics = {}
+    prices = []
+    low, high = current_market()['price_band']
     
-    # Source summary table (NO remittance rates here)
-    table_rows = ""
-    ticker_items = []
+    for ad in ads:
+        price = ad.get('price', 0)
+        source = ad.get('source', 'Unknown').upper()
+        side = 'SELL' if ad.get('ad_type', 'SELL').upper() in ['SELL', 'SELL_AD'] else 'BUY'
+        vol = ad.get('available', 0)
+        
+        if low < price < high:
+            prices.append(price / peg)
+        metrics[f"depth|ALL|{side}"] = metrics.get(f"depth|ALL|{side}", 0) + vol
+        metrics[f"depth|{source}|{side}"] = metrics.get(f"depth|{source}|{side}", 0) + vol
+        metrics[f"ads|{source}"] = metrics.get(f"ads|{source}", 0) + 1
     
-    for source, ads in grouped_ads.items():
-        prices = [a["price"] for a in ads]
-        s = analyze(prices, peg)
-        if s:
-            ticker_items.append({
-                'source': source,
-                'median': s['median'],
-                'change': 0,
-                'type': 'exchange'
-            })
-            
-            table_rows += f"<tr><td class='source-col'>{source}</td><td>{s['min']:.2f}</td><td>{s['q1']:.2f}</td><td class='med-col'>{s['median']:.2f}</td><td>{s['q3']:.2f}</td><td>{s['max']:.2f}</td><td>{s['count']}</td></tr>"
-        else:
-            table_rows += f"<tr><td>{source}</td><td colspan='6' style='opacity:0.5'>No Data</td></tr>"
+    if prices:
+        metrics["median|ALL"] = statistics.median(prices)
     
-    # Add official rate to ticker
-    ticker_items.append({
-        'source': 'Official',
-        'median': official,
-        'change': 0,
-        'type': 'official',
-        'emoji': '💵',
-        'color': '#34C759'
-    })
+    if ads:  # An empty snapshot is a failed fetch, not every book pulled at once
+        for key in tracked:
+            if not key.startswith("median|"):
+                metrics.setdefault(key, 0)
     
-    # Add remittance rates to ticker ONLY
-    if remittance_rates:
-        for key, data in remittance_rates.items():
-            if key != 'NBE_OFFICIAL':  # Already have official
-                ticker_items.append({
-                    'source': data['name'],
-                    'median': data['rate'],
-                    'change': 0,
-                    'type': 'remittance',
-                    'emoji': data['emoji'],
-                    'color': data['color']
+    return metrics
+
+def load_anomaly_state():
+    state = {}
+    if os.path.exists(market_path(ANOMALY_FILE)):
+        try:
+            with open(market_path(ANOMALY_FILE), 'r') as f:
+                data = json.load(f)
+            for key, m in data.items():
+                values = deque(m['values'], maxlen=ANOMALY_WINDOW)
+                state[key] = {
+                    'values': values,
+                    'sum': sum(values),
+                    'sumsq': sum(v * v for v in values),
+                    'last_ts': m['last_ts']
+                }
+        except Exception as e:
+            print(f"   ⚠️ Error loading anomaly state: {e}", file=sys.stderr)
+    return state
+
+def save_anomaly_state(state):
+    data = {key: {'values': list(m['values']), 'last_ts': m['last_ts']} for key, m in state.items()}
+    write_artifact(market_path(ANOMALY_FILE), data)
+
+def detect_anomalies(state, ads, peg, ts=None):
+    """Compare this snapshot against each metric's rolling window, then fold it in (O(1) per metric)"""
+    ts = ts or time.time()
+    events = []
+    metrics = snapshot_metrics(ads, peg, state)
+    median = metrics.get("median|ALL", 0)
+    
+    for key, value in metrics.items():
+        kind, source = key.split('|')[:2]
+        m = state.get(key)
+        if m is None:
+            m = state[key] = {'values': deque(maxlen=ANOMALY_WINDOW), 'sum': 0.0, 'sumsq': 0.0, 'last_ts': ts}
+        
+        values = m['values']
+        if values and values[-1] > 0:
+            prev = values[-1]
+            change_pct = (value - prev) / prev * 100
+            n = len(values)
+            mean = m['sum'] / n
+            std = max(math.sqrt(max(m['sumsq'] / n - mean * mean, 0.0)), abs(mean) * ANOMALY_STD_FLOOR_PCT / 100)
+            zscore = (value - mean) / std if std > 0 else 0.0
+            
+            big_move = abs(change_pct) >= ANOMALY_MIN_MOVE_PCT[kind]
+            unusual = n < ANOMALY_MIN_SAMPLES or abs(zscore) >= ANOMALY_Z
+            
+            if big_move and unusual:
+                elapsed = int(ts - m['last_ts'])
+                elapsed_str = f"{elapsed}s" if elapsed < 120 else f"{elapsed // 60}min"
+                if kind == 'median':
+                    label = "Median rate"
+                elif kind == 'depth':
+                    label = f"{source} {key.split('|')[2]} depth" if source != 'ALL' else f"Total {key.split('|')[2]} depth"
+                else:
+                    label = f"{source} ad count"
+                message = f"{label} {change_pct:+.0f}% in {elapsed_str}" if kind != 'median' else f"{label} {change_pct:+.2f}% in {elapsed_str}"
+                
+                events.append({
+                    'type': 'anomaly',
+                    'source': source if source != 'ALL' else 'MARKET',
+                    'user': label,
+                    'price': median,
+                    'vol_usd': abs(value - prev) if kind == 'depth' else 0,
+                    'timestamp': ts,
+                    'reason': message,
+                    'metric': key,
+                    'change_pct': change_pct,
+                    'zscore': zscore,
+                    'confidence': 'high' if n >= ANOMALY_MIN_SAMPLES else 'medium'
                 })
+                print(f"   🚨 ANOMALY: {message} (z={zscore:+.1f})", file=sys.stderr)
+        
+        if len(values) == values.maxlen:
+            old = values[0]
+            m['sum'] -= old
+            m['sumsq'] -= old * old
+        values.append(value)
+        m['sum'] += value
+        m['sumsq'] += value * value
+        m['last_ts'] = ts
+    
+    return events
+
+# --- LIQUIDITY ENGINE ---
+def _build_price_ladder(levels):
+    """Turn (price, volume) levels already in fill order into prefix-sum arrays"""
+    prices, cum_vol, cum_cost = [], [], []
+    vol_total = 0.0
+    cost_total = 0.0
+
+    for price, vol in levels:
+        vol_total += vol
+        cost_total += price * vol
+        prices.append(price)
+        cum_vol.append(vol_total)
+        cum_cost.append(cost_total)
+
+    return {'prices': prices, 'cum_vol': cum_vol, 'cum_cost': cum_cost}
+
+def build_liquidity_book(ads, peg):
+    """Build per-side cumulative volume ladders, per source and combined ('ALL').
+
+    'buy' walks SELL ads from the cheapest ask up (what a taker pays to buy USDT),
+    'sell' walks BUY ads from the highest bid down (what a taker gets selling USDT).
+    """
+    levels = {'ALL': {'buy': [], 'sell': []}}
+
+    for ad in ads:
+        price = ad.get('price', 0) / peg
+        vol = ad.get('available', 0)
+        if price <= 0 or vol <= 0:
+            continue
+
+        source = ad.get('source', 'Unknown')
+        side = 'buy' if ad.get('ad_type', 'SELL').upper() in ['SELL', 'SELL_AD'] else 'sell'
+
+        if source not in levels:
+            levels[source] = {'buy': [], 'sell': []}
+        levels[source][side].append((price, vol))
+        levels['ALL'][side].append((price, vol))
+
+    book = {}
+    for scope, sides in levels.items():
+        book[scope] = {
+            'buy': _build_price_ladder(sorted(sides['buy'])),
+            'sell': _build_price_ladder(sorted(sides['sell'], reverse=True))
+        }
+
+    return book
+
+def effective_rate(book, side, size, source='ALL'):
+    """Volume-weighted fiat rate to buy/sell `size` of the market's asset in O(log n), None if the book is too thin"""
+    ladder = book.get(source, {}).get(side)
+    if not ladder or size <= 0 or not ladder['cum_vol'] or ladder['cum_vol'][-1] < size:
+        return None
+
+    idx = bisect.bisect_left(ladder['cum_vol'], size)
+    prev_vol = ladder['cum_vol'][idx - 1] if idx > 0 else 0.0
+    prev_cost = ladder['cum_cost'][idx - 1] if idx > 0 else 0.0
+
+    cost = prev_cost + (size - prev_vol) * ladder['prices'][idx]
+    return cost / size
+
+def calculate_slippage_ladder(book, sizes=None):
+    """Effective rate and slippage vs top of book for each ticket size, per scope"""
+    sizes = sizes or SLIPPAGE_LADDER
+    ladder = {}
+
+    for scope, sides in book.items():
+        rows = []
+        for size in sizes:
+            row = {'size': size}
+            for side in ['buy', 'sell']:
+                rate = effective_rate(book, side, size, scope)
+                prices = sides[side]['prices']
+                best = prices[0] if prices else None
+                row[side] = round(rate, 4) if rate else None
+                row[f'{side}_slippage_pct'] = round(abs(rate - best) / best * 100, 3) if rate and best else None
+            rows.append(row)
+        ladder[scope] = rows
+
+    return ladder
+
+# --- ARBITRAGE ---
+def new_spread_book():
+    """Per-run spread engine state: latest per-exchange ladders + open crossings.
     
-    # Distribution table
-    distribution = calculate_price_distribution(current_ads, peg, bin_size=5)
-    dist_rows = ""
-    if distribution:
-        max_count = max([c for _, c in distribution])
-        for price_range, count in distribution:
-            style_str = "font-weight:bold;color:var(--accent)" if count == max_count else ""
-            dist_rows += f"<tr><td style='{style_str}'>{price_range} ETB</td><td style='{style_str}'>{count}</td></tr>"
-    else:
-        dist_rows = "<tr><td colspan='2' style='opacity:0.5'>No Data</td></tr>"
-    
-    # Load recent trades
-    recent_trades = load_recent_trades()
-    buys_count = len([t for t in recent_trades if t.get('type') == 'buy'])
-    sells_count = len([t for t in recent_trades if t.get('type') == 'sell'])
-    
-    # Chart data - only 3 exchanges now
-    chart_data = {'BINANCE': [], 'MEXC': [], 'OKX': []}
-    for source, ads in grouped_ads.items():
-        prices = [a["price"] / peg for a in ads if a.get("price", 0) > 0]
-        if prices and source in chart_data:
-            chart_data[source] = prices
-    
-    chart_data_json = json.dumps(chart_data)
-    
-    # History data with premiums
-    history_data = {
-        'dates': [d.isoformat() if hasattr(d, 'isoformat') else str(d) for d in dates] if dates else [],
-        'medians': medians if medians else [],
-        'officials': [o if o else 0 for o in offs] if offs else [],
-        'premiums': premiums
+    Pairs already announced carry over from the previous run, so a crossing
+    that stays open across runs is only emitted once.
+    """
+    return {'books': {}, 'crossings': {}, 'emitted': load_arbitrage_state()}
+
+def load_arbitrage_state():
+    """(buy, sell) pairs whose crossing was open at the end of the last run"""
+    if os.path.exists(market_path(ARBITRAGE_FILE)):
+        try:
+            with open(market_path(ARBITRAGE_FILE), 'r') as f:
+                return {tuple(pair) for pair in json.load(f)['open']}
+        except Exception as e:
+            print(f"   ⚠️ Error loading arbitrage state: {e}", file=sys.stderr)
+    return set()
+
+def save_arbitrage_state(spread_book):
+    write_artifact(market_path(ARBITRAGE_FILE), {'open': sorted(list(pair) for pair in spread_book['emitted'])})
+
+def _crossing(ask_book, bid_book):
+    """Crossed spread between buying on one exchange and selling on another, or None"""
+    asks = ask_book['buy']
+    bids = bid_book['sell']
+    if not asks['prices'] or not bids['prices']:
+        return None
+
+    best_ask = asks['prices'][0]
+    best_bid = bids['prices'][0]
+    if best_bid <= best_ask:
+        return None
+
+    # Volume on each side that is still profitable against the other side's best price
+    n_asks = bisect.bisect_left(asks['prices'], best_bid)
+    n_bids = bisect.bisect_left(bids['prices'], -best_ask, key=lambda p: -p)
+    ask_vol = asks['cum_vol'][n_asks - 1] if n_asks > 0 else 0
+    bid_vol = bids['cum_vol'][n_bids - 1] if n_bids > 0 else 0
+
+    return {
+        'best_ask': best_ask,
+        'best_bid': best_bid,
+        'spread': best_bid - best_ask,
+        'spread_pct': (best_bid - best_ask) / best_ask * 100,
+        'volume': min(ask_vol, bid_vol)
     }
-    history_data_json = json.dumps(history_data)
-    
-    volume_by_exchange = calculate_volume_by_exchange(recent_trades)
-    trade_volume_json = json.dumps(volume_by_exchange)
-    
-    # Calculate market depth by price for stacked chart
-    market_depth = calculate_market_depth_by_price(current_ads, peg)
-    market_depth_json = json.dumps(market_depth)
-    
-    feed_html = generate_feed_html(recent_trades, peg)
+
+def update_spread_book(spread_book, source, ads, peg):
+    """Fold one exchange's fresh book in and recompute only the pairs it touches"""
+    book = build_liquidity_book(ads, peg).get(source)
+    if not book:
+        book = {'buy': _build_price_ladder([]), 'sell': _build_price_ladder([])}
+    spread_book['books'][source] = book
+
+    for other, other_book in spread_book['books'].items():
+        if other == source:
+            continue
+        for buy_src, sell_src, ask_book, bid_book in [
+            (source, other, book, other_book),
+            (other, source, other_book, book)
+        ]:
+            crossing = _crossing(ask_book, bid_book)
+            if crossing:
+                spread_book['crossings'][(buy_src, sell_src)] = crossing
+            else:
+                spread_book['crossings'].pop((buy_src, sell_src), None)
+
+def best_quotes(spread_book):
+    """Best bid/ask per exchange from the spread engine"""
+    quotes = {}
+    for source, book in spread_book['books'].items():
+        quotes[source] = {
+            'best_ask': book['buy']['prices'][0] if book['buy']['prices'] else None,
+            'best_bid': book['sell']['prices'][0] if book['sell']['prices'] else None
+        }
+    return quotes
+
+def detect_arbitrage(spread_book):
+    """Emit feed events for cross-exchange spreads that opened since the last round"""
+    events = []
+    active = set()
+
+    for (buy_src, sell_src), crossing in spread_book['crossings'].items():
+        if crossing['spread_pct'] < ARB_MIN_SPREAD_PCT or crossing['volume'] < 10:
+            continue
+
+        pair = (buy_src, sell_src)
+        active.add(pair)
+        if pair in spread_book['emitted']:
+            continue
+
+        events.append({
+            'type': 'arbitrage',
+            'source': buy_src,
+            'sell_source': sell_src,
+            'user': f"{buy_src} → {sell_src}",
+            'price': crossing['best_ask'],
+            'sell_price': crossing['best_bid'],
+            'spread_pct': crossing['spread_pct'],
+            'vol_usd': crossing['volume'],
+            'timestamp': time.time(),
+            'reason': 'cross_exchange_spread',
+            'confidence': 'high'
+        })
+        print(f"   ⚖️ ARBITRAGE: buy {buy_src} @ {crossing['best_ask']:.2f} → sell {sell_src} @ {crossing['best_bid']:.2f} {current_market()['fiat']} (+{crossing['spread_pct']:.2f}%, {crossing['volume']:,.0f} {current_market()['asset']})", file=sys.stderr)
+
+    spread_book['emitted'] = active
+    return events
+
+# --- QUANTILE SKETCH ---
+def new_sketch(k=SKETCH_K):
+    """Empty KLL sketch: level h holds items that each stand for 2^h observations"""
+    return {'k': k, 'n': 0, 'levels': [[]]}
+
+def _sketch_capacity(k, height, level):
+    return max(2, int(math.ceil(k * (2 / 3) ** (height - level - 1))))
+
+def _compact_sketch(sketch):
+    """Halve over-full levels (random odd/even survivors) until the sketch fits"""
+    levels = sketch['levels']
+    k = sketch['k']
+
+    while True:
+        height = len(levels)
+        if sum(len(l) for l in levels) <= sum(_sketch_capacity(k, height, h) for h in range(height)):
+            return
+
+        for h in range(height):
+            if len(levels[h]) >= _sketch_capacity(k, height, h):
+                if h + 1 == len(levels):
+                    levels.append([])
+                items = sorted(levels[h])
+                keep = [items.pop()] if len(items) % 2 else []
+                levels[h + 1].extend(items[random.randint(0, 1)::2])
+                levels[h] = keep
+                break
+
+def sketch_add(sketch, values):
+    sketch['levels'][0].extend(round(v, 3) for v in values)
+    sketch['n'] += len(values)
+    _compact_sketch(sketch)
+
+def sketch_merge(sketches):
+    """Merge any number of sketches into a new one (inputs are left untouched)"""
+    merged = new_sketch(sketches[0]['k'] if sketches else SKETCH_K)
+    for sketch in sketches:
+        for h, items in enumerate(sketch['levels']):
+            while len(merged['levels']) <= h:
+                merged['levels'].append([])
+            merged['levels'][h].extend(items)
+        merged['n'] += sketch['n']
+    _compact_sketch(merged)
+    return merged
+
+def sketch_quantiles(sketch, qs):
+    weighted = sorted((v, 2 ** h) for h, items in enumerate(sketch['levels']) for v in items)
+    if not weighted:
+        return [None] * len(qs)
+
+    total = sum(w for _, w in weighted)
+    results = []
+    for q in qs:
+        target = q * total
+        acc = 0
+        value = weighted[-1][0]
+        for v, w in weighted:
+            acc += w
+            if acc >= target:
+                value = v
+                break
+        results.append(value)
+    return results
+
+def load_price_sketches():
+    if os.path.exists(market_path(SKETCH_FILE)):
+        try:
+            with open(market_path(SKETCH_FILE), 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+    return {}
+
+def save_price_sketches(store):
+    cutoff = time.time() - SKETCH_RETENTION_SECONDS
+    pruned = {bucket: sketch for bucket, sketch in store.items() if int(bucket) + SKETCH_BUCKET_SECONDS > cutoff}
+
+    write_artifact(market_path(SKETCH_FILE), pruned)
+
+def record_snapshot_prices(store, ads, peg, ts=None):
+    """Fold one snapshot's prices into the sketch for its time bucket"""
+    ts = ts or time.time()
+    low, high = current_market()['price_band']
+    prices = [ad['price'] / peg for ad in ads if low < ad.get('price', 0) < high]
+    if not prices:
+        return
+
+    bucket = str(int(ts // SKETCH_BUCKET_SECONDS) * SKETCH_BUCKET_SECONDS)
+    if bucket not in store:
+        store[bucket] = new_sketch()
+    sketch_add(store[bucket], prices)
+
+def rolling_price_quantiles(store, now=None):
+    """p05/q1/median/q3/p95 over every snapshot in the last 1h/24h/7d (bucket-aligned)"""
+    now = now or time.time()
+    windows = {}
+
+    for name, seconds in SKETCH_WINDOWS.items():
+        cutoff = now - seconds
+        sketches = [sketch for bucket, sketch in store.items() if int(bucket) + SKETCH_BUCKET_SECONDS > cutoff]
+        if not sketches:
+            continue
+
+        merged = sketch_merge(sketches)
+        p05, q1, median, q3, p95 = sketch_quantiles(merged, [0.05, 0.25, 0.5, 0.75, 0.95])
+        windows[name] = {
+            'p05': p05, 'q1': q1, 'median': median, 'q3': q3, 'p95': p95,
+            'count': merged['n']
+        }
+
+    return windows
+
+# --- ARTIFACT WRITER ---
+_artifact_hashes = None
+_state_lock = threading.RLock()  # Lazy state loads and pool start-up, shared by concurrent markets
+
+def load_artifact_hashes():
+    """Semantic hash of each output as of its last write"""
+    global _artifact_hashes
+    with _state_lock:
+        if _artifact_hashes is None:
+            _artifact_hashes = {}
+            if os.path.exists(ARTIFACT_STATE_FILE):
+                try:
+                    with open(ARTIFACT_STATE_FILE, 'r') as f:
+                        _artifact_hashes = json.load(f)
+                except:
+                    _artifact_hashes = {}
+    return _artifact_hashes
+
+def save_artifact_hashes():
+    hashes = load_artifact_hashes()
+    _atomic_write(ARTIFACT_STATE_FILE, json.dumps({path: digest for path, digest in list(hashes.items()) if os.path.exists(path)}).encode())
+
+def _atomic_write(path, data):
+    """Write bytes to a temp file next to path, fsync, then os.replace it into place.
     
-    trade_stats = calculate_trade_stats(recent_trades)
-    hour_buys = trade_stats['hour_buys']
-    hour_sells = trade_stats['hour_sells']
-    hour_buy_volume = trade_stats['hour_buy_volume']
-    hour_sell_volume = trade_stats['hour_sell_volume']
-    today_buys = trade_stats['today_buys']
-    today_sells = trade_stats['today_sells']
-    today_buy_volume = trade_stats['today_buy_volume']
-    today_sell_volume = trade_stats['today_sell_volume']
-    week_buys = trade_stats['week_buys']
-    week_sells = trade_stats['week_sells']
-    week_buy_volume = trade_stats['week_buy_volume']
-    week_sell_volume = trade_stats['week_sell_volume']
-    overall_buys = trade_stats['overall_buys']
-    overall_sells = trade_stats['overall_sells']
-    overall_buy_volume = trade_stats['overall_buy_volume']
-    overall_sell_volume = trade_stats['overall_sell_volume']
-    
-    # Generate ticker HTML with remittance rates
-    ticker_html = ""
-    for item in ticker_items * 3:
-        change_symbol = "▲" if item['change'] > 0 else "▼" if item['change'] < 0 else "━"
-        change_color = "#00C805" if item['change'] > 0 else "#FF3B30" if item['change'] < 0 else "#8E8E93"
-        
-        source_display = item['source']
-        
-        # Exchange colors
-        if item.get('type') == 'exchange':
-            if item['source'] == 'BINANCE':
-                source_display = f"🟡 {item['source']}"
-            elif item['source'] == 'MEXC':
-                source_display = f"🔵 {item['source']}"
-            elif item['source'] == 'OKX':
-                source_display = f"🟣 {item['source']}"
-        elif item.get('type') == 'official':
-            source_display = f"💵 {item['source']}"
-        elif item.get('type') == 'remittance':
-            source_display = f"{item.get('emoji', '💱')} {item['source']}"
-        
-        # Color based on type
-        if item.get('type') == 'remittance':
-            price_color = item.get('color', '#34C759')
-        else:
-            price_color = 'var(--text)'
-        
-        ticker_html += f"""
-        <div class="ticker-item">
-            <span class="ticker-source">{source_display}</span>
-            <span class="ticker-price" style="color:{price_color}">{item['median']:.2f} ETB</span>
-            <span class="ticker-change" style="color:{change_color}">{change_symbol}</span>
-        </div>
-        """
+    Readers (and a crashed run's successor) see the old file or the new one, never a torn write.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
     
-    # AI Summary HTML at BOTTOM
-    ai_summary_html = ""
-    if ai_summary:
-        sentiment = ai_summary.get('market_sentiment', 'neutral')
-        sentiment_color = '#00C805' if sentiment == 'bullish' else '#FF3B30' if sentiment == 'bearish' else '#FF9500'
-        sentiment_emoji = '📈' if sentiment == 'bullish' else '📉' if sentiment == 'bearish' else '➡️'
-        
-        is_fallback = ai_summary.get('is_fallback', False)
-        source_text = "Rule-Based Analysis" if is_fallback else "Powered by Google Gemini AI"
-        source_badge = '<span style="background:#FF950033;color:#FF9500;padding:2px 8px;border-radius:4px;font-size:11px;margin-left:8px;">FALLBACK</span>' if is_fallback else ''
-        
-        insights_html = ""
-        for insight in ai_summary.get('key_insights', []):
-            insights_html += f"<li style='margin-bottom:8px;'>{insight}</li>"
-        
-        risks_html = ""
-        for risk in ai_summary.get('risk_factors', []):
-            risks_html += f"<li style='margin-bottom:8px;color:#FF9500;'>{risk}</li>"
-        
-        # Black market drivers
-        bm_drivers_html = ""
-        for driver in ai_summary.get('black_market_drivers', []):
-            bm_drivers_html += f"<li style='margin-bottom:8px;'>{driver}</li>"
-        
-        # Official rate factors
-        official_factors_html = ""
-        for factor in ai_summary.get('official_rate_factors', []):
-            official_factors_html += f"<li style='margin-bottom:8px;'>{factor}</li>"
-        
-        gap_explanation = ai_summary.get('gap_explanation', 'No explanation available')
-        
-        # Get forecasts
-        short_forecast = ai_summary.get('short_term_forecast', ai_summary.get('short_term_prediction', 'Not available'))
-        medium_forecast = ai_summary.get('medium_term_forecast', 'Not available')
-        confidence = ai_summary.get('confidence_level', 'medium')
-        confidence_color = '#00C805' if confidence == 'high' else '#FF9500' if confidence == 'medium' else '#FF3B30'
-        
-        ai_summary_html = f"""
-        <div style="background:linear-gradient(135deg, var(--card), rgba(10,132,255,0.1));padding:30px;border-radius:16px;margin-top:30px;border:2px solid var(--accent);">
-            <div style="display:flex;align-items:center;gap:12px;margin-bottom:20px;flex-wrap:wrap;">
-                <span style="font-size:32px;">🤖</span>
-                <div>
-                    <div style="font-size:22px;font-weight:700;color:var(--text);">AI Market Analysis & Forecast{source_badge}</div>
-                    <div style="font-size:13px;color:var(--text-secondary);">{source_text} • {ai_summary.get('generated_at', 'recently')[:16]}</div>
-                </div>
-                <div style="margin-left:auto;display:flex;gap:10px;flex-wrap:wrap;">
-                    <div style="background:{sentiment_color}22;padding:8px 16px;border-radius:20px;border:1px solid {sentiment_color};">
-                        <span style="font-size:18px;">{sentiment_emoji}</span>
-                        <span style="color:{sentiment_color};font-weight:700;text-transform:uppercase;">{sentiment}</span>
-                    </div>
-                    <div style="background:{confidence_color}22;padding:8px 16px;border-radius:20px;border:1px solid {confidence_color};">
-                        <span style="color:{confidence_color};font-weight:600;">Confidence: {confidence.upper()}</span>
-                    </div>
-                </div>
-            </div>
-            
-            <div style="background:var(--bg);padding:20px;border-radius:12px;margin-bottom:20px;">
-                <div style="font-size:16px;line-height:1.7;color:var(--text);">
-                    {ai_summary.get('summary', 'Analysis not available.')}
-                </div>
-            </div>
-            
-            <!-- WHY THE GAP SECTION -->
-            <div style="background:linear-gradient(135deg, rgba(255,149,0,0.15), rgba(255,149,0,0.05));padding:20px;border-radius:12px;margin-bottom:20px;border:1px solid rgba(255,149,0,0.4);">
-                <div style="font-weight:700;color:var(--orange);margin-bottom:12px;font-size:18px;">📊 Why the {prem:.1f}% Gap Between Black Market & Official Rate?</div>
-                <div style="color:var(--text);line-height:1.7;font-size:15px;">{gap_explanation}</div>
-            </div>
-            
-            <!-- DRIVERS SECTION -->
-            <div style="display:grid;grid-template-columns:1fr 1fr;gap:20px;margin-bottom:20px;">
-                <div style="background:rgba(255,59,48,0.1);padding:20px;border-radius:12px;border:1px solid rgba(255,59,48,0.3);">
-                    <div style="font-weight:700;color:var(--red);margin-bottom:12px;font-size:16px;">🔴 Black Market Drivers</div>
-                    <ul style="margin:0;padding-left:20px;color:var(--text);line-height:1.6;">
-                        {bm_drivers_html if bm_drivers_html else '<li>High USD demand from businesses</li><li>Limited forex in official channels</li>'}
-                    </ul>
-                </div>
-                
-                <div style="background:rgba(52,199,89,0.1);padding:20px;border-radius:12px;border:1px solid rgba(52,199,89,0.3);">
-                    <div style="font-weight:700;color:#34C759;margin-bottom:12px;font-size:16px;">🏛️ Official Rate Factors</div>
-                    <ul style="margin:0;padding-left:20px;color:var(--text);line-height:1.6;">
-                        {official_factors_html if official_factors_html else '<li>NBE monetary policy</li><li>IMF program requirements</li>'}
-                    </ul>
-                </div>
-            </div>
-            
-            <div style="display:grid;grid-template-columns:1fr 1fr;gap:20px;">
-                <div style="background:rgba(0,200,5,0.1);padding:20px;border-radius:12px;border:1px solid rgba(0,200,5,0.3);">
-                    <div style="font-weight:700;color:var(--green);margin-bottom:12px;font-size:16px;">💡 Key Insights</div>
-                    <ul style="margin:0;padding-left:20px;color:var(--text);line-height:1.6;">
-                        {insights_html}
-                    </ul>
-                </div>
-                
-                <div style="background:rgba(255,149,0,0.1);padding:20px;border-radius:12px;border:1px solid rgba(255,149,0,0.3);">
-                    <div style="font-weight:700;color:var(--orange);margin-bottom:12px;font-size:16px;">⚠️ Risk Factors</div>
-                    <ul style="margin:0;padding-left:20px;line-height:1.6;">
-                        {risks_html}
-                    </ul>
-                </div>
-            </div>
-            
-            <!-- FORECASTING SECTION -->
-            <div style="display:grid;grid-template-columns:1fr 1fr;gap:20px;margin-top:20px;">
-                <div style="background:linear-gradient(135deg, rgba(10,132,255,0.15), rgba(10,132,255,0.05));padding:20px;border-radius:12px;border:1px solid rgba(10,132,255,0.4);">
-                    <div style="font-weight:700;color:var(--accent);margin-bottom:8px;font-size:16px;">📅 Short-Term Forecast (1-7 Days)</div>
-                    <div style="color:var(--text);line-height:1.6;">{short_forecast}</div>
-                </div>
-                
-                <div style="background:linear-gradient(135deg, rgba(88,86,214,0.15), rgba(88,86,214,0.05));padding:20px;border-radius:12px;border:1px solid rgba(88,86,214,0.4);">
-                    <div style="font-weight:700;color:#5856D6;margin-bottom:8px;font-size:16px;">📆 Medium-Term Outlook (1-4 Weeks)</div>
-                    <div style="color:var(--text);line-height:1.6;">{medium_forecast}</div>
-                </div>
-            </div>
-            
-            <div style="background:var(--card);padding:20px;border-radius:12px;border:1px solid var(--border);margin-top:20px;">
-                <div style="font-weight:700;color:var(--accent);margin-bottom:8px;">💰 Recommendation</div>
-                <div style="color:var(--text);line-height:1.6;">{ai_summary.get('recommendation', 'Not available')}</div>
-            </div>
-        </div>
-        """
-    else:
-        ai_summary_html = """
-        <div style="background:var(--card);padding:30px;border-radius:16px;margin-top:30px;border:1px solid var(--border);text-align:center;">
-            <span style="font-size:48px;">🤖</span>
-            <div style="font-size:18px;font-weight:600;margin-top:12px;color:var(--text);">AI Analysis Loading...</div>
-            <div style="font-size:14px;color:var(--text-secondary);margin-top:8px;">Gemini AI will analyze the market on next update</div>
-        </div>
-        """
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta http-equiv="Cache-Control" content="no-cache, no-store, must-revalidate">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <meta http-equiv="refresh" content="300">
-        <title>ETB Market v42.9 - AI Powered + Remittance Rates</title>
-        <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-        <style>
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-            
-            :root {{
-                --bg: #000000;
-                --card: #1C1C1E;
-                --card-hover: #2C2C2E;
-                --text: #FFFFFF;
-                --text-secondary: #8E8E93;
-                --green: #00C805;
-                --red: #FF3B30;
-                --orange: #FF9500;
-                --border: #38383A;
-                --accent: #0A84FF;
-            }}
-            
-            [data-theme="light"] {{
-                --bg: #F2F2F7;
-                --card: #FFFFFF;
-                --card-hover: #F9F9F9;
-                --text: #000000;
-                --text-secondary: #8E8E93;
-                --green: #34C759;
-                --red: #FF3B30;
-                --orange: #FF9500;
-                --border: #C6C6C8;
-                --accent: #007AFF;
-            }}
-            
-            body {{
-                background: var(--bg);
-                color: var(--text);
-                font-family: -apple-system, BlinkMacSystemFont, 'SF Pro Display', sans-serif;
-                overflow-x: hidden;
-                transition: background 0.3s ease;
-            }}
-            
-            .ticker-wrapper {{
-                width: 100%;
-                overflow: hidden;
-                background: var(--card);
-                border-bottom: 2px solid var(--accent);
-                padding: 12px 0;
-            }}
-            
-            .ticker {{
-                display: flex;
-                animation: scroll 50s linear infinite;
-                white-space: nowrap;
-            }}
-            
-            @keyframes scroll {{
-                0% {{ transform: translateX(0); }}
-                100% {{ transform: translateX(-33.333%); }}
-            }}
-            
-            .ticker-item {{
-                display: inline-flex;
-                align-items: center;
-                gap: 12px;
-                padding: 0 30px;
-                border-right: 1px solid var(--border);
-            }}
-            
-            .ticker-source {{
-                font-weight: 700;
-                color: var(--accent);
-                font-size: 14px;
-            }}
-            
-            .ticker-price {{
-                font-weight: 600;
-                color: var(--text);
-                font-size: 14px;
-            }}
-            
-            .ticker-change {{
-                font-weight: 700;
-                font-size: 16px;
-            }}
-            
-            .container {{
-                max-width: 1400px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            
-            header {{
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                padding: 20px 0;
-                border-bottom: 1px solid var(--border);
-                margin-bottom: 30px;
-            }}
-            
-            .logo {{
-                font-size: 24px;
-                font-weight: 700;
-                letter-spacing: -0.5px;
-            }}
-            
-            .theme-toggle {{
-                background: var(--card);
-                border: 1px solid var(--border);
-                border-radius: 20px;
-                padding: 8px 16px;
-                cursor: pointer;
-                transition: all 0.2s ease;
-                color: var(--text);
-                font-size: 14px;
-            }}
-            
-            .theme-toggle:hover {{
-                background: var(--card-hover);
-                transform: translateY(-1px);
-            }}
-            
-            .main-grid {{
-                display: grid;
-                grid-template-columns: 1fr 400px;
-                gap: 20px;
-                margin-bottom: 30px;
-            }}
-            
-            .price-card {{
-                background: var(--card);
-                border-radius: 16px;
-                padding: 30px;
-                border: 1px solid var(--border);
-                transition: all 0.3s ease;
-            }}
-            
-            .price-card:hover {{
-                border-color: var(--accent);
-                box-shadow: 0 8px 30px rgba(10, 132, 255, 0.15);
-            }}
-            
-            .price-label {{
-                color: var(--text-secondary);
-                font-size: 14px;
-                font-weight: 500;
-                letter-spacing: 0.5px;
-                text-transform: uppercase;
-                margin-bottom: 10px;
-            }}
-            
-            .price-value {{
-                font-size: 52px;
-                font-weight: 700;
-                letter-spacing: -2px;
-                margin-bottom: 15px;
-                line-height: 1;
-            }}
-            
-            .price-change {{
-                display: inline-flex;
-                align-items: center;
-                gap: 6px;
-                font-size: 18px;
-                font-weight: 600;
-                padding: 6px 12px;
-                border-radius: 8px;
-            }}
-            
-            .price-change.positive {{
-                background: rgba(0, 200, 5, 0.1);
-                color: var(--green);
-            }}
-            
-            .price-change.negative {{
-                background: rgba(255, 59, 48, 0.1);
-                color: var(--red);
-            }}
-            
-            .arrow {{
-                font-size: 24px;
-                line-height: 1;
-            }}
-            
-            .premium-badge {{
-                display: inline-block;
-                background: linear-gradient(135deg, var(--orange), #FF6B00);
-                color: white;
-                padding: 8px 16px;
-                border-radius: 20px;
-                font-size: 13px;
-                font-weight: 600;
-                margin-top: 15px;
-            }}
-            
-            .time-selector {{
-                display: flex;
-                gap: 8px;
-                padding: 20px;
-                background: var(--card);
-                border-radius: 16px;
-                border: 1px solid var(--border);
-                overflow-x: auto;
-            }}
-            
-            .time-btn {{
-                background: transparent;
-                border: none;
-                color: var(--text-secondary);
-                padding: 8px 16px;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 14px;
-                font-weight: 600;
-                transition: all 0.2s ease;
-                white-space: nowrap;
-            }}
-            
-            .time-btn:hover {{
-                background: var(--card-hover);
-                color: var(--text);
-            }}
-            
-            .time-btn.active {{
-                background: var(--accent);
-                color: white;
-            }}
-            
-            .trend-btn {{
-                background: transparent;
-                border: 1px solid var(--border);
-                color: var(--text-secondary);
-                padding: 6px 14px;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 13px;
-                font-weight: 600;
-                transition: all 0.2s ease;
-            }}
-            
-            .trend-btn:hover {{
-                background: var(--card-hover);
-                color: var(--text);
-            }}
-            
-            .trend-btn.active {{
-                background: var(--accent);
-                color: white;
-                border-color: var(--accent);
-            }}
-            
-            .chart-card {{
-                background: var(--card);
-                border-radius: 16px;
-                padding: 20px;
-                border: 1px solid var(--border);
-                margin-bottom: 20px;
-            }}
-            
-            .plotly-chart {{
-                width: 100%;
-                height: 350px;
-                border-radius: 12px;
-            }}
-            
-            .chart-title {{
-                font-size: 16px;
-                font-weight: 600;
-                color: var(--text);
-                margin-bottom: 12px;
-                display: flex;
-                align-items: center;
-                gap: 8px;
-            }}
-            
-            .table-card {{
-                background: var(--card);
-                border-radius: 16px;
-                padding: 20px;
-                border: 1px solid var(--border);
-                margin-bottom: 20px;
-            }}
-            
-            .table-card h3 {{
-                font-size: 18px;
-                font-weight: 700;
-                margin-bottom: 15px;
-                color: var(--text);
-            }}
-            
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                font-size: 14px;
-            }}
-            
-            th {{
-                text-align: left;
-                padding: 12px;
-                color: var(--text-secondary);
-                font-weight: 600;
-                font-size: 12px;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-                border-bottom: 1px solid var(--border);
-            }}
-            
-            td {{
-                padding: 12px;
-                color: var(--text);
-                border-bottom: 1px solid var(--border);
-            }}
-            
-            tr:last-child td {{
-                border-bottom: none;
-            }}
-            
-            .source-col {{
-                font-weight: 600;
-                color: #00ff9d;
-            }}
-            
-            .med-col {{
-                color: #ff0066;
-                font-weight: 700;
-            }}
-            
-            .feed-panel {{
-                background: var(--card);
-                border-radius: 16px;
-                border: 1px solid var(--border);
-                height: fit-content;
-                position: sticky;
-                top: 20px;
-            }}
-            
-            .feed-header {{
-                padding: 20px;
-                border-bottom: 1px solid var(--border);
-            }}
-            
-            .feed-title {{
-                font-size: 18px;
-                font-weight: 700;
-                margin-bottom: 15px;
-            }}
-            
-            .feed-container {{
-                max-height: 800px;
-                overflow-y: auto;
-                padding: 10px;
-            }}
-            
-            .feed-container::-webkit-scrollbar {{
-                width: 6px;
-            }}
-            
-            .feed-container::-webkit-scrollbar-thumb {{
-                background: var(--border);
-                border-radius: 3px;
-            }}
-            
-            .feed-item {{
-                display: flex;
-                align-items: flex-start;
-                gap: 12px;
-                padding: 12px;
-                border-radius: 12px;
-                margin-bottom: 8px;
-                transition: all 0.2s ease;
-                cursor: pointer;
-            }}
-            
-            .feed-item:hover {{
-                background: var(--card-hover);
-            }}
-            
-            .feed-icon {{
-                width: 36px;
-                height: 36px;
-                border-radius: 50%;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                font-size: 18px;
-                flex-shrink: 0;
-                font-weight: 600;
-            }}
-            
-            .feed-icon.buy {{
-                background: rgba(0, 200, 5, 0.15);
-                color: var(--green);
-            }}
-            
-            .feed-icon.sell {{
-                background: rgba(255, 59, 48, 0.15);
-                color: var(--red);
-            }}
-            
-            .feed-content {{
-                flex: 1;
-                font-size: 13px;
-                line-height: 1.5;
-            }}
-            
-            .feed-meta {{
-                display: flex;
-                justify-content: space-between;
-                color: var(--text-secondary);
-                font-size: 12px;
-                margin-bottom: 4px;
-            }}
-            
-            .feed-text {{
-                color: var(--text);
-            }}
-            
-            .feed-user {{
-                font-weight: 600;
-                font-family: 'Courier New', monospace;
-                color: #00ff9d;
-            }}
-            
-            .feed-amount {{
-                font-weight: 700;
-                color: #00bfff;
-            }}
-            
-            .feed-price {{
-                font-weight: 600;
-            }}
-            
-            .stats-panel {{
-                background: var(--card);
-                border-radius: 12px;
-                padding: 20px;
-                margin: 20px;
-                border: 1px solid var(--border);
-            }}
-            
-            .stats-title {{
-                font-size: 18px;
-                font-weight: 700;
-                color: var(--text);
-                margin-bottom: 20px;
-                text-align: center;
-            }}
-            
-            .stats-section {{
-                margin-bottom: 24px;
-            }}
-            
-            .stats-section:last-child {{
-                margin-bottom: 0;
-            }}
-            
-            .stats-section-title {{
-                font-size: 16px;
-                font-weight: 600;
-                color: var(--text);
-                margin-bottom: 12px;
-                padding-bottom: 8px;
-                border-bottom: 1px solid var(--border);
-            }}
-            
-            .stats-grid {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
-                gap: 12px;
-            }}
-            
-            .stat-card {{
-                background: rgba(10, 132, 255, 0.05);
-                border: 1px solid var(--border);
-                border-radius: 10px;
-                padding: 16px;
-                text-align: center;
-                transition: all 0.2s ease;
-            }}
-            
-            .buy-card {{
-                background: rgba(0, 200, 5, 0.08);
-                border-color: rgba(0, 200, 5, 0.3);
-            }}
-            
-            .buy-card:hover {{
-                transform: translateY(-2px);
-                border-color: #00C805;
-                box-shadow: 0 4px 12px rgba(0, 200, 5, 0.2);
-            }}
-            
-            .sell-card {{
-                background: rgba(255, 59, 48, 0.08);
-                border-color: rgba(255, 59, 48, 0.3);
-            }}
-            
-            .sell-card:hover {{
-                transform: translateY(-2px);
-                border-color: #FF3B30;
-                box-shadow: 0 4px 12px rgba(255, 59, 48, 0.2);
-            }}
-            
-            .stat-label {{
-                font-size: 12px;
-                color: var(--text-secondary);
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-                margin-bottom: 8px;
-                font-weight: 600;
-            }}
-            
-            .stat-value {{
-                font-size: 32px;
-                font-weight: 700;
-                margin-bottom: 6px;
-            }}
-            
-            .stat-value.green {{
-                color: #00C805;
-            }}
-            
-            .stat-value.red {{
-                color: #FF3B30;
-            }}
-            
-            .stat-volume {{
-                font-size: 13px;
-                color: #00bfff;
-                font-weight: 600;
-            }}
-            
-            .volume-chart-panel {{
-                background: var(--card);
-                border-radius: 12px;
-                padding: 20px;
-                margin: 20px;
-                border: 1px solid var(--border);
-            }}
-            
-            .volume-chart-title {{
-                font-size: 18px;
-                font-weight: 700;
-                color: var(--text);
-                margin-bottom: 20px;
-                text-align: center;
-            }}
-            
-            .volume-legend {{
-                display: flex;
-                justify-content: center;
-                gap: 24px;
-                margin-bottom: 20px;
-                font-size: 13px;
-            }}
-            
-            .volume-legend-item {{
-                display: flex;
-                align-items: center;
-                gap: 8px;
-            }}
-            
-            .volume-legend-box {{
-                width: 16px;
-                height: 16px;
-                border-radius: 4px;
-            }}
-            
-            .volume-row {{
-                display: grid;
-                grid-template-columns: 150px 1fr;
-                gap: 20px;
-                margin-bottom: 16px;
-                align-items: center;
-            }}
-            
-            .volume-source {{
-                display: flex;
-                align-items: center;
-                gap: 8px;
-                font-size: 14px;
-            }}
-            
-            .volume-bars {{
-                display: flex;
-                flex-direction: column;
-                gap: 8px;
-            }}
-            
-            .volume-bar-group {{
-                display: flex;
-                align-items: center;
-                gap: 12px;
-            }}
-            
-            .volume-bar {{
-                height: 24px;
-                border-radius: 4px;
-                transition: width 0.3s ease;
-                min-width: 2px;
-            }}
-            
-            .buy-bar {{
-                background: linear-gradient(90deg, #00C805 0%, #00ff9d 100%);
-            }}
-            
-            .sell-bar {{
-                background: linear-gradient(90deg, #FF3B30 0%, #ff6b6b 100%);
-            }}
-            
-            .volume-label {{
-                font-size: 13px;
-                font-weight: 600;
-                min-width: 100px;
-            }}
-            
-            .buy-label {{
-                color: #00C805;
-            }}
-            
-            .sell-label {{
-                color: #FF3B30;
-            }}
-            
-            footer {{
-                text-align: center;
-                padding: 30px 20px;
-                color: var(--text-secondary);
-                font-size: 13px;
-                border-top: 1px solid var(--border);
-                margin-top: 40px;
-            }}
-            
-            @media (max-width: 1024px) {{
-                .main-grid {{
-                    grid-template-columns: 1fr;
-                }}
-                
-                .feed-panel {{
-                    position: relative;
-                    top: 0;
-                }}
-                
-                .price-value {{
-                    font-size: 42px;
-                }}
-            }}
-            
-            @keyframes slideIn {{
-                from {{
-                    opacity: 0;
-                    transform: translateY(10px);
-                }}
-                to {{
-                    opacity: 1;
-                    transform: translateY(0);
-                }}
-            }}
-            
-            .feed-item {{
-                animation: slideIn 0.3s ease;
-            }}
-        </style>
-    </head>
-    <body>
-        <!-- TICKER WITH REMITTANCE RATES -->
-        <div class="ticker-wrapper">
-            <div class="ticker">
-                {ticker_html}
-            </div>
-        </div>
-        
-        <div class="container">
-            <header>
-                <div class="logo">🇪🇹 ETB MARKET <span style="font-size:14px;color:var(--accent);">AI-Powered</span></div>
-                <button class="theme-toggle" onclick="toggleTheme()">
-                    <span id="theme-icon">🌙</span> Theme
-                </button>
-            </header>
-            
-            <div class="main-grid">
-                <div class="left-column">
-                    <div class="price-card">
-                        <div class="price-label">ETB/USD MEDIAN RATE</div>
-                        <div class="price-value">{stats['median']:.2f} <span style="font-size:28px;color:var(--text-secondary);font-weight:400">ETB</span></div>
-                        <div class="price-change {('positive' if price_change > 0 else 'negative' if price_change < 0 else '')}">
-                            <span class="arrow">{arrow}</span>
-                            <span>{abs(price_change):.2f} ETB ({abs(price_change_pct):.2f}%) Today</span>
-                        </div>
-                        <div class="premium-badge">
-                            Black Market Premium: +{prem:.2f}%
-                        </div>
-                    </div>
-                    
-                    <div class="time-selector" style="margin-top: 20px;">
-                        <button class="time-btn active" data-period="live" onclick="filterTrades('live')">LIVE</button>
-                        <button class="time-btn" data-period="1h" onclick="filterTrades('1h')">1H</button>
-                        <button class="time-btn" data-period="1d" onclick="filterTrades('1d')">1D</button>
-                        <button class="time-btn" data-period="1w" onclick="filterTrades('1w')">1W</button>
-                    </div>
-                    
-                    <div class="chart-card">
-                        <div class="chart-title">📊 Live Price Distribution by Exchange</div>
-                        <div id="priceDistChart" class="plotly-chart"></div>
-                    </div>
-                    
-                    <div class="chart-card">
-                        <div class="chart-title">📈 Price Trend & Premium</div>
-                        <div style="display:flex;gap:8px;margin-bottom:15px;flex-wrap:wrap;">
-                            <button class="trend-btn active" data-trend="1h" onclick="filterTrend('1h')">1H</button>
-                            <button class="trend-btn" data-trend="1d" onclick="filterTrend('1d')">1D</button>
-                            <button class="trend-btn" data-trend="1w" onclick="filterTrend('1w')">1W</button>
-                            <button class="trend-btn" data-trend="all" onclick="filterTrend('all')">ALL</button>
-                        </div>
-                        <div id="trendChart" class="plotly-chart"></div>
-                    </div>
-                    
-                    <div class="table-card">
-                        <h3>Market Summary by Exchange</h3>
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Source</th>
-                                    <th>Min</th>
-                                    <th>Q1</th>
-                                    <th>Med</th>
-                                    <th>Q3</th>
-                                    <th>Max</th>
-                                    <th>Ads</th>
-                                </tr>
-                            </thead>
-                            <tbody>{table_rows}</tbody>
-                        </table>
-                    </div>
-                </div>
-                
-                <div class="feed-panel">
-                    <div class="feed-header">
-                        <div class="feed-title">Market Activity</div>
-                        <div style="color:var(--text-secondary);font-size:13px;margin-bottom:10px" id="feedStats">
-                            <span style="color:var(--green)">🟢 {buys_count} Buys</span> • <span style="color:var(--red)">🔴 {sells_count} Sells</span>
-                        </div>
-                        <div style="display:flex;gap:8px;margin-top:10px;flex-wrap:wrap;">
-                            <button class="source-filter-btn active" data-source="all" onclick="filterBySource('all')" style="background:var(--accent);color:white;border:none;padding:6px 12px;border-radius:8px;font-size:12px;font-weight:600;cursor:pointer;">
-                                All
-                            </button>
-                            <button class="source-filter-btn" data-source="BINANCE" onclick="filterBySource('BINANCE')" style="background:transparent;color:var(--text-secondary);border:1px solid var(--border);padding:6px 12px;border-radius:8px;font-size:12px;font-weight:600;cursor:pointer;">
-                                🟡 Binance
-                            </button>
-                            <button class="source-filter-btn" data-source="MEXC" onclick="filterBySource('MEXC')" style="background:transparent;color:var(--text-secondary);border:1px solid var(--border);padding:6px 12px;border-radius:8px;font-size:12px;font-weight:600;cursor:pointer;">
-                                🔵 MEXC
-                            </button>
-                            <button class="source-filter-btn" data-source="OKX" onclick="filterBySource('OKX')" style="background:transparent;color:var(--text-secondary);border:1px solid var(--border);padding:6px 12px;border-radius:8px;font-size:12px;font-weight:600;cursor:pointer;">
-                                🟣 OKX
-                            </button>
-                        </div>
-                    </div>
-                    <div class="feed-container" id="feedContainer">
-                        {feed_html}
-                    </div>
-                </div>
-            </div>
-            
-            <!-- Live Market Insight - Supply & Demand by Price -->
-            <div class="chart-card" style="margin:20px 0;">
-                <div class="chart-title">📊 Live Market Insight</div>
-                <div style="display:grid;grid-template-columns:1fr 1fr;gap:30px;">
-                    <!-- Supply (Sell Orders) -->
-                    <div>
-                        <div style="font-size:16px;font-weight:700;color:var(--green);margin-bottom:15px;">Total Market Supply (Sell Orders)</div>
-                        <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;font-size:13px;color:var(--text-secondary);margin-bottom:10px;padding-bottom:8px;border-bottom:1px solid var(--border);">
-                            <span>USD Supply</span>
-                            <span>At Price</span>
-                            <span>Volume by Exchange</span>
-                        </div>
-                        <div id="supplyChart" style="max-height:400px;overflow-y:auto;"></div>
-                    </div>
-                    
-                    <!-- Demand (Buy Orders) -->
-                    <div>
-                        <div style="font-size:16px;font-weight:700;color:var(--red);margin-bottom:15px;">Total Market Demand (Buy Orders)</div>
-                        <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;font-size:13px;color:var(--text-secondary);margin-bottom:10px;padding-bottom:8px;border-bottom:1px solid var(--border);">
-                            <span>USD Demand</span>
-                            <span>At Price</span>
-                            <span>Volume by Exchange</span>
-                        </div>
-                        <div id="demandChart" style="max-height:400px;overflow-y:auto;"></div>
-                    </div>
-                </div>
-                
-                <!-- Legend -->
-                <div style="display:flex;justify-content:center;gap:24px;margin-top:20px;padding-top:15px;border-top:1px solid var(--border);">
-                    <div style="display:flex;align-items:center;gap:8px;">
-                        <div style="width:16px;height:16px;background:#F3BA2F;border-radius:4px;"></div>
-                        <span style="font-size:13px;">🟡 Binance</span>
-                    </div>
-                    <div style="display:flex;align-items:center;gap:8px;">
-                        <div style="width:16px;height:16px;background:#2E55E6;border-radius:4px;"></div>
-                        <span style="font-size:13px;">🔵 MEXC</span>
-                    </div>
-                    <div style="display:flex;align-items:center;gap:8px;">
-                        <div style="width:16px;height:16px;background:#A855F7;border-radius:4px;"></div>
-                        <span style="font-size:13px;">🟣 OKX</span>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- Transaction Statistics -->
-            <div class="stats-panel">
-                <div class="stats-title">Transaction Statistics (Within 24 hrs)</div>
-                
-                <div class="stats-section">
-                    <div class="stats-section-title">🟢 Buy Transactions</div>
-                    <div class="stats-grid">
-                        <div class="stat-card buy-card">
-                            <div class="stat-label">Last 1 Hour</div>
-                            <div class="stat-value green">{hour_buys}</div>
-                            <div class="stat-volume">{hour_buy_volume:,.0f} USDT</div>
-                        </div>
-                        <div class="stat-card buy-card">
-                            <div class="stat-label">Today</div>
-                            <div class="stat-value green">{today_buys}</div>
-                            <div class="stat-volume">{today_buy_volume:,.0f} USDT</div>
-                        </div>
-                        <div class="stat-card buy-card">
-                            <div class="stat-label">Overall (24h)</div>
-                            <div class="stat-value green">{overall_buys}</div>
-                            <div class="stat-volume">{overall_buy_volume:,.0f} USDT</div>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="stats-section">
-                    <div class="stats-section-title">🔴 Sell Transactions</div>
-                    <div class="stats-grid">
-                        <div class="stat-card sell-card">
-                            <div class="stat-label">Last 1 Hour</div>
-                            <div class="stat-value red">{hour_sells}</div>
-                            <div class="stat-volume">{hour_sell_volume:,.0f} USDT</div>
-                        </div>
-                        <div class="stat-card sell-card">
-                            <div class="stat-label">Today</div>
-                            <div class="stat-value red">{today_sells}</div>
-                            <div class="stat-volume">{today_sell_volume:,.0f} USDT</div>
-                        </div>
-                        <div class="stat-card sell-card">
-                            <div class="stat-label">Overall (24h)</div>
-                            <div class="stat-value red">{overall_sells}</div>
-                            <div class="stat-volume">{overall_sell_volume:,.0f} USDT</div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- AI ANALYSIS AT BOTTOM -->
-            {ai_summary_html}
-            
-            <footer>
-                Official Rate: {official:.2f} ETB | Last Update: {timestamp} UTC<br>
-                v42.9 AI-Powered • Market Depth by Price • Premium Tracking 🤖📊
-            </footer>
-        </div>
-        
-        <script>
-            const allTrades = {json.dumps(recent_trades)};
-            let currentPeriod = 'live';
-            let currentSource = 'all';
-            let currentTrendPeriod = '1d';
-            
-            const chartData = {chart_data_json};
-            const historyData = {history_data_json};
-            const tradeVolume = {trade_volume_json};
-            const marketDepth = {market_depth_json};
-            
-            // Render Market Depth (Supply/Demand by Price)
-            function renderMarketDepth() {{
-                const colors = {{
-                    'BINANCE': '#F3BA2F',
-                    'MEXC': '#2E55E6', 
-                    'OKX': '#A855F7'
-                }};
-                
-                // Render Supply (Sell Orders) - Green side
-                const supplyContainer = document.getElementById('supplyChart');
-                let supplyHtml = '';
-                const supplyData = marketDepth.supply || [];
-                const maxSupply = Math.max(...supplyData.map(d => d.total), 1);
-                
-                supplyData.slice(0, 15).forEach(item => {{
-                    const binancePct = (item.BINANCE / maxSupply * 100) || 0;
-                    const mexcPct = (item.MEXC / maxSupply * 100) || 0;
-                    const okxPct = (item.OKX / maxSupply * 100) || 0;
-                    
-                    supplyHtml += `
-                        <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;align-items:center;margin-bottom:8px;">
-                            <span style="font-weight:600;color:var(--text);">$${{item.total.toLocaleString(undefined, {{maximumFractionDigits:0}})}}</span>
-                            <span style="color:var(--green);font-weight:600;">${{item.price}} Br</span>
-                            <div style="display:flex;height:20px;border-radius:4px;overflow:hidden;background:var(--border);">
-                                ${{item.BINANCE > 0 ? `<div style="width:${{binancePct}}%;background:#F3BA2F;" title="Binance: $${{item.BINANCE.toLocaleString()}}"></div>` : ''}}
-                                ${{item.MEXC > 0 ? `<div style="width:${{mexcPct}}%;background:#2E55E6;" title="MEXC: $${{item.MEXC.toLocaleString()}}"></div>` : ''}}
-                                ${{item.OKX > 0 ? `<div style="width:${{okxPct}}%;background:#A855F7;" title="OKX: $${{item.OKX.toLocaleString()}}"></div>` : ''}}
-                            </div>
-                        </div>
-                    `;
-                }});
-                
-                if (supplyData.length === 0) {{
-                    supplyHtml = '<div style="text-align:center;padding:20px;color:var(--text-secondary);">No supply data</div>';
-                }}
-                supplyContainer.innerHTML = supplyHtml;
-                
-                // Render Demand (Buy Orders) - Red side
-                const demandContainer = document.getElementById('demandChart');
-                let demandHtml = '';
-                const demandData = marketDepth.demand || [];
-                const maxDemand = Math.max(...demandData.map(d => d.total), 1);
-                
-                demandData.slice(0, 15).forEach(item => {{
-                    const binancePct = (item.BINANCE / maxDemand * 100) || 0;
-                    const mexcPct = (item.MEXC / maxDemand * 100) || 0;
-                    const okxPct = (item.OKX / maxDemand * 100) || 0;
-                    
-                    demandHtml += `
-                        <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;align-items:center;margin-bottom:8px;">
-                            <span style="font-weight:600;color:var(--text);">$${{item.total.toLocaleString(undefined, {{maximumFractionDigits:0}})}}</span>
-                            <span style="color:var(--red);font-weight:600;">${{item.price}} Br</span>
-                            <div style="display:flex;height:20px;border-radius:4px;overflow:hidden;background:var(--border);">
-                                ${{item.BINANCE > 0 ? `<div style="width:${{binancePct}}%;background:#F3BA2F;" title="Binance: $${{item.BINANCE.toLocaleString()}}"></div>` : ''}}
-                                ${{item.MEXC > 0 ? `<div style="width:${{mexcPct}}%;background:#2E55E6;" title="MEXC: $${{item.MEXC.toLocaleString()}}"></div>` : ''}}
-                                ${{item.OKX > 0 ? `<div style="width:${{okxPct}}%;background:#A855F7;" title="OKX: $${{item.OKX.toLocaleString()}}"></div>` : ''}}
-                            </div>
-                        </div>
-                    `;
-                }});
-                
-                if (demandData.length === 0) {{
-                    demandHtml = '<div style="text-align:center;padding:20px;color:var(--text-secondary);">No demand data</div>';
-                }}
-                demandContainer.innerHTML = demandHtml;
-            }}
-            
-            // Filter trend chart by time period
-            function filterTrend(period) {{
-                currentTrendPeriod = period;
-                
-                document.querySelectorAll('.trend-btn').forEach(btn => {{
-                    btn.classList.remove('active');
-                }});
-                document.querySelector(`[data-trend="${{period}}"]`).classList.add('active');
-                
-                renderTrendChart(period);
-            }}
-            
-            function renderTrendChart(period) {{
-                const isDark = document.documentElement.getAttribute('data-theme') !== 'light';
-                const bgColor = isDark ? '#1C1C1E' : '#ffffff';
-                const textColor = isDark ? '#ffffff' : '#1a1a1a';
-                const gridColor = isDark ? '#38383A' : '#e0e0e0';
-                
-                if (!historyData.dates || historyData.dates.length < 2) {{
-                    document.getElementById('trendChart').innerHTML = '<div style="padding:60px;text-align:center;color:var(--text-secondary)"><div style="font-size:48px;margin-bottom:16px">📈</div><div>Collecting trend data...</div></div>';
-                    return;
-                }}
-                
-                // Filter data based on period
-                let filteredDates = historyData.dates;
-                let filteredMedians = historyData.medians;
-                let filteredOfficials = historyData.officials;
-                let filteredPremiums = historyData.premiums || [];
-                
-                const now = new Date();
-                let cutoffTime;
-                
-                switch(period) {{
-                    case '1h':
-                        cutoffTime = new Date(now - 60 * 60 * 1000);
-                        break;
-                    case '1d':
-                        cutoffTime = new Date(now - 24 * 60 * 60 * 1000);
-                        break;
-                    case '1w':
-                        cutoffTime = new Date(now - 7 * 24 * 60 * 60 * 1000);
-                        break;
-                    case 'all':
-                    default:
-                        cutoffTime = new Date(0);
-                }}
-                
-                // Filter arrays
-                const indices = [];
-                filteredDates.forEach((d, i) => {{
-                    if (new Date(d) >= cutoffTime) indices.push(i);
-                }});
-                
-                if (indices.length < 2) {{
-                    document.getElementById('trendChart').innerHTML = '<div style="padding:60px;text-align:center;color:var(--text-secondary)"><div style="font-size:48px;margin-bottom:16px">📈</div><div>Not enough data for this period</div></div>';
-                    return;
-                }}
-                
-                const dates = indices.map(i => filteredDates[i]);
-                const medians = indices.map(i => filteredMedians[i]);
-                const officials = indices.map(i => filteredOfficials[i]);
-                const premiums = indices.map(i => filteredPremiums[i] || 0);
-                
-                const lastIdx = medians.length - 1;
-                const lastMedian = medians[lastIdx];
-                const lastOfficial = officials[lastIdx] || 127;
-                const lastPremium = premiums[lastIdx] || 0;
-                
-                const trendTraces = [];
-                
-                // Official rate (base line)
-                if (officials && officials.some(v => v > 0)) {{
-                    trendTraces.push({{
-                        type: 'scatter',
-                        mode: 'lines',
-                        name: 'Official Rate',
-                        x: dates,
-                        y: officials,
-                        line: {{ color: '#FF9500', width: 2, dash: 'dot' }},
-                        hovertemplate: '<b>Official:</b> %{{y:.2f}} ETB<extra></extra>'
-                    }});
-                }}
-                
-                // Black market rate with fill
-                trendTraces.push({{
-                    type: 'scatter',
-                    mode: 'lines',
-                    name: 'Black Market Rate',
-                    x: dates,
-                    y: medians,
-                    line: {{ color: '#00ff9d', width: 3 }},
-                    fill: 'tonexty',
-                    fillcolor: 'rgba(0, 255, 157, 0.15)',
-                    hovertemplate: '<b>Black Market:</b> %{{y:.2f}} ETB<extra></extra>'
-                }});
-                
-                // Premium on secondary axis
-                trendTraces.push({{
-                    type: 'scatter',
-                    mode: 'lines+markers',
-                    name: 'Premium %',
-                    x: dates,
-                    y: premiums,
-                    line: {{ color: '#FF3B30', width: 2, dash: 'dash' }},
-                    marker: {{ size: 4 }},
-                    yaxis: 'y2',
-                    hovertemplate: '<b>Premium:</b> %{{y:.1f}}%<extra></extra>'
-                }});
-                
-                const allYValues = [...medians, ...officials.filter(v => v > 0)];
-                const minY = Math.floor(Math.min(...allYValues) / 10) * 10 - 10;
-                const maxY = Math.ceil(Math.max(...allYValues) / 10) * 10 + 20;
-                
-                const maxPremium = Math.max(...premiums) + 5;
-                
-                const trendLayout = {{
-                    paper_bgcolor: bgColor,
-                    plot_bgcolor: bgColor,
-                    font: {{ color: textColor, family: '-apple-system, BlinkMacSystemFont, sans-serif' }},
-                    showlegend: true,
-                    legend: {{ orientation: 'h', y: -0.18 }},
-                    margin: {{ l: 60, r: 60, t: 20, b: 70 }},
-                    xaxis: {{
-                        gridcolor: gridColor,
-                        tickformat: period === '1h' ? '%H:%M' : '%m/%d %H:%M'
-                    }},
-                    yaxis: {{
-                        title: 'Rate (ETB)',
-                        gridcolor: gridColor,
-                        zerolinecolor: gridColor,
-                        range: [minY, maxY],
-                        dtick: 10
-                    }},
-                    yaxis2: {{
-                        title: 'Premium (%)',
-                        overlaying: 'y',
-                        side: 'right',
-                        showgrid: false,
-                        range: [0, maxPremium],
-                        ticksuffix: '%'
-                    }},
-                    hovermode: 'x unified',
-                    annotations: [
-                        {{
-                            x: dates[lastIdx],
-                            y: lastMedian,
-                            xanchor: 'left',
-                            yanchor: 'middle',
-                            text: '<b>' + lastMedian.toFixed(1) + '</b>',
-                            font: {{ color: '#00ff9d', size: 12 }},
-                            showarrow: false,
-                            xshift: 10,
-                            bgcolor: 'rgba(0,0,0,0.7)',
-                            borderpad: 4
-                        }},
-                        {{
-                            x: dates[lastIdx],
-                            y: lastPremium,
-                            xanchor: 'left',
-                            yanchor: 'middle',
-                            xref: 'x',
-                            yref: 'y2',
-                            text: '<b>' + lastPremium.toFixed(1) + '%</b>',
-                            font: {{ color: '#FF3B30', size: 11 }},
-                            showarrow: false,
-                            xshift: 10,
-                            bgcolor: 'rgba(0,0,0,0.7)',
-                            borderpad: 4
-                        }}
-                    ]
-                }};
-                
-                Plotly.newPlot('trendChart', trendTraces, trendLayout, {{responsive: true, displayModeBar: false}});
-            }}
-            
-            function initCharts() {{
-                const isDark = document.documentElement.getAttribute('data-theme') !== 'light';
-                const bgColor = isDark ? '#1C1C1E' : '#ffffff';
-                const textColor = isDark ? '#ffffff' : '#1a1a1a';
-                const gridColor = isDark ? '#38383A' : '#e0e0e0';
-                
-                const scatterTraces = [];
-                const colors = {{
-                    'BINANCE': '#F3BA2F',
-                    'MEXC': '#2E55E6', 
-                    'OKX': '#A855F7'
-                }};
-                
-                let allPrices = [];
-                let xIndex = 0;
-                const exchangeOrder = ['BINANCE', 'MEXC', 'OKX'];
-                const exchangeNames = [];
-                
-                for (const exchange of exchangeOrder) {{
-                    const prices = chartData[exchange];
-                    if (prices && prices.length > 0) {{
-                        allPrices = allPrices.concat(prices);
-                        exchangeNames.push(exchange);
-                        
-                        const xPositions = prices.map(() => xIndex + (Math.random() - 0.5) * 0.6);
-                        scatterTraces.push({{
-                            type: 'scatter',
-                            mode: 'markers',
-                            name: exchange,
-                            x: xPositions,
-                            y: prices,
-                            marker: {{ 
-                                color: colors[exchange] || '#00C805',
-                                size: 10,
-                                opacity: 0.75,
-                                line: {{ color: 'rgba(255,255,255,0.5)', width: 1 }}
-                            }},
-                            hovertemplate: '<b>%{{y:.2f}} ETB</b><extra>' + exchange + '</extra>'
-                        }});
-                        xIndex++;
-                    }}
-                }}
-                
-                if (allPrices.length > 0) {{
-                    const sortedAll = [...allPrices].sort((a, b) => a - b);
-                    const overallMedian = sortedAll[Math.floor(sortedAll.length / 2)];
-                    
-                    scatterTraces.push({{
-                        type: 'scatter',
-                        mode: 'lines',
-                        name: 'Median: ' + overallMedian.toFixed(2) + ' ETB',
-                        x: [-0.5, exchangeNames.length - 0.5],
-                        y: [overallMedian, overallMedian],
-                        line: {{ color: '#00ff9d', width: 3, dash: 'solid' }},
-                        hoverinfo: 'name'
-                    }});
-                }}
-                
-                const minPrice = allPrices.length > 0 ? Math.min(...allPrices) - 5 : 130;
-                const maxPrice = allPrices.length > 0 ? Math.max(...allPrices) + 5 : 190;
-                
-                const scatterLayout = {{
-                    paper_bgcolor: bgColor,
-                    plot_bgcolor: bgColor,
-                    font: {{ color: textColor, family: '-apple-system, BlinkMacSystemFont, sans-serif' }},
-                    showlegend: true,
-                    legend: {{ orientation: 'h', y: -0.15 }},
-                    margin: {{ l: 60, r: 30, t: 30, b: 60 }},
-                    yaxis: {{
-                        title: 'Price (ETB)',
-                        gridcolor: gridColor,
-                        zerolinecolor: gridColor,
-                        range: [minPrice, maxPrice],
-                        dtick: 5
-                    }},
-                    xaxis: {{
-                        gridcolor: gridColor,
-                        tickmode: 'array',
-                        tickvals: exchangeNames.map((_, i) => i),
-                        ticktext: exchangeNames,
-                        range: [-0.5, Math.max(exchangeNames.length - 0.5, 0.5)]
-                    }}
-                }};
-                
-                Plotly.newPlot('priceDistChart', scatterTraces, scatterLayout, {{responsive: true, displayModeBar: false}});
-                
-                // Render trend chart with default period
-                renderTrendChart(currentTrendPeriod);
-                
-                // Render market depth
-                renderMarketDepth();
-            }}
-            
-            document.addEventListener('DOMContentLoaded', function() {{
-                initCharts();
-            }});
-            
-            function toggleTheme() {{
-                const html = document.documentElement;
-                const current = html.getAttribute('data-theme');
-                const next = current === 'light' ? 'dark' : 'light';
-                html.setAttribute('data-theme', next);
-                localStorage.setItem('theme', next);
-                document.getElementById('theme-icon').textContent = next === 'light' ? '☀️' : '🌙';
-                initCharts();
-            }}
-            
-            (function() {{
-                const theme = localStorage.getItem('theme') || 'dark';
-                document.documentElement.setAttribute('data-theme', theme);
-                document.getElementById('theme-icon').textContent = theme === 'light' ? '☀️' : '🌙';
-            }})();
-            
-            function filterBySource(source) {{
-                currentSource = source;
-                
-                document.querySelectorAll('.source-filter-btn').forEach(btn => {{
-                    if (btn.dataset.source === source) {{
-                        btn.style.background = 'var(--accent)';
-                        btn.style.color = 'white';
-                        btn.style.border = 'none';
-                    }} else {{
-                        btn.style.background = 'transparent';
-                        btn.style.color = 'var(--text-secondary)';
-                        btn.style.border = '1px solid var(--border)';
-                    }}
-                }});
-                
-                filterTrades(currentPeriod);
-            }}
-            
-            function filterTrades(period) {{
-                currentPeriod = period;
-                
-                document.querySelectorAll('.time-btn').forEach(btn => {{
-                    btn.classList.remove('active');
-                }});
-                document.querySelector(`[data-period="${{period}}"]`).classList.add('active');
-                
-                const now = Date.now() / 1000;
-                let cutoff = 0;
-                
-                switch(period) {{
-                    case '1h': cutoff = now - 3600; break;
-                    case '1d': cutoff = now - 86400; break;
-                    case '1w': cutoff = now - 604800; break;
-                    case 'live':
-                    default: cutoff = 0;
-                }}
-                
-                let filtered = allTrades.filter(t => {{
-                    return t.timestamp > cutoff && 
-                           (t.type === 'buy' || t.type === 'sell' || t.type === 'request');
-                }});
-                
-                if (currentSource !== 'all') {{
-                    filtered = filtered.filter(t => t.source.toUpperCase() === currentSource.toUpperCase());
-                }}
-                
-                renderFeed(filtered);
-                
-                const buys = filtered.filter(t => t.type === 'buy').length;
-                const sells = filtered.filter(t => t.type === 'sell').length;
-                document.getElementById('feedStats').innerHTML = 
-                    '<span style="color:var(--green)">🟢 ' + buys + ' Buys</span> • <span style="color:var(--red)">🔴 ' + sells + ' Sells</span>';
-            }}
-            
-            function renderFeed(trades) {{
-                const container = document.getElementById('feedContainer');
-                
-                if (trades.length === 0) {{
-                    container.innerHTML = '<div style="padding:20px;text-align:center;color:var(--text-secondary)">No trades in this period</div>';
-                    return;
-                }}
-                
-                const sorted = trades.sort((a, b) => b.timestamp - a.timestamp);
-                
-                const html = sorted.map(trade => {{
-                    const date = new Date(trade.timestamp * 1000);
-                    const time = date.toLocaleTimeString('en-US', {{hour: '2-digit', minute: '2-digit'}});
-                    const ageMin = Math.floor((Date.now() / 1000 - trade.timestamp) / 60);
-                    const age = ageMin < 60 ? ageMin + 'm ago' : Math.floor(ageMin/60) + 'h ago';
-                    
-                    let icon, action, color;
-                    
-                    if (trade.type === 'request') {{
-                        const requestType = trade.request_type || 'REQUEST';
-                        const isBuyRequest = requestType.includes('BUY');
-                        icon = isBuyRequest ? '➕' : '➖';
-                        action = requestType;
-                        color = isBuyRequest ? 'var(--green)' : 'var(--red)';
-                    }} else {{
-                        const isBuy = trade.type === 'buy';
-                        icon = isBuy ? '↗' : '↘';
-                        action = isBuy ? 'BOUGHT' : 'SOLD';
-                        color = isBuy ? 'var(--green)' : 'var(--red)';
-                    }}
-                    
-                    let sourceColor, sourceEmoji;
-                    if (trade.source === 'BINANCE') {{
-                        sourceColor = '#F3BA2F';
-                        sourceEmoji = '🟡';
-                    }} else if (trade.source === 'MEXC') {{
-                        sourceColor = '#2E55E6';
-                        sourceEmoji = '🔵';
-                    }} else {{
-                        sourceColor = '#A855F7';
-                        sourceEmoji = '🟣';
-                    }}
-                    
-                    return `
-                        <div class="feed-item">
-                            <div class="feed-icon ${{trade.type}}">
-                                ${{icon}}
-                            </div>
-                            <div class="feed-content">
-                                <div class="feed-meta">
-                                    <span>${{time}}</span>
-                                    <span>${{age}}</span>
-                                </div>
-                                <div class="feed-text">
-                                    ${{sourceEmoji}} <span class="feed-user">${{trade.user.substring(0, 15)}}</span>
-                                    <span style="color:${{sourceColor}};font-weight:600">(${{trade.source}})</span>
-                                    <b style="color:${{color}}">${{action}}</b>
-                                    <span class="feed-amount">${{trade.vol_usd.toFixed(0)}} USDT</span>
-                                    @ <span class="feed-price">${{trade.price.toFixed(2)}} ETB</span>
-                                </div>
-                            </div>
-                        </div>
-                    `;
-                }}).join('');
-                
-                container.innerHTML = html;
-            }}
-            
-            filterTrades('live');
-        </script>
-    </body>
-    </html>
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def artifact_digest(semantic, volatile=()):
+    """Hash of an artifact's semantic content (dict keys in `volatile` ignored)"""
+    if isinstance(semantic, dict) and volatile:
+        semantic = {k: v for k, v in semantic.items() if k not in volatile}
+    return hashlib.sha256(json.dumps(semantic, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def artifact_changed(path, digest):
+    return load_artifact_hashes().get(path) != digest or not os.path.exists(path)
+
+def write_artifact(path, content, semantic=None, volatile=()):
+    """Atomically write an output, skipping it when its semantic content hasn't changed.
+    
+    `content` is written verbatim if str/bytes, otherwise dumped as compact JSON.
+    The change check hashes `semantic` instead when given, and drops `volatile`
+    keys (run stamps, sequence numbers) from dicts first. Returns True if written.
     """
+    if isinstance(content, bytes):
+        data = content
+    elif isinstance(content, str):
+        data = content.encode("utf-8")
+    else:
+        data = json.dumps(content, separators=(',', ':')).encode("utf-8")
+    
+    if semantic is None and not volatile:
+        digest = hashlib.sha256(data).hexdigest()[:16]
+    else:
+        digest = artifact_digest(content if semantic is None else semantic, volatile)
+    
+    if not artifact_changed(path, digest):
+        return False
     
-    with open(HTML_FILENAME, "w") as f:
-        f.write(html)
+    _atomic_write(path, data)
+    load_artifact_hashes()[path] = digest
+    return True
+
+# --- PRECOMPRESSION ---
+_precompress_pool = None
+_precompress_jobs = {}  # path -> pending future
+_precompress_state = None
+
+def load_precompress_state():
+    """Content hash of each artifact as of its last .gz/.br write"""
+    global _precompress_state
+    with _state_lock:
+        if _precompress_state is None:
+            _precompress_state = {}
+            if os.path.exists(PRECOMPRESS_FILE):
+                try:
+                    with open(PRECOMPRESS_FILE, 'r') as f:
+                        _precompress_state = json.load(f)
+                except:
+                    _precompress_state = {}
+    return _precompress_state
 
-def generate_feed_html(trades, peg):
-    """Server-side initial feed rendering"""
-    if not trades:
-        return '<div style="padding:20px;text-align:center;color:var(--text-secondary)">Waiting for market activity...</div>'
+def _compress_artifact(path, content, digest):
+    """Worker: write path.gz (and path.br) for one snapshot of the content"""
+    sizes = {'raw': len(content)}
     
-    html = ""
-    valid_count = 0
+    packed = gzip.compress(content, compresslevel=9, mtime=0)
+    _atomic_write(path + ".gz", packed)
+    sizes['gz'] = len(packed)
     
-    for trade in sorted(trades, key=lambda x: x.get('timestamp', 0), reverse=True):
-        trade_type = trade.get('type')
-        
-        if trade_type == 'request':
-            request_type = trade.get('request_type', 'REQUEST')
-            is_buy_request = 'BUY' in request_type
-            
-            ts = datetime.datetime.fromtimestamp(trade.get("timestamp", time.time()))
-            time_str = ts.strftime("%I:%M %p")
-            age_seconds = time.time() - trade.get("timestamp", time.time())
-            age_str = f"{int(age_seconds/60)}min ago" if age_seconds >= 60 else f"{int(age_seconds)}s ago"
-            
-            icon = "📝"
-            action_color = "var(--green)" if is_buy_request else "var(--red)"
-            
-            source = trade.get('source', 'Unknown')
-            if source == 'BINANCE':
-                emoji, color = '🟡', '#F3BA2F'
-            elif source == 'MEXC':
-                emoji, color = '🔵', '#2E55E6'
-            else:
-                emoji, color = '🟣', '#A855F7'
-            
-            html += f"""
-        <div class="feed-item request-item" data-source="{source}">
-            <div class="feed-icon" style="background:linear-gradient(135deg,{action_color}22,{action_color}11)">
-                {icon}
-            </div>
-            <div class="feed-content">
-                <div class="feed-meta">
-                    <span>{time_str}</span>
-                    <span>{age_str}</span>
-                </div>
-                <div class="feed-text">
-                    {emoji} <span class="feed-user">{trade.get('user', 'Unknown')[:15]}</span>
-                    <span style="color:{color};font-weight:600">({source})</span>
-                    <b style="color:{action_color}">{request_type}</b>
-                    <span class="feed-amount">{trade.get('vol_usd', 0):,.0f} USDT</span>
-                    @ <span class="feed-price">{trade.get('price', 0):.2f} ETB</span>
-                </div>
-            </div>
-        </div>
-        """
+    if BROTLI_ENABLED:
+        packed = brotli.compress(content, quality=11)
+        _atomic_write(path + ".br", packed)
+        sizes['br'] = len(packed)
+    
+    return path, digest, sizes
+
+def precompress(path):
+    """Queue .gz/.br siblings of a served artifact; skipped when its content hash is unchanged.
+    
+    The content is read (and hashed) here, so the caller is free to rewrite the
+    file while the pool compresses the snapshot in the background.
+    """
+    global _precompress_pool
+    if not path.endswith(PRECOMPRESS_EXTENSIONS) or not os.path.exists(path):
+        return
+    
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    
+    state = load_precompress_state()
+    have_siblings = os.path.exists(path + ".gz") and (not BROTLI_ENABLED or os.path.exists(path + ".br"))
+    if state.get(path) == digest and have_siblings:
+        return
+    
+    pending = _precompress_jobs.get(path)
+    if pending is not None:
+        pending.result()  # Never let two workers write the same siblings
+    
+    with _state_lock:
+        if _precompress_pool is None:
+            _precompress_pool = ThreadPoolExecutor(max_workers=PRECOMPRESS_WORKERS)
+        _precompress_jobs[path] = _precompress_pool.submit(_compress_artifact, path, content, digest)
+
+def remove_artifact(path):
+    """Delete an artifact together with its precompressed siblings"""
+    for target in (path, path + ".gz", path + ".br"):
+        if os.path.exists(target):
+            os.remove(target)
+    load_precompress_state().pop(path, None)
+
+def finish_precompression():
+    """Wait for queued compression jobs and persist the hash state"""
+    global _precompress_pool
+    state = load_precompress_state()
+    raw = packed = 0
+    
+    for job in _precompress_jobs.values():
+        try:
+            path, digest, sizes = job.result()
+        except Exception as e:
+            print(f"   ⚠️ Precompression failed: {e}", file=sys.stderr)
             continue
-        
-        if trade_type not in ['buy', 'sell']:
+        state[path] = digest
+        raw += sizes['raw']
+        packed += sizes.get('br', sizes['gz'])
+    
+    if _precompress_jobs:
+        ratio = raw / packed if packed else 0
+        print(f"   🗜️ Precompressed {len(_precompress_jobs)} artifacts: {raw/1024:.0f} KB → {packed/1024:.0f} KB ({ratio:.1f}×)", file=sys.stderr)
+    _precompress_jobs.clear()
+    
+    if _precompress_pool is not None:
+        _precompress_pool.shutdown()
+        _precompress_pool = None
+    
+    _atomic_write(PRECOMPRESS_FILE, json.dumps({path: digest for path, digest in state.items() if os.path.exists(path)}).encode())
+
+# --- CHARTS ---
+_chart_pool = None
+_chart_jobs = {}  # path -> (future, semantic)
+_chart_lock = threading.Lock()  # Markets queue charts concurrently onto one pool
+
+def render_chart_png(theme, history):
+    """Worker process: draw the median / IQR / official history chart, return PNG bytes"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
+    dates = [datetime.datetime.fromisoformat(d) for d in history['dates']]
+    
+    fig, ax = plt.subplots(figsize=(12, 6), dpi=100)
+    fig.patch.set_facecolor(theme['bg'])
+    ax.set_facecolor(theme['card'])
+    
+    ax.fill_between(dates, history['q1s'], history['q3s'], color=theme['band'], alpha=0.15, linewidth=0, label="Q1–Q3")
+    ax.plot(dates, history['medians'], color=theme['median'], linewidth=2, label="Black Market Median")
+    ax.plot(dates, history['officials'], color=theme['official'], linewidth=1.5, linestyle="--", label="Official Rate")
+    
+    ax.set_title(f"{history['asset']}/{history['fiat']} Market Terminal", color=theme['text'], fontsize=14, fontweight="bold", loc="left")
+    ax.set_ylabel(history['fiat'], color=theme['muted'])
+    ax.grid(color=theme['grid'], linewidth=0.5, alpha=0.6)
+    ax.tick_params(colors=theme['muted'])
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
+    for spine in ax.spines.values():
+        spine.set_color(theme['grid'])
+    legend = ax.legend(loc="upper left", frameon=False)
+    for text in legend.get_texts():
+        text.set_color(theme['text'])
+    fig.autofmt_xdate()
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", facecolor=fig.get_facecolor(), bbox_inches="tight", metadata={'Software': None})
+    plt.close(fig)
+    return buf.getvalue()
+
+def start_chart_render():
+    """Queue the neon + light PNGs on worker processes, skipping themes whose inputs are unchanged"""
+    global _chart_pool
+    if not GRAPH_ENABLED:
+        return
+    
+    dates, medians, q1s, q3s, offs = load_history()
+    if not dates:
+        return
+    
+    # Columnar, picklable history for the workers
+    history = {
+        'dates': [d.isoformat() for d in dates],
+        'medians': medians,
+        'q1s': q1s,
+        'q3s': q3s,
+        'officials': offs,
+        'fiat': current_market()['fiat'],
+        'asset': current_market()['asset']
+    }
+    
+    queued = 0
+    for filename, theme in CHART_THEMES.items():
+        path = market_path(filename)
+        semantic = {'theme': theme, 'history': history}
+        if not artifact_changed(path, artifact_digest(semantic)):
+            continue
+        with _chart_lock:
+            if _chart_pool is None:
+                _chart_pool = ProcessPoolExecutor(max_workers=len(CHART_THEMES), mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+            _chart_jobs[path] = (_chart_pool.submit(render_chart_png, theme, history), semantic)
+        queued += 1
+    
+    if not queued:
+        print("   💤 Charts unchanged, not re-rendered", file=sys.stderr)
+
+def finish_chart_render():
+    """Collect rendered PNGs and write them atomically"""
+    global _chart_pool
+    for path, (job, semantic) in _chart_jobs.items():
+        try:
+            write_artifact(path, job.result(), semantic=semantic)
+            print(f"   📈 Rendered {path}", file=sys.stderr)
+        except Exception as e:
+            print(f"   ⚠️ Chart render failed for {path}: {e}", file=sys.stderr)
+    _chart_jobs.clear()
+    
+    if _chart_pool is not None:
+        _chart_pool.shutdown()
+        _chart_pool = None
+
+# --- TEMPLATES ---
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+TEMPLATE_SLOT = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_template_cache = {}
+
+def compile_template(source):
+    """Split template source once into static chunks and the slot names between them"""
+    parts = TEMPLATE_SLOT.split(source)
+    return {'static': parts[0::2], 'slots': parts[1::2]}
+
+def load_template(name):
+    """Read + compile a template from TEMPLATE_DIR on first use, then serve it from memory"""
+    template = _template_cache.get(name)
+    if template is None:
+        with open(os.path.join(TEMPLATE_DIR, name), "r", encoding="utf-8") as f:
+            template = compile_template(f.read())
+        _template_cache[name] = template
+    return template
+
+def render_template(name, context):
+    """Fill a compiled template's {{ slot }} placeholders; static chunks are reused as-is"""
+    template = load_template(name)
+    static = template['static']
+    out = [static[0]]
+    for i, slot in enumerate(template['slots']):
+        out.append(str(context[slot]))
+        out.append(static[i + 1])
+    return "".join(out)
+
+_asset_urls = {}
+
+def publish_asset(name):
+    """Copy a static template to assets/<stem>.<hash><ext> (only when its content changed)
+    
+    Each market gets its own assets/ next to its page, so the returned URL stays relative.
+    """
+    asset_dir = market_path(ASSET_DIR)
+    url = _asset_urls.get((asset_dir, name))
+    if url:
+        return url
+    
+    with open(os.path.join(TEMPLATE_DIR, name), "rb") as f:
+        content = f.read()
+    
+    stem, ext = os.path.splitext(name)
+    filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+    path = os.path.join(asset_dir, filename)
+    
+    if not os.path.exists(path):
+        os.makedirs(asset_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(asset_dir, f"{stem}.*{ext}")):
+            remove_artifact(stale)
+        _atomic_write(path, content)
+        print(f"   📦 Published asset {path}", file=sys.stderr)
+    precompress(path)
+    
+    url = _asset_urls[(asset_dir, name)] = f"{ASSET_DIR}/{filename}"
+    return url
+
+# --- DATA FEED ---
+FEED_CORE_FIELDS = ['type', 'source', 'user', 'timestamp', 'price', 'vol_usd']
+
+def encode_trade_columns(events):
+    """Columnar feed encoding: dictionary-coded strings, delta timestamps, fixed-point prices.
+    
+    Fields outside FEED_CORE_FIELDS are stored sparsely as [row, value] pairs;
+    a field is dictionary-coded only when every one of its values is a string,
+    mixed-type fields stay plain JSON.
+    """
+    dicts = {'type': [], 'source': [], 'user': []}
+    index = {key: {} for key in dicts}
+    cols = {'type': [], 'source': [], 'user': [], 'ts': [], 'price': [], 'vol': []}
+    extra = {}
+    prev_ts = 0
+    
+    for row, t in enumerate(events):
+        for key in dicts:
+            value = t.get(key, '')
+            if value not in index[key]:
+                index[key][value] = len(dicts[key])
+                dicts[key].append(value)
+            cols[key].append(index[key][value])
+        
+        ts = int(t.get('timestamp', 0))
+        cols['ts'].append(ts - prev_ts)
+        prev_ts = ts
+        cols['price'].append(int(round((t.get('price', 0) or 0) * FEED_PRICE_SCALE)))
+        cols['vol'].append(int(round(t.get('vol_usd', 0) or 0)))
+        
+        for key, value in t.items():
+            if key in FEED_CORE_FIELDS:
+                continue
+            if isinstance(value, float):
+                value = round(value, 4)
+            field = extra.setdefault(key, {'rows': [], 'values': []})
+            field['rows'].append(row)
+            field['values'].append(value)
+    
+    for field in extra.values():
+        if all(isinstance(value, str) for value in field['values']):
+            lookup = {}
+            for value in field['values']:
+                lookup.setdefault(value, len(lookup))
+            field['dict'] = list(lookup)
+            field['values'] = [lookup[value] for value in field['values']]
+    
+    return {'v': 1, 'n': len(events), 'scale': FEED_PRICE_SCALE, 'dict': dicts, 'cols': cols, 'extra': extra}
+
+def decode_trade_columns(blob):
+    """Inverse of encode_trade_columns (timestamps come back as whole seconds)"""
+    cols = blob['cols']
+    scale = blob['scale']
+    events = []
+    ts = 0
+    
+    for row in range(blob['n']):
+        ts += cols['ts'][row]
+        events.append({
+            'type': blob['dict']['type'][cols['type'][row]],
+            'source': blob['dict']['source'][cols['source'][row]],
+            'user': blob['dict']['user'][cols['user'][row]],
+            'timestamp': ts,
+            'price': cols['price'][row] / scale,
+            'vol_usd': cols['vol'][row]
+        })
+    
+    for key, field in blob['extra'].items():
+        for row, value in zip(field['rows'], field['values']):
+            events[row][key] = field['dict'][value] if 'dict' in field else value
+    
+    return events
+
+
+def publish_data_feed(payload, trades):
+    """Write data/latest.json and hourly trade chunks, bumping the sequence number.
+    
+    A chunk is only rewritten (and its seq bumped) when its events changed, so
+    clients re-fetch just the chunks that moved since their last sequence.
+    """
+    data_dir = market_path(DATA_DIR)
+    latest_path = os.path.join(data_dir, "latest.json")
+    os.makedirs(data_dir, exist_ok=True)
+    
+    prev = {}
+    if os.path.exists(latest_path):
+        try:
+            with open(latest_path, "r") as f:
+                prev = json.load(f)
+        except:
+            prev = {}
+    
+    seq = prev.get('seq', 0) + 1
+    prev_buckets = prev.get('trade_buckets', {})
+    
+    buckets = {}
+    for t in trades:
+        bucket = str(int(t.get('timestamp', 0) // TRADE_BUCKET_SECONDS) * TRADE_BUCKET_SECONDS)
+        buckets.setdefault(bucket, []).append(t)
+    
+    manifest = {}
+    for bucket, events in buckets.items():
+        events.sort(key=lambda t: t.get('timestamp', 0))
+        digest = hashlib.sha256(json.dumps(events, sort_keys=True).encode()).hexdigest()[:16]
+        chunk_path = os.path.join(data_dir, f"trades-{bucket}.json")
+        
+        prev_entry = prev_buckets.get(bucket)
+        if prev_entry and prev_entry.get('hash') == digest and os.path.exists(chunk_path):
+            manifest[bucket] = prev_entry
+            precompress(chunk_path)
             continue
         
-        valid_count += 1
-        is_buy = trade_type == 'buy'
+        write_artifact(chunk_path, {'bucket': int(bucket), 'seq': seq, 'trades': encode_trade_columns(events)})
+        manifest[bucket] = {'seq': seq, 'hash': digest, 'count': len(events)}
+        precompress(chunk_path)
+    
+    for path in glob.glob(os.path.join(data_dir, "trades-*.json")):
+        bucket = os.path.basename(path)[len("trades-"):-len(".json")]
+        if bucket not in manifest:
+            remove_artifact(path)
+    
+    latest = {'seq': seq, 'generated_at': datetime.datetime.now().isoformat()}
+    latest.update(payload)
+    latest['trade_buckets'] = manifest
+    
+    if not write_artifact(latest_path, latest, volatile=('seq', 'generated_at', 'timestamp')):
+        print(f"   🛰️ Data feed unchanged, staying at seq {seq - 1}", file=sys.stderr)
+        return seq - 1
+    precompress(latest_path)
+    
+    changed = len([b for b in manifest.values() if b['seq'] == seq])
+    print(f"   🛰️ Data feed seq {seq}: {len(manifest)} trade chunks ({changed} changed)", file=sys.stderr)
+    return seq
+
+# --- SECTION CACHE ---
+SECTION_CACHE_SIZE = 64  # Rendered fragments kept (LRU); a page uses ~5
+_section_cache = OrderedDict()
+_section_cache_stats = {'hits': 0, 'misses': 0}
+_section_cache_lock = threading.Lock()
+
+def section_key(name, inputs):
+    return name + ":" + hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def cached_section(name, inputs, render):
+    """Rendered HTML fragment for `inputs`, reused while a fragment with the same input hash is cached"""
+    key = section_key(name, inputs)
+    with _section_cache_lock:
+        html = _section_cache.get(key)
+        if html is not None:
+            _section_cache.move_to_end(key)
+            _section_cache_stats['hits'] += 1
+            return html
+        _section_cache_stats['misses'] += 1
+    
+    html = render()
+    with _section_cache_lock:
+        _section_cache[key] = html
+        if len(_section_cache) > SECTION_CACHE_SIZE:
+            _section_cache.popitem(last=False)
+    return html
+
+# --- HTML GENERATOR ---
+def render_source_table(source_stats):
+    rows = []
+    for source, s in source_stats.items():
+        if s:
+            rows.append(f"<tr><td class='source-col'>{source}</td><td>{s['min']:.2f}</td><td>{s['q1']:.2f}</td><td class='med-col'>{s['median']:.2f}</td><td>{s['q3']:.2f}</td><td>{s['max']:.2f}</td><td>{s['count']}</td></tr>")
+        else:
+            rows.append(f"<tr><td>{source}</td><td colspan='6' style='opacity:0.5'>No Data</td></tr>")
+    return "".join(rows)
+
+def render_slippage_rows(slippage_ladder, sources):
+    """Effective rate by ticket size: combined book + cheapest venue per size"""
+    rows = []
+    combined_ladder = (slippage_ladder or {}).get('ALL', [])
+    for idx, row in enumerate(combined_ladder):
+        best_venue = None
+        for source in sources:
+            venue_rows = (slippage_ladder or {}).get(source, [])
+            if idx < len(venue_rows) and venue_rows[idx]['buy']:
+                if best_venue is None or venue_rows[idx]['buy'] < best_venue[1]:
+                    best_venue = (source, venue_rows[idx]['buy'])
+        
+        buy_str = f"{row['buy']:.2f}" if row['buy'] else "—"
+        sell_str = f"{row['sell']:.2f}" if row['sell'] else "—"
+        buy_slip = f"{row['buy_slippage_pct']:.2f}%" if row['buy_slippage_pct'] is not None else "—"
+        sell_slip = f"{row['sell_slippage_pct']:.2f}%" if row['sell_slippage_pct'] is not None else "—"
+        venue_str = f"{best_venue[0]} ({best_venue[1]:.2f})" if best_venue else "—"
+        
+        rows.append(f"<tr><td class='source-col'>{row['size']:,} USDT</td><td class='med-col'>{buy_str}</td><td>{buy_slip}</td><td class='med-col'>{sell_str}</td><td>{sell_slip}</td><td>{venue_str}</td></tr>")
+    return "".join(rows) or "<tr><td colspan='6' style='opacity:0.5'>No Data</td></tr>"
+
+def render_window_rows(price_windows):
+    rows = []
+    for window, w in (price_windows or {}).items():
+        rows.append(f"<tr><td class='source-col'>{window.upper()}</td><td>{w['p05']:.2f}</td><td>{w['q1']:.2f}</td><td class='med-col'>{w['median']:.2f}</td><td>{w['q3']:.2f}</td><td>{w['p95']:.2f}</td><td>{w['count']:,}</td></tr>")
+    return "".join(rows) or "<tr><td colspan='7' style='opacity:0.5'>No Data</td></tr>"
+
+def render_ticker(ticker_items):
+    fiat = current_market()['fiat']
+    parts = []
+    for item in ticker_items:
+        change_symbol = "▲" if item['change'] > 0 else "▼" if item['change'] < 0 else "━"
+        change_color = "#00C805" if item['change'] > 0 else "#FF3B30" if item['change'] < 0 else "#8E8E93"
+        
+        source_display = item['source']
         
-        ts = datetime.datetime.fromtimestamp(trade.get("timestamp", time.time()))
-        time_str = ts.strftime("%I:%M %p")
-        age_seconds = time.time() - trade.get("timestamp", time.time())
-        age_str = f"{int(age_seconds/60)}min ago" if age_seconds >= 60 else f"{int(age_seconds)}s ago"
+        # Exchange colors
+        if item.get('type') == 'exchange':
+            if item['source'] == 'BINANCE':
+                source_display = f"🟡 {item['source']}"
+            elif item['source'] == 'MEXC':
+                source_display = f"🔵 {item['source']}"
+            elif item['source'] == 'OKX':
+                source_display = f"🟣 {item['source']}"
+        elif item.get('type') == 'official':
+            source_display = f"💵 {item['source']}"
+        elif item.get('type') == 'remittance':
+            source_display = f"{item.get('emoji', '💱')} {item['source']}"
         
-        icon = "↗" if is_buy else "↘"
-        action = "BOUGHT" if is_buy else "SOLD"
-        icon_class = "buy" if is_buy else "sell"
-        action_color = "var(--green)" if is_buy else "var(--red)"
+        # Color based on type
+        if item.get('type') == 'remittance':
+            price_color = item.get('color', '#34C759')
+        else:
+            price_color = 'var(--text)'
         
-        source = trade.get('source', 'Unknown')
-        if source == 'BINANCE':
-            emoji, color = '🟡', '#F3BA2F'
-        elif source == 'MEXC':
-            emoji, color = '🔵', '#2E55E6'
+        parts.append(render_template("ticker_item.html", {
+            'source_display': source_display,
+            'price_color': price_color,
+            'price': f"{item['median']:.2f}",
+            'fiat': fiat,
+            'change_color': change_color,
+            'change_symbol': change_symbol
+        }))
+    return "".join(parts) * 3
+
+def render_ai_summary(ai_summary, prem):
+    if not ai_summary:
+        return render_template("ai_summary_loading.html", {})
+    
+    sentiment = ai_summary.get('market_sentiment', 'neutral')
+    sentiment_color = '#00C805' if sentiment == 'bullish' else '#FF3B30' if sentiment == 'bearish' else '#FF9500'
+    sentiment_emoji = '📈' if sentiment == 'bullish' else '📉' if sentiment == 'bearish' else '➡️'
+    
+    is_fallback = ai_summary.get('is_fallback', False)
+    source_text = "Rule-Based Analysis" if is_fallback else "Powered by Google Gemini AI"
+    source_badge = '<span style="background:#FF950033;color:#FF9500;padding:2px 8px;border-radius:4px;font-size:11px;margin-left:8px;">FALLBACK</span>' if is_fallback else ''
+    
+    insights_html = "".join(f"<li style='margin-bottom:8px;'>{insight}</li>" for insight in ai_summary.get('key_insights', []))
+    risks_html = "".join(f"<li style='margin-bottom:8px;color:#FF9500;'>{risk}</li>" for risk in ai_summary.get('risk_factors', []))
+    
+    # Black market drivers
+    bm_drivers_html = "".join(f"<li style='margin-bottom:8px;'>{driver}</li>" for driver in ai_summary.get('black_market_drivers', []))
+    
+    # Official rate factors
+    official_factors_html = "".join(f"<li style='margin-bottom:8px;'>{factor}</li>" for factor in ai_summary.get('official_rate_factors', []))
+    
+    gap_explanation = ai_summary.get('gap_explanation', 'No explanation available')
+    
+    # Get forecasts
+    short_forecast = ai_summary.get('short_term_forecast', ai_summary.get('short_term_prediction', 'Not available'))
+    medium_forecast = ai_summary.get('medium_term_forecast', 'Not available')
+    confidence = ai_summary.get('confidence_level', 'medium')
+    confidence_color = '#00C805' if confidence == 'high' else '#FF9500' if confidence == 'medium' else '#FF3B30'
+    
+    return render_template("ai_summary.html", {
+        'source_badge': source_badge,
+        'source_text': source_text,
+        'generated_at': ai_summary.get('generated_at', 'recently')[:16],
+        'sentiment_color': sentiment_color,
+        'sentiment_emoji': sentiment_emoji,
+        'sentiment': sentiment,
+        'confidence_color': confidence_color,
+        'confidence': confidence.upper(),
+        'summary': ai_summary.get('summary', 'Analysis not available.'),
+        'premium_pct': f"{prem:.1f}",
+        'gap_explanation': gap_explanation,
+        'bm_drivers_html': bm_drivers_html if bm_drivers_html else '<li>High USD demand from businesses</li><li>Limited forex in official channels</li>',
+        'official_factors_html': official_factors_html if official_factors_html else "".join(f"<li>{factor}</li>" for factor in current_market()['official_factors']),
+        'insights_html': insights_html,
+        'risks_html': risks_html,
+        'short_forecast': short_forecast,
+        'medium_forecast': medium_forecast,
+        'recommendation': ai_summary.get('recommendation', 'Not available')
+    })
+
+def update_website_html(stats, official, timestamp, current_ads, grouped_ads, peg, ai_summary=None, remittance_rates=None, slippage_ladder=None, price_windows=None, indicators=None, analytics=None, quotes=None):
+    prem = ((stats["median"] - official) / official) * 100 if official else 0
+    
+    dates, medians, q1s, q3s, offs = load_history()
+    price_change = 0
+    price_change_pct = 0
+    if len(medians) > 0:
+        old_median = medians[0]
+        price_change = stats["median"] - old_median
+        price_change_pct = (price_change / old_median * 100) if old_median > 0 else 0
+    
+    # Calculate premiums for each historical point
+    premiums = []
+    for i in range(len(medians)):
+        if i < len(offs) and offs[i] > 0:
+            prem_val = ((medians[i] - offs[i]) / offs[i]) * 100
+            premiums.append(prem_val)
         else:
-            emoji, color = '🟣', '#A855F7'
-        
-        html += f"""
-        <div class="feed-item" data-source="{source}">
-            <div class="feed-icon {icon_class}">
-                {icon}
-            </div>
-            <div class="feed-content">
-                <div class="feed-meta">
-                    <span>{time_str}</span>
-                    <span>{age_str}</span>
-                </div>
-                <div class="feed-text">
-                    {emoji} <span class="feed-user">{trade.get('user', 'Unknown')[:15]}</span>
-                    <span style="color:{color};font-weight:600">({source})</span>
-                    <b style="color:{action_color}">{action}</b>
-                    <span class="feed-amount">{trade.get('vol_usd', 0):,.0f} USDT</span>
-                    @ <span class="feed-price">{trade.get('price', 0):.2f} ETB</span>
-                </div>
-            </div>
-        </div>
-        """
-    
-    if not html:
+            premiums.append(0)
+    
+    arrow = "↗" if price_change > 0 else "↘" if price_change < 0 else "→"
+    change_color = "#00C805" if price_change > 0 else "#FF3B30" if price_change < 0 else "#8E8E93"
+    
+    # Source summary table (NO remittance rates here)
+    if analytics:
+        source_stats = analytics['source_stats']
+    else:
+        source_stats = {source: analyze([a["price"] for a in ads], peg) for source, ads in grouped_ads.items()}
+    ticker_items = [
+        {'source': source, 'median': s['median'], 'change': 0, 'type': 'exchange'}
+        for source, s in source_stats.items() if s
+    ]
+    table_inputs = {source: s and [s['min'], s['q1'], s['median'], s['q3'], s['max'], s['count']] for source, s in source_stats.items()}
+    table_rows = cached_section("source_table", table_inputs, lambda: render_source_table(source_stats))
+    
+    # Add official rate to ticker
+    ticker_items.append({
+        'source': 'Official',
+        'median': official,
+        'change': 0,
+        'type': 'official',
+        'emoji': '💵',
+        'color': '#34C759'
+    })
+    
+    # Add remittance rates to ticker ONLY
+    if remittance_rates:
+        for key, data in remittance_rates.items():
+            if key != 'OFFICIAL':  # Already have official
+                ticker_items.append({
+                    'source': data['name'],
+                    'median': data['rate'],
+                    'change': 0,
+                    'type': 'remittance',
+                    'emoji': data['emoji'],
+                    'color': data['color']
+                })
+    
+    # Effective rate by ticket size (combined book + cheapest venue per size)
+    sources = list(grouped_ads)
+    slippage_rows = cached_section("slippage", [slippage_ladder, sources], lambda: render_slippage_rows(slippage_ladder, sources))
+    
+    # Rolling distribution over every snapshot (sketch-backed)
+    window_rows = cached_section("windows", price_windows, lambda: render_window_rows(price_windows))
+    
+    # Load recent trades
+    recent_trades = load_recent_trades()
+    buys_count = len([t for t in recent_trades if t.get('type') == 'buy'])
+    sells_count = len([t for t in recent_trades if t.get('type') == 'sell'])
+    
+    # Chart data - only 3 exchanges now
+    chart_data = {'BINANCE': [], 'MEXC': [], 'OKX': []}
+    for source, ads in grouped_ads.items():
+        prices = [a["price"] / peg for a in ads if a.get("price", 0) > 0]
+        if prices and source in chart_data:
+            chart_data[source] = prices
+    
+    
+    # History data with premiums
+    history_data = {
+        'dates': [d.isoformat() if hasattr(d, 'isoformat') else str(d) for d in dates] if dates else [],
+        'medians': medians if medians else [],
+        'officials': [o if o else 0 for o in offs] if offs else [],
+        'premiums': premiums,
+        'ewma': indicators['series'] if indicators else None
+    }
+    
+    volume_by_exchange = calculate_volume_by_exchange(recent_trades)
+    
+    # Calculate market depth by price for stacked chart
+    market_depth = analytics['depth'] if analytics else calculate_market_depth_by_price(current_ads, peg)
+    
+    data_seq = publish_data_feed({
+        'timestamp': timestamp,
+        'stats': {'median': stats['median'], 'official': official, 'premium': prem},
+        'chart_data': chart_data,
+        'history': history_data,
+        'trade_volume': volume_by_exchange,
+        'market_depth': market_depth,
+        'quotes': quotes or {}
+    }, recent_trades)
+    
+    feed_html = generate_feed_html(recent_trades, peg)
+    
+    trade_stats = calculate_trade_stats(recent_trades)
+    
+    # Ticker with remittance rates (rendered once, repeated for the scroll loop)
+    ticker_html = cached_section("ticker", [current_market()['fiat'], ticker_items], lambda: render_ticker(ticker_items))
+    
+    # AI Summary HTML at BOTTOM
+    ai_summary_html = cached_section("ai_summary", [current_market()['central_bank'], ai_summary, f"{prem:.1f}"], lambda: render_ai_summary(ai_summary, prem))
+    
+    context = {
+        'fiat': current_market()['fiat'],
+        'flag': current_market()['flag'],
+        'push_url': PUSH_PUBLIC_URL,
+        'data_seq': data_seq,
+        'css_url': publish_asset("terminal.css"),
+        'js_url': publish_asset("terminal.js"),
+        'ticker_html': ticker_html,
+        'median_rate': f"{stats['median']:.2f}",
+        'change_class': 'positive' if price_change > 0 else 'negative' if price_change < 0 else '',
+        'arrow': arrow,
+        'price_change_abs': f"{abs(price_change):.2f}",
+        'price_change_pct_abs': f"{abs(price_change_pct):.2f}",
+        'premium_pct': f"{prem:.2f}",
+        'table_rows': table_rows,
+        'window_rows': window_rows,
+        'slippage_rows': slippage_rows,
+        'buys_count': buys_count,
+        'sells_count': sells_count,
+        'feed_html': feed_html,
+        'feed_page_size': FEED_PAGE_SIZE,
+        'hour_buys': trade_stats['hour_buys'],
+        'hour_buy_volume': f"{trade_stats['hour_buy_volume']:,.0f}",
+        'today_buys': trade_stats['today_buys'],
+        'today_buy_volume': f"{trade_stats['today_buy_volume']:,.0f}",
+        'overall_buys': trade_stats['overall_buys'],
+        'overall_buy_volume': f"{trade_stats['overall_buy_volume']:,.0f}",
+        'hour_sells': trade_stats['hour_sells'],
+        'hour_sell_volume': f"{trade_stats['hour_sell_volume']:,.0f}",
+        'today_sells': trade_stats['today_sells'],
+        'today_sell_volume': f"{trade_stats['today_sell_volume']:,.0f}",
+        'overall_sells': trade_stats['overall_sells'],
+        'overall_sell_volume': f"{trade_stats['overall_sell_volume']:,.0f}",
+        'ai_summary_html': ai_summary_html,
+        'official_rate': f"{official:.2f}",
+        'timestamp': timestamp
+    }
+    html = render_template("index.html", context)
+    
+    # The run stamp and relative feed ages change every run; the page only
+    # counts as changed when the data behind it does
+    semantic = dict(context, timestamp=None, feed_html=[len(recent_trades), max((t.get('timestamp', 0) for t in recent_trades), default=0)])
+    html_path = market_path(HTML_FILENAME)
+    if write_artifact(html_path, html, semantic=semantic):
+        precompress(html_path)
+    else:
+        print("   💤 index.html unchanged, not rewritten", file=sys.stderr)
+
+FEED_SOURCE_STYLES = {
+    'BINANCE': ('🟡', '#F3BA2F'),
+    'MEXC': ('🔵', '#2E55E6')
+}
+
+def render_feed_item(trade, now):
+    """One feed event as HTML (None for event types the feed doesn't show)"""
+    trade_type = trade.get('type')
+    ts = trade.get("timestamp", now)
+    age_seconds = now - ts
+    common = {
+        'time_str': datetime.datetime.fromtimestamp(ts).strftime("%I:%M %p"),
+        'age_str': f"{int(age_seconds/60)}min ago" if age_seconds >= 60 else f"{int(age_seconds)}s ago",
+        'source': trade.get('source', 'Unknown'),
+        'price': f"{trade.get('price', 0):.2f}",
+        'fiat': current_market()['fiat']
+    }
+    
+    if trade_type == 'anomaly':
+        common['source'] = trade.get('source', 'MARKET')
+        return render_template("feed_anomaly.html", dict(common, reason=trade.get('reason', '')))
+    
+    if trade_type == 'arbitrage':
+        return render_template("feed_arbitrage.html", dict(
+            common,
+            user=trade.get('user', ''),
+            amount=f"{trade.get('vol_usd', 0):,.0f}",
+            sell_price=f"{trade.get('sell_price', 0):.2f}",
+            spread_pct=f"{trade.get('spread_pct', 0):.2f}"
+        ))
+    
+    if trade_type == 'request':
+        request_type = trade.get('request_type', 'REQUEST')
+        action_color = "var(--green)" if 'BUY' in request_type else "var(--red)"
+        variant = {
+            'item_class': ' request-item',
+            'icon_class': '',
+            'icon_style': f' style="background:linear-gradient(135deg,{action_color}22,{action_color}11)"',
+            'icon': "📝",
+            'action': request_type,
+            'action_color': action_color
+        }
+    elif trade_type in ['buy', 'sell']:
+        is_buy = trade_type == 'buy'
+        variant = {
+            'item_class': '',
+            'icon_class': " buy" if is_buy else " sell",
+            'icon_style': '',
+            'icon': "↗" if is_buy else "↘",
+            'action': "BOUGHT" if is_buy else "SOLD",
+            'action_color': "var(--green)" if is_buy else "var(--red)"
+        }
+    else:
+        return None
+    
+    emoji, color = FEED_SOURCE_STYLES.get(common['source'], ('🟣', '#A855F7'))
+    return render_template("feed_trade.html", dict(
+        common, **variant,
+        emoji=emoji,
+        color=color,
+        user=trade.get('user', 'Unknown')[:15],
+        amount=f"{trade.get('vol_usd', 0):,.0f}"
+    ))
+
+def generate_feed_html(trades, peg, limit=None):
+    """Server-side initial feed: only the newest `limit` events, picked without a full sort.
+    
+    Older events reach the browser through the data/trades-*.json chunks and are
+    paged in by terminal.js as the feed is scrolled.
+    """
+    limit = limit or FEED_PAGE_SIZE
+    now = time.time()
+    shown = [t for t in trades if t.get('type') in FEED_EVENT_TYPES]
+    newest = heapq.nlargest(limit, shown, key=lambda x: x.get('timestamp', 0))
+    
+    parts = [item for item in (render_feed_item(t, now) for t in newest) if item]
+    if not parts:
         return '<div style="padding:20px;text-align:center;color:var(--text-secondary)">No recent activity</div>'
     
-    return html
+    older = len(shown) - len(newest)
+    if older > 0:
+        parts.append(f'<div class="feed-more">{older} older events load as you scroll</div>')
+    
+    return "".join(parts)
+
+
+# --- SHARDING ---
+# With several markets, detection and stats are pure-Python CPU work that the
+# market threads would otherwise serialize on the GIL. In sharded mode each
+# market's book is shipped to a worker process as one packed blob (a string
+# table plus typed columns) and only the small results come back; the parent
+# keeps all I/O, state files and aggregation.
+BOOK_HEADER = struct.Struct("<II")  # ads, string table bytes
+_shard_pool = None
+
+def encode_book(ads):
+    """Pack ads into bytes: header, NUL-joined string table, then source/type/advertiser ids and price/available columns"""
+    strings = {}
+    sources = array('H', (strings.setdefault(ad['source'], len(strings)) for ad in ads))
+    ad_types = array('H', (strings.setdefault(ad.get('ad_type', 'SELL'), len(strings)) for ad in ads))
+    advertisers = array('I', (strings.setdefault(ad['advertiser'], len(strings)) for ad in ads))
+    prices = array('d', (ad['price'] for ad in ads))
+    available = array('d', (ad['available'] for ad in ads))
+    
+    table = "\0".join(strings).encode("utf-8")
+    return b"".join([BOOK_HEADER.pack(len(ads), len(table)), table,
+                     sources.tobytes(), ad_types.tobytes(), advertisers.tobytes(), prices.tobytes(), available.tobytes()])
+
+def decode_book(blob):
+    n, table_len = BOOK_HEADER.unpack_from(blob)
+    offset = BOOK_HEADER.size
+    strings = blob[offset:offset + table_len].decode("utf-8").split("\0") if table_len else []
+    offset += table_len
+    
+    columns = []
+    for typecode in ('H', 'H', 'I', 'd', 'd'):
+        column = array(typecode)
+        size = n * column.itemsize
+        column.frombytes(blob[offset:offset + size])
+        offset += size
+        columns.append(column)
+    sources, ad_types, advertisers, prices, available = columns
+    
+    return [
+        {'source': strings[sources[i]], 'ad_type': strings[ad_types[i]], 'advertiser': strings[advertisers[i]],
+         'price': prices[i], 'available': available[i]}
+        for i in range(n)
+    ]
+
+def book_analytics(ads, sources, peg):
+    """Overall stats, per-source stats and the depth ladder for one book"""
+    grouped = {source: [] for source in sources}
+    for ad in ads:
+        if ad['source'] in grouped:
+            grouped[ad['source']].append(ad['price'])
+    return {
+        'stats': analyze([ad['price'] for ad in ads], peg),
+        'source_stats': {source: analyze(prices, peg) for source, prices in grouped.items()},
+        'depth': calculate_market_depth_by_price(ads, peg)
+    }
+
+def shard_detect(code, blob, peg):
+    """Worker: detect_real_trades for one market against its saved market state"""
+    return run_in_market(code, detect_real_trades, decode_book(blob), peg)
+
+def shard_analytics(code, blob, sources, peg):
+    """Worker: book_analytics for one market (raw_data, unused by the parent, stays behind)"""
+    result = run_in_market(code, book_analytics, decode_book(blob), sources, peg)
+    for stats in [result['stats']] + list(result['source_stats'].values()):
+        if stats:
+            stats.pop('raw_data', None)
+    return result
+
+def shard_pool():
+    global _shard_pool
+    with _state_lock:
+        if _shard_pool is None:
+            _shard_pool = ProcessPoolExecutor(max_workers=SHARD_WORKERS, mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+    return _shard_pool
+
+def detect_trades(ads, peg):
+    """detect_real_trades, on a worker process in sharded mode"""
+    if not SHARD_WORKERS:
+        return detect_real_trades(ads, peg)
+    events = shard_pool().submit(shard_detect, _market.get(), encode_book(ads), peg).result()
+    record_detection_metrics(events)
+    return events
+
+def market_analytics(ads, sources, peg):
+    """book_analytics, on a worker process in sharded mode"""
+    if not SHARD_WORKERS:
+        return book_analytics(ads, sources, peg)
+    return shard_pool().submit(shard_analytics, _market.get(), encode_book(ads), sources, peg).result()
+
+def finish_sharding():
+    global _shard_pool
+    if _shard_pool is not None:
+        _shard_pool.shutdown()
+        _shard_pool = None
+
+# --- PROFILING ---
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _sample_stacks(stop, counts, interval):
+    """Sampling profiler: every interval, fold each thread's current stack into collapsed form"""
+    own = threading.get_ident()
+    while not stop.wait(interval):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+def write_profile_reports(profiler, snapshot, peak, stacks):
+    import pstats
+    
+    out = io.StringIO()
+    out.write("Hot functions (main thread, cProfile). Worker threads appear in the sampled stacks.\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+    stats.sort_stats("tottime").print_stats(PROFILE_TOP)
+    write_artifact(PROFILE_HOT_FILE, out.getvalue())
+    
+    lines = [f"Top allocation sites (tracemalloc, live at exit). Peak traced: {peak/1024/1024:.1f} MB", ""]
+    for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size/1024:>10.1f} KB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+    write_artifact(PROFILE_ALLOC_FILE, "\n".join(lines) + "\n")
+    
+    # Brendan Gregg's collapsed format: "frame;frame;frame count" (flamegraph.pl, speedscope)
+    write_artifact(PROFILE_STACKS_FILE, "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items())))
+    print(f"   🔬 Profile written: {PROFILE_HOT_FILE}, {PROFILE_ALLOC_FILE}, {PROFILE_STACKS_FILE} ({sum(stacks.values())} samples)", file=sys.stderr)
 
+def run_profiled(fn, *args):
+    """Run fn(*args) under cProfile, tracemalloc and the stack sampler, then write the three reports"""
+    import cProfile
+    
+    profiler = cProfile.Profile()
+    stacks = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_stacks, args=(stop, stacks, PROFILE_SAMPLE_INTERVAL), name="profile-sampler", daemon=True)
+    
+    tracemalloc.start(PROFILE_TRACE_FRAMES)
+    sampler.start()
+    profiler.enable()
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+        stop.set()
+        sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        write_profile_reports(profiler, snapshot, peak, stacks)
+        save_artifact_hashes()
 
 # --- MAIN ---
-def main():
-    print("🔍 Running v42.9 (AI + Remittance Rates!)...", file=sys.stderr)
-    print(f"   🤖 AI Analysis: Gemini with Forecasting", file=sys.stderr)
-    print(f"   💱 Remittance: Western Union, Remitly, Ria in ticker", file=sys.stderr)
-    print(f"   🔄 Fallback: p2p.army when RapidAPI fails", file=sys.stderr)
-    print(f"   ❌ Bybit: REMOVED", file=sys.stderr)
-    
-    NUM_SNAPSHOTS = 8
-    WAIT_TIME = 15
+def run_market():
+    """One full snapshot → detect → publish cycle for the current market; returns its events"""
     all_trades = []
     
+    start_ai_worker()
+    
     print(f"   > Snapshot 1/{NUM_SNAPSHOTS}...", file=sys.stderr)
-    prev_snapshot = capture_market_snapshot()
+    with span("snapshot"):
+        prev_snapshot = capture_market_snapshot()
     save_market_state(prev_snapshot)
     print("   > Saved baseline snapshot", file=sys.stderr)
     
     peg = fetch_usdt_peg() or 1.0
+    spread_book = new_spread_book()
+    price_sketches = load_price_sketches()
+    record_snapshot_prices(price_sketches, prev_snapshot, peg)
+    anomaly_state = load_anomaly_state()
+    all_trades.extend(detect_anomalies(anomaly_state, prev_snapshot, peg))
     
     for i in range(2, NUM_SNAPSHOTS + 1):
         print(f"   > ⏳ Waiting {WAIT_TIME}s to catch trades...", file=sys.stderr)
-        time.sleep(WAIT_TIME)
+        with span("wait"):
+            time.sleep(0 if HTTP['mode'] == 'replay' else WAIT_TIME)  # Replayed books don't move in real time
         
         print(f"   > Snapshot {i}/{NUM_SNAPSHOTS}...", file=sys.stderr)
-        current_snapshot = capture_market_snapshot()
-        
-        trades_this_round = detect_real_trades(current_snapshot, peg)
+        with span("snapshot"):
+            current_snapshot = capture_market_snapshot(spread_book, peg)
+        record_snapshot_prices(price_sketches, current_snapshot, peg)
+        
+        with span("detect.trades"):
+            trades_this_round = detect_trades(current_snapshot, peg)
+        with span("detect.arbitrage"):
+            trades_this_round += detect_arbitrage(spread_book)
+        with span("detect.anomalies"):
+            trades_this_round += detect_anomalies(anomaly_state, current_snapshot, peg)
+        if push_enabled():
+            for event in trades_this_round:
+                publish_event('trade', event)
+            round_stats = analyze([ad['price'] for ad in current_snapshot], peg)
+            if round_stats:
+                publish_event('rate', {'median': round_stats['median'], 'count': round_stats['count'], 'timestamp': time.time()})
         if trades_this_round:
             all_trades.extend(trades_this_round)
             print(f"   ✅ Round {i-1}: Detected {len(trades_this_round)} trades", file=sys.stderr)
@@ -2929,14 +3840,17 @@ def main():
         save_market_state(current_snapshot)
         prev_snapshot = current_snapshot
     
+    save_anomaly_state(anomaly_state)
+    save_arbitrage_state(spread_book)
+    
     # Final snapshot
     print("   > Final snapshot for display...", file=sys.stderr)
-    with ThreadPoolExecutor(max_workers=6) as ex:
-        f_binance = ex.submit(fetch_binance_both_sides)
-        f_mexc = ex.submit(fetch_mexc_both_sides)
-        f_okx = ex.submit(fetch_exchange_both_sides, "okx")
-        f_off = ex.submit(fetch_official_rate)
-        f_remittance = ex.submit(fetch_remittance_rates)
+    with span("snapshot.final"), ThreadPoolExecutor(max_workers=6) as ex:
+        f_binance = submit_in_market(ex, fetch_binance_both_sides)
+        f_mexc = submit_in_market(ex, fetch_mexc_both_sides)
+        f_okx = submit_in_market(ex, fetch_exchange_both_sides, "okx")
+        f_off = submit_in_market(ex, fetch_official_rate)
+        f_remittance = submit_in_market(ex, fetch_remittance_rates)
         
         bin_ads = f_binance.result() or []
         mexc_ads = f_mexc.result() or []
@@ -2949,49 +3863,107 @@ def main():
     print(f"      MEXC: {len(mexc_ads)} ads", file=sys.stderr)
     print(f"      OKX: {len(okx_ads)} ads", file=sys.stderr)
     
-    bin_ads = remove_outliers(bin_ads, peg)
-    mexc_ads = remove_outliers(mexc_ads, peg)
-    okx_ads = remove_outliers(okx_ads, peg)
+    record_snapshot_prices(price_sketches, bin_ads + mexc_ads + okx_ads, peg)
+    save_price_sketches(price_sketches)
+    price_windows = rolling_price_quantiles(price_sketches)
+    
+    with span("remove_outliers"):
+        bin_ads = remove_outliers(bin_ads, peg)
+        mexc_ads = remove_outliers(mexc_ads, peg)
+        okx_ads = remove_outliers(okx_ads, peg)
     
     final_snapshot = bin_ads + mexc_ads + okx_ads
     grouped_ads = {"BINANCE": bin_ads, "MEXC": mexc_ads, "OKX": okx_ads}
     
     if all_trades:
-        save_trades(all_trades)
+        with span("save_trades"):
+            save_trades(all_trades)
         print(f"   💾 Saved {len(all_trades)} total trades", file=sys.stderr)
     
     if final_snapshot:
-        all_prices = [x['price'] for x in final_snapshot]
-        stats = analyze(all_prices, peg)
+        with span("analytics"):
+            analytics = market_analytics(final_snapshot, list(grouped_ads), peg)
+        stats = analytics['stats']
+        if stats and official:
+            publish_event('rate', {'median': stats['median'], 'count': stats['count'], 'official': official,
+                                   'premium': (stats['median'] - official) / official * 100, 'timestamp': time.time()})
         
         if stats:
-            save_to_history(stats, official)
+            liquidity_book = build_liquidity_book(final_snapshot, peg)
+            slippage_ladder = calculate_slippage_ladder(liquidity_book)
             
-            # Load history and trades for AI
-            history_data = load_history()
+            with span("history.save"):
+                indicators = save_to_history(stats, official, slippage_ladder)
+            start_chart_render()
+            
+            # Trade stats feed the AI inputs saved for the next run
             recent_trades = load_recent_trades()
             trade_stats = calculate_trade_stats(recent_trades)
             volume_by_exchange = calculate_volume_by_exchange(recent_trades)
             
-            # Generate AI summary with forecasting
-            ai_summary = load_cached_ai_summary()
-            if not ai_summary:
-                ai_summary = generate_ai_summary(stats, official, trade_stats, volume_by_exchange, history_data)
+            # AI summary comes from the background worker (or the cache); never wait on Gemini
+            save_ai_context(stats, official, trade_stats, volume_by_exchange, indicators)
+            ai_summary = current_ai_summary()
             
             if not ai_summary:
                 print("   ⚠️ Using emergency fallback for AI", file=sys.stderr)
                 ai_summary = create_fallback_summary(stats, official, trade_stats)
             
+            # Best bid/ask per exchange as of the last detection round
+            quotes = best_quotes(spread_book)
+            
             # Generate HTML with AI summary and remittance rates
-            update_website_html(
-                stats, official,
-                time.strftime("%Y-%m-%d %H:%M:%S"),
-                final_snapshot, grouped_ads, peg,
-                ai_summary=ai_summary,
-                remittance_rates=remittance_rates
-            )
+            with span("render.html"):
+                update_website_html(
+                    stats, official,
+                    time.strftime("%Y-%m-%d %H:%M:%S"),
+                    final_snapshot, grouped_ads, peg,
+                    ai_summary=ai_summary,
+                    remittance_rates=remittance_rates,
+                    slippage_ladder=slippage_ladder,
+                    price_windows=price_windows,
+                    indicators=indicators,
+                    analytics=analytics,
+                    quotes=quotes
+                )
+            if api_enabled():
+                publish_api_state(stats, official, analytics, slippage_ladder, price_windows, indicators, quotes)
+    else:
+        print(f"⚠️ No ads found for {current_market()['code']}", file=sys.stderr)
+    
+    return all_trades
+
+def main(markets=None):
+    """Run every market concurrently over the shared session, host slots and worker pools"""
+    markets = markets or [DEFAULT_MARKET]
+    print("🔍 Running v42.9 (AI + Remittance Rates!)...", file=sys.stderr)
+    print(f"   🤖 AI Analysis: Gemini with Forecasting", file=sys.stderr)
+    print(f"   💱 Remittance: Western Union, Remitly, Ria in ticker", file=sys.stderr)
+    print(f"   🔄 Fallback: p2p.army when RapidAPI fails", file=sys.stderr)
+    print(f"   ❌ Bybit: REMOVED", file=sys.stderr)
+    print(f"   🌍 Markets: {', '.join(markets)}", file=sys.stderr)
+    
+    all_trades = []
+    if len(markets) == 1:
+        all_trades = run_in_market(markets[0], run_market)
     else:
-        print("⚠️ No ads found", file=sys.stderr)
+        with ThreadPoolExecutor(max_workers=len(markets)) as ex:
+            futures = {ex.submit(run_in_market, code, run_market): code for code in markets}
+            for future in as_completed(futures):
+                try:
+                    all_trades += future.result()
+                except Exception as e:
+                    print(f"   ❌ {futures[future]} run failed: {e}", file=sys.stderr)
+    
+    finish_sharding()
+    with span("charts"):
+        finish_chart_render()
+    with span("precompress"):
+        finish_precompression()
+    with span("ai_wait"):
+        finish_ai_workers()
+    save_run_metrics()
+    save_artifact_hashes()
     
     buys = len([t for t in all_trades if t.get('type') == 'buy'])
     sells = len([t for t in all_trades if t.get('type') == 'sell'])
@@ -2999,5 +3971,62 @@ def main():
     print(f"✅ Complete! Detected {buys} buys, {sells} sells this run.")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ETB P2P market terminal: snapshot, detect, publish")
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--record", metavar="ARCHIVE", help="Capture every upstream response into a gzip fixture archive")
+    transport.add_argument("--replay", metavar="ARCHIVE", help="Serve upstream responses from a fixture archive instead of the network")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Replay: multiply sampled upstream latencies (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Replay: fraction of requests answered with an injected 429/5xx")
+    parser.add_argument("--seed", type=int, default=0, help="Replay: seed for latency sampling and error injection")
+    parser.add_argument("--profile", action="store_true", default=os.environ.get("ETB_PROFILE", "") not in ("", "0"),
+                        help="Write cProfile, tracemalloc and sampled-stack reports next to index.html (or set ETB_PROFILE=1)")
+    parser.add_argument("--markets", default=os.environ.get("ETB_MARKETS", DEFAULT_MARKET),
+                        help=f"Comma-separated markets to run concurrently ({', '.join(MARKETS)}; or set ETB_MARKETS)")
+    parser.add_argument("--shards", type=int, default=SHARD_WORKERS, metavar="N",
+                        help="Run detection and analytics on N worker processes (0 = inline; or set ETB_SHARDS)")
+    parser.add_argument("--push-port", type=int, metavar="PORT", help="Broadcast detected events live over SSE (/events) and WebSocket (/ws)")
+    parser.add_argument("--push-host", default="127.0.0.1", help="Interface for the push server")
+    parser.add_argument("--api-port", type=int, metavar="PORT", help="Serve the read-only JSON API (/api/...) from memory")
+    parser.add_argument("--api-host", default="127.0.0.1", help="Interface for the JSON API")
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="Daemon mode: run again every SECONDS instead of exiting")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-textfile", metavar="PATH", help="Write Prometheus metrics to PATH after each run (textfile collector)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    markets = [code.strip().upper() for code in args.markets.split(",") if code.strip()]
+    unknown = [code for code in markets if code not in MARKETS]
+    if unknown:
+        sys.exit(f"Unknown market(s): {', '.join(unknown)} (known: {', '.join(MARKETS)})")
+    SHARD_WORKERS = args.shards
+    if args.record:
+        configure_http('record', args.record)
+    elif args.replay:
+        configure_http('replay', args.replay, args.latency_scale, args.error_rate, args.seed)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    if args.push_port:
+        start_push_server(args.push_port, args.push_host)
+    if args.api_port:
+        start_api_server(args.api_port, args.api_host)
+    try:
+        while True:
+            reset_run_metrics()
+            try:
+                if args.profile:
+                    run_profiled(main, markets)
+                else:
+                    main(markets)
+            except Exception as e:
+                if not args.loop:
+                    raise
+                print(f"   ❌ Run failed: {e}", file=sys.stderr)
+            if args.metrics_textfile:
+                write_prometheus_textfile(args.metrics_textfile)
+            if not args.loop:
+                break
+            time.sleep(args.loop)
+    finally:
+        finish_recording()
@@ -0,0 +1,672 @@
+let currentPeriod = 'live';
+let currentSource = 'all';
+let currentTrendPeriod = '1d';
+
+// Per-run data comes from data/latest.json + data/trades-<bucket>.json
+const DATA_POLL_MS = 60000;
+let allTrades = [];
+let chartData = {};
+let historyData = {};
+let tradeVolume = {};
+let marketDepth = {supply: [], demand: []};
+let dataSeq = 0;
+// Feed sequence index.html was rendered with; a newer one means the server-rendered panels are stale
+const PAGE_SEQ = Number(document.body.dataset.seq) || 0;
+const FIAT = document.body.dataset.fiat || 'ETB';
+const tradeBuckets = {};
+
+// Unpack a columnar trade chunk (see encode_trade_columns in main.py)
+function decodeTrades(blob) {
+    const cols = blob.cols;
+    const events = new Array(blob.n);
+    let ts = 0;
+    for (let i = 0; i < blob.n; i++) {
+        ts += cols.ts[i];
+        events[i] = {
+            type: blob.dict.type[cols.type[i]],
+            source: blob.dict.source[cols.source[i]],
+            user: blob.dict.user[cols.user[i]],
+            timestamp: ts,
+            price: cols.price[i] / blob.scale,
+            vol_usd: cols.vol[i]
+        };
+    }
+    for (const [key, field] of Object.entries(blob.extra || {})) {
+        field.rows.forEach((row, j) => {
+            events[row][key] = field.dict ? field.dict[field.values[j]] : field.values[j];
+        });
+    }
+    return events;
+}
+
+async function fetchJson(url) {
+    try {
+        const res = await fetch(url, {cache: 'no-store'});
+        return res.ok ? await res.json() : null;
+    } catch (e) {
+        return null;
+    }
+}
+
+async function loadData() {
+    const latest = await fetchJson('data/latest.json?t=' + Date.now());
+    if (!latest || latest.seq === dataSeq) return;
+    if (PAGE_SEQ && latest.seq > PAGE_SEQ) {
+        location.reload();
+        return;
+    }
+    
+    // Only fetch trade chunks whose sequence moved since we last saw them
+    const wanted = latest.trade_buckets || {};
+    await Promise.all(Object.entries(wanted).map(async ([bucket, meta]) => {
+        if (tradeBuckets[bucket] && tradeBuckets[bucket].seq === meta.seq) return;
+        const chunk = await fetchJson('data/trades-' + bucket + '.json?seq=' + meta.seq);
+        if (chunk) tradeBuckets[bucket] = {seq: chunk.seq, events: decodeTrades(chunk.trades)};
+    }));
+    Object.keys(tradeBuckets).forEach(bucket => {
+        if (!(bucket in wanted)) delete tradeBuckets[bucket];
+    });
+    
+    allTrades = Object.values(tradeBuckets).flatMap(chunk => chunk.events);
+    chartData = latest.chart_data || {};
+    historyData = latest.history || {};
+    tradeVolume = latest.trade_volume || {};
+    marketDepth = latest.market_depth || {supply: [], demand: []};
+    dataSeq = latest.seq;
+    
+    initCharts();
+    filterTrades(currentPeriod);
+}
+
+// Render Market Depth (Supply/Demand by Price)
+function renderMarketDepth() {
+    const colors = {
+        'BINANCE': '#F3BA2F',
+        'MEXC': '#2E55E6', 
+        'OKX': '#A855F7'
+    };
+
+    // Render Supply (Sell Orders) - Green side
+    const supplyContainer = document.getElementById('supplyChart');
+    let supplyHtml = '';
+    const supplyData = marketDepth.supply || [];
+    const maxSupply = Math.max(...supplyData.map(d => d.total), 1);
+
+    supplyData.slice(0, 15).forEach(item => {
+        const binancePct = (item.BINANCE / maxSupply * 100) || 0;
+        const mexcPct = (item.MEXC / maxSupply * 100) || 0;
+        const okxPct = (item.OKX / maxSupply * 100) || 0;
+
+        supplyHtml += `
+            <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;align-items:center;margin-bottom:8px;">
+                <span style="font-weight:600;color:var(--text);">$${item.total.toLocaleString(undefined, {maximumFractionDigits:0})}</span>
+                <span style="color:var(--green);font-weight:600;">${item.price} ${FIAT}</span>
+                <div style="display:flex;height:20px;border-radius:4px;overflow:hidden;background:var(--border);">
+                    ${item.BINANCE > 0 ? `<div style="width:${binancePct}%;background:#F3BA2F;" title="Binance: $${item.BINANCE.toLocaleString()}"></div>` : ''}
+                    ${item.MEXC > 0 ? `<div style="width:${mexcPct}%;background:#2E55E6;" title="MEXC: $${item.MEXC.toLocaleString()}"></div>` : ''}
+                    ${item.OKX > 0 ? `<div style="width:${okxPct}%;background:#A855F7;" title="OKX: $${item.OKX.toLocaleString()}"></div>` : ''}
+                </div>
+            </div>
+        `;
+    });
+
+    if (supplyData.length === 0) {
+        supplyHtml = '<div style="text-align:center;padding:20px;color:var(--text-secondary);">No supply data</div>';
+    }
+    supplyContainer.innerHTML = supplyHtml;
+
+    // Render Demand (Buy Orders) - Red side
+    const demandContainer = document.getElementById('demandChart');
+    let demandHtml = '';
+    const demandData = marketDepth.demand || [];
+    const maxDemand = Math.max(...demandData.map(d => d.total), 1);
+
+    demandData.slice(0, 15).forEach(item => {
+        const binancePct = (item.BINANCE / maxDemand * 100) || 0;
+        const mexcPct = (item.MEXC / maxDemand * 100) || 0;
+        const okxPct = (item.OKX / maxDemand * 100) || 0;
+
+        demandHtml += `
+            <div style="display:grid;grid-template-columns:120px 80px 1fr;gap:8px;align-items:center;margin-bottom:8px;">
+                <span style="font-weight:600;color:var(--text);">$${item.total.toLocaleString(undefined, {maximumFractionDigits:0})}</span>
+                <span style="color:var(--red);font-weight:600;">${item.price} ${FIAT}</span>
+                <div style="display:flex;height:20px;border-radius:4px;overflow:hidden;background:var(--border);">
+                    ${item.BINANCE > 0 ? `<div style="width:${binancePct}%;background:#F3BA2F;" title="Binance: $${item.BINANCE.toLocaleString()}"></div>` : ''}
+                    ${item.MEXC > 0 ? `<div style="width:${mexcPct}%;background:#2E55E6;" title="MEXC: $${item.MEXC.toLocaleString()}"></div>` : ''}
+                    ${item.OKX > 0 ? `<div style="width:${okxPct}%;background:#A855F7;" title="OKX: $${item.OKX.toLocaleString()}"></div>` : ''}
+                </div>
+            </div>
+        `;
+    });
+
+    if (demandData.length === 0) {
+        demandHtml = '<div style="text-align:center;padding:20px;color:var(--text-secondary);">No demand data</div>';
+    }
+    demandContainer.innerHTML = demandHtml;
+}
+
+// Filter trend chart by time period
+function filterTrend(period) {
+    currentTrendPeriod = period;
+
+    document.querySelectorAll('.trend-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    document.querySelector(`[data-trend="${period}"]`).classList.add('active');
+
+    renderTrendChart(period);
+}
+
+function renderTrendChart(period) {
+    const isDark = document.documentElement.getAttribute('data-theme') !== 'light';
+    const bgColor = isDark ? '#1C1C1E' : '#ffffff';
+    const textColor = isDark ? '#ffffff' : '#1a1a1a';
+    const gridColor = isDark ? '#38383A' : '#e0e0e0';
+
+    if (!historyData.dates || historyData.dates.length < 2) {
+        document.getElementById('trendChart').innerHTML = '<div style="padding:60px;text-align:center;color:var(--text-secondary)"><div style="font-size:48px;margin-bottom:16px">📈</div><div>Collecting trend data...</div></div>';
+        return;
+    }
+
+    // Filter data based on period
+    let filteredDates = historyData.dates;
+    let filteredMedians = historyData.medians;
+    let filteredOfficials = historyData.officials;
+    let filteredPremiums = historyData.premiums || [];
+
+    const now = new Date();
+    let cutoffTime;
+
+    switch(period) {
+        case '1h':
+            cutoffTime = new Date(now - 60 * 60 * 1000);
+            break;
+        case '1d':
+            cutoffTime = new Date(now - 24 * 60 * 60 * 1000);
+            break;
+        case '1w':
+            cutoffTime = new Date(now - 7 * 24 * 60 * 60 * 1000);
+            break;
+        case 'all':
+        default:
+            cutoffTime = new Date(0);
+    }
+
+    // Filter arrays
+    const indices = [];
+    filteredDates.forEach((d, i) => {
+        if (new Date(d) >= cutoffTime) indices.push(i);
+    });
+
+    if (indices.length < 2) {
+        document.getElementById('trendChart').innerHTML = '<div style="padding:60px;text-align:center;color:var(--text-secondary)"><div style="font-size:48px;margin-bottom:16px">📈</div><div>Not enough data for this period</div></div>';
+        return;
+    }
+
+    const dates = indices.map(i => filteredDates[i]);
+    const medians = indices.map(i => filteredMedians[i]);
+    const officials = indices.map(i => filteredOfficials[i]);
+    const premiums = indices.map(i => filteredPremiums[i] || 0);
+
+    const lastIdx = medians.length - 1;
+    const lastMedian = medians[lastIdx];
+    const lastOfficial = officials[lastIdx] || 127;
+    const lastPremium = premiums[lastIdx] || 0;
+
+    const trendTraces = [];
+
+    // Official rate (base line)
+    if (officials && officials.some(v => v > 0)) {
+        trendTraces.push({
+            type: 'scatter',
+            mode: 'lines',
+            name: 'Official Rate',
+            x: dates,
+            y: officials,
+            line: { color: '#FF9500', width: 2, dash: 'dot' },
+            hovertemplate: '<b>Official:</b> %{y:.2f} ' + FIAT + '<extra></extra>'
+        });
+    }
+
+    // Black market rate with fill
+    trendTraces.push({
+        type: 'scatter',
+        mode: 'lines',
+        name: 'Black Market Rate',
+        x: dates,
+        y: medians,
+        line: { color: '#00ff9d', width: 3 },
+        fill: 'tonexty',
+        fillcolor: 'rgba(0, 255, 157, 0.15)',
+        hovertemplate: '<b>Black Market:</b> %{y:.2f} ' + FIAT + '<extra></extra>'
+    });
+
+    // EWMA overlays (fast/slow) from the indicator engine
+    if (historyData.ewma && historyData.ewma.dates) {
+        const ewmaIdx = [];
+        historyData.ewma.dates.forEach((d, i) => {
+            if (new Date(d) >= cutoffTime) ewmaIdx.push(i);
+        });
+        const ewmaDates = ewmaIdx.map(i => historyData.ewma.dates[i]);
+        [['fast', 'EWMA 1H', '#00bfff'], ['slow', 'EWMA 24H', '#5856D6']].forEach(([key, label, color]) => {
+            trendTraces.push({
+                type: 'scatter',
+                mode: 'lines',
+                name: label,
+                x: ewmaDates,
+                y: ewmaIdx.map(i => historyData.ewma[key][i]),
+                line: { color: color, width: 1.5 },
+                hovertemplate: '<b>' + label + ':</b> %{y:.2f} ' + FIAT + '<extra></extra>'
+            });
+        });
+    }
+
+    // Premium on secondary axis
+    trendTraces.push({
+        type: 'scatter',
+        mode: 'lines+markers',
+        name: 'Premium %',
+        x: dates,
+        y: premiums,
+        line: { color: '#FF3B30', width: 2, dash: 'dash' },
+        marker: { size: 4 },
+        yaxis: 'y2',
+        hovertemplate: '<b>Premium:</b> %{y:.1f}%<extra></extra>'
+    });
+
+    const allYValues = [...medians, ...officials.filter(v => v > 0)];
+    const minY = Math.floor(Math.min(...allYValues) / 10) * 10 - 10;
+    const maxY = Math.ceil(Math.max(...allYValues) / 10) * 10 + 20;
+
+    const maxPremium = Math.max(...premiums) + 5;
+
+    const trendLayout = {
+        paper_bgcolor: bgColor,
+        plot_bgcolor: bgColor,
+        font: { color: textColor, family: '-apple-system, BlinkMacSystemFont, sans-serif' },
+        showlegend: true,
+        legend: { orientation: 'h', y: -0.18 },
+        margin: { l: 60, r: 60, t: 20, b: 70 },
+        xaxis: {
+            gridcolor: gridColor,
+            tickformat: period === '1h' ? '%H:%M' : '%m/%d %H:%M'
+        },
+        yaxis: {
+            title: 'Rate (' + FIAT + ')',
+            gridcolor: gridColor,
+            zerolinecolor: gridColor,
+            range: [minY, maxY],
+            dtick: 10
+        },
+        yaxis2: {
+            title: 'Premium (%)',
+            overlaying: 'y',
+            side: 'right',
+            showgrid: false,
+            range: [0, maxPremium],
+            ticksuffix: '%'
+        },
+        hovermode: 'x unified',
+        annotations: [
+            {
+                x: dates[lastIdx],
+                y: lastMedian,
+                xanchor: 'left',
+                yanchor: 'middle',
+                text: '<b>' + lastMedian.toFixed(1) + '</b>',
+                font: { color: '#00ff9d', size: 12 },
+                showarrow: false,
+                xshift: 10,
+                bgcolor: 'rgba(0,0,0,0.7)',
+                borderpad: 4
+            },
+            {
+                x: dates[lastIdx],
+                y: lastPremium,
+                xanchor: 'left',
+                yanchor: 'middle',
+                xref: 'x',
+                yref: 'y2',
+                text: '<b>' + lastPremium.toFixed(1) + '%</b>',
+                font: { color: '#FF3B30', size: 11 },
+                showarrow: false,
+                xshift: 10,
+                bgcolor: 'rgba(0,0,0,0.7)',
+                borderpad: 4
+            }
+        ]
+    };
+
+    Plotly.newPlot('trendChart', trendTraces, trendLayout, {responsive: true, displayModeBar: false});
+}
+
+function initCharts() {
+    const isDark = document.documentElement.getAttribute('data-theme') !== 'light';
+    const bgColor = isDark ? '#1C1C1E' : '#ffffff';
+    const textColor = isDark ? '#ffffff' : '#1a1a1a';
+    const gridColor = isDark ? '#38383A' : '#e0e0e0';
+
+    const scatterTraces = [];
+    const colors = {
+        'BINANCE': '#F3BA2F',
+        'MEXC': '#2E55E6', 
+        'OKX': '#A855F7'
+    };
+
+    let allPrices = [];
+    let xIndex = 0;
+    const exchangeOrder = ['BINANCE', 'MEXC', 'OKX'];
+    const exchangeNames = [];
+
+    for (const exchange of exchangeOrder) {
+        const prices = chartData[exchange];
+        if (prices && prices.length > 0) {
+            allPrices = allPrices.concat(prices);
+            exchangeNames.push(exchange);
+
+            const xPositions = prices.map(() => xIndex + (Math.random() - 0.5) * 0.6);
+            scatterTraces.push({
+                type: 'scatter',
+                mode: 'markers',
+                name: exchange,
+                x: xPositions,
+                y: prices,
+                marker: { 
+                    color: colors[exchange] || '#00C805',
+                    size: 10,
+                    opacity: 0.75,
+                    line: { color: 'rgba(255,255,255,0.5)', width: 1 }
+                },
+                hovertemplate: '<b>%{y:.2f} ' + FIAT + '</b><extra>' + exchange + '</extra>'
+            });
+            xIndex++;
+        }
+    }
+
+    if (allPrices.length > 0) {
+        const sortedAll = [...allPrices].sort((a, b) => a - b);
+        const overallMedian = sortedAll[Math.floor(sortedAll.length / 2)];
+
+        scatterTraces.push({
+            type: 'scatter',
+            mode: 'lines',
+            name: 'Median: ' + overallMedian.toFixed(2) + ' ' + FIAT,
+            x: [-0.5, exchangeNames.length - 0.5],
+            y: [overallMedian, overallMedian],
+            line: { color: '#00ff9d', width: 3, dash: 'solid' },
+            hoverinfo: 'name'
+        });
+    }
+
+    const minPrice = allPrices.length > 0 ? Math.min(...allPrices) - 5 : 130;
+    const maxPrice = allPrices.length > 0 ? Math.max(...allPrices) + 5 : 190;
+
+    const scatterLayout = {
+        paper_bgcolor: bgColor,
+        plot_bgcolor: bgColor,
+        font: { color: textColor, family: '-apple-system, BlinkMacSystemFont, sans-serif' },
+        showlegend: true,
+        legend: { orientation: 'h', y: -0.15 },
+        margin: { l: 60, r: 30, t: 30, b: 60 },
+        yaxis: {
+            title: 'Price (' + FIAT + ')',
+            gridcolor: gridColor,
+            zerolinecolor: gridColor,
+            range: [minPrice, maxPrice],
+            dtick: 5
+        },
+        xaxis: {
+            gridcolor: gridColor,
+            tickmode: 'array',
+            tickvals: exchangeNames.map((_, i) => i),
+            ticktext: exchangeNames,
+            range: [-0.5, Math.max(exchangeNames.length - 0.5, 0.5)]
+        }
+    };
+
+    Plotly.newPlot('priceDistChart', scatterTraces, scatterLayout, {responsive: true, displayModeBar: false});
+
+    // Render trend chart with default period
+    renderTrendChart(currentTrendPeriod);
+
+    // Render market depth
+    renderMarketDepth();
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    loadData();
+    setInterval(loadData, DATA_POLL_MS);
+    connectLive();
+});
+
+// Live events from the push server (main.py --push-port) when the page was built with ETB_PUSH_URL.
+// EventSource reconnects on its own and sends Last-Event-ID, so missed events are replayed.
+function connectLive() {
+    const pushUrl = document.body.dataset.pushUrl;
+    if (!pushUrl || !window.EventSource) return;
+
+    const source = new EventSource(pushUrl + '/events?market=' + encodeURIComponent(FIAT));
+    source.addEventListener('trade', function(e) {
+        const trade = JSON.parse(e.data);
+        const seen = allTrades.some(t => t.timestamp === trade.timestamp && t.user === trade.user && t.type === trade.type);
+        if (seen) return;
+        allTrades.push(trade);
+        filterTrades(currentPeriod);
+    });
+    source.addEventListener('rate', function(e) {
+        const rate = JSON.parse(e.data);
+        const value = document.querySelector('.price-value');
+        if (value && value.firstChild) value.firstChild.textContent = rate.median.toFixed(2) + ' ';
+    });
+}
+
+function toggleTheme() {
+    const html = document.documentElement;
+    const current = html.getAttribute('data-theme');
+    const next = current === 'light' ? 'dark' : 'light';
+    html.setAttribute('data-theme', next);
+    localStorage.setItem('theme', next);
+    document.getElementById('theme-icon').textContent = next === 'light' ? '☀️' : '🌙';
+    initCharts();
+}
+
+(function() {
+    const theme = localStorage.getItem('theme') || 'dark';
+    document.documentElement.setAttribute('data-theme', theme);
+    document.getElementById('theme-icon').textContent = theme === 'light' ? '☀️' : '🌙';
+})();
+
+function filterBySource(source) {
+    currentSource = source;
+
+    document.querySelectorAll('.source-filter-btn').forEach(btn => {
+        if (btn.dataset.source === source) {
+            btn.style.background = 'var(--accent)';
+            btn.style.color = 'white';
+            btn.style.border = 'none';
+        } else {
+            btn.style.background = 'transparent';
+            btn.style.color = 'var(--text-secondary)';
+            btn.style.border = '1px solid var(--border)';
+        }
+    });
+
+    filterTrades(currentPeriod);
+}
+
+function filterTrades(period) {
+    currentPeriod = period;
+
+    document.querySelectorAll('.time-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    document.querySelector(`[data-period="${period}"]`).classList.add('active');
+
+    const now = Date.now() / 1000;
+    let cutoff = 0;
+
+    switch(period) {
+        case '1h': cutoff = now - 3600; break;
+        case '1d': cutoff = now - 86400; break;
+        case '1w': cutoff = now - 604800; break;
+        case 'live':
+        default: cutoff = 0;
+    }
+
+    let filtered = allTrades.filter(t => {
+        return t.timestamp > cutoff && 
+               (t.type === 'buy' || t.type === 'sell' || t.type === 'request' || t.type === 'arbitrage' || t.type === 'anomaly');
+    });
+
+    if (currentSource !== 'all') {
+        filtered = filtered.filter(t => t.source.toUpperCase() === currentSource.toUpperCase());
+    }
+
+    renderFeed(filtered);
+
+    const buys = filtered.filter(t => t.type === 'buy').length;
+    const sells = filtered.filter(t => t.type === 'sell').length;
+    document.getElementById('feedStats').innerHTML = 
+        '<span style="color:var(--green)">🟢 ' + buys + ' Buys</span> • <span style="color:var(--red)">🔴 ' + sells + ' Sells</span>';
+}
+
+// Feed is paged: only FEED_PAGE_SIZE items become DOM at a time, older pages append on scroll
+let feedTrades = [];
+let feedShown = 0;
+
+function feedPageSize() {
+    return parseInt(document.getElementById('feedContainer').dataset.pageSize, 10) || 50;
+}
+
+function renderFeed(trades) {
+    const container = document.getElementById('feedContainer');
+
+    if (trades.length === 0) {
+        feedTrades = [];
+        feedShown = 0;
+        container.innerHTML = '<div style="padding:20px;text-align:center;color:var(--text-secondary)">No trades in this period</div>';
+        return;
+    }
+
+    feedTrades = trades.slice().sort((a, b) => b.timestamp - a.timestamp);
+    feedShown = 0;
+    container.innerHTML = '';
+    appendFeedPage();
+}
+
+function appendFeedPage() {
+    const container = document.getElementById('feedContainer');
+    const more = container.querySelector('.feed-more');
+    if (more) more.remove();
+
+    const page = feedTrades.slice(feedShown, feedShown + feedPageSize());
+    container.insertAdjacentHTML('beforeend', page.map(renderFeedItem).join(''));
+    feedShown += page.length;
+
+    const remaining = feedTrades.length - feedShown;
+    if (remaining > 0) {
+        container.insertAdjacentHTML('beforeend',
+            '<div class="feed-more" onclick="appendFeedPage()">Load ' + Math.min(remaining, feedPageSize()) + ' more (' + remaining + ' older)</div>');
+    }
+}
+
+document.getElementById('feedContainer').addEventListener('scroll', function() {
+    if (feedShown < feedTrades.length && this.scrollTop + this.clientHeight >= this.scrollHeight - 100) {
+        appendFeedPage();
+    }
+});
+
+function renderFeedItem(trade) {
+    const date = new Date(trade.timestamp * 1000);
+    const time = date.toLocaleTimeString('en-US', {hour: '2-digit', minute: '2-digit'});
+    const ageMin = Math.floor((Date.now() / 1000 - trade.timestamp) / 60);
+    const age = ageMin < 60 ? ageMin + 'm ago' : Math.floor(ageMin/60) + 'h ago';
+
+    let icon, action, color;
+
+    if (trade.type === 'anomaly') {
+        return `
+        <div class="feed-item">
+            <div class="feed-icon" style="background:rgba(255,59,48,0.15);color:var(--red)">🚨</div>
+            <div class="feed-content">
+                <div class="feed-meta">
+                    <span>${time}</span>
+                    <span>${age}</span>
+                </div>
+                <div class="feed-text">
+                    <b style="color:var(--red)">ANOMALY</b>
+                    <span class="feed-user">${trade.reason || trade.user}</span>
+                    @ <span class="feed-price">${trade.price.toFixed(2)} ${FIAT}</span>
+                </div>
+            </div>
+        </div>
+    `;
+    }
+
+    if (trade.type === 'arbitrage') {
+        return `
+        <div class="feed-item">
+            <div class="feed-icon" style="background:rgba(255,149,0,0.15);color:var(--orange)">⚖️</div>
+            <div class="feed-content">
+                <div class="feed-meta">
+                    <span>${time}</span>
+                    <span>${age}</span>
+                </div>
+                <div class="feed-text">
+                    <b style="color:var(--orange)">ARBITRAGE</b>
+                    <span class="feed-user">${trade.user}</span>
+                    <span class="feed-amount">${trade.vol_usd.toFixed(0)} USDT</span>
+                    @ <span class="feed-price">${trade.price.toFixed(2)} → ${(trade.sell_price || 0).toFixed(2)} ${FIAT}</span>
+                    <span style="color:var(--orange);font-weight:600">(+${(trade.spread_pct || 0).toFixed(2)}%)</span>
+                </div>
+            </div>
+        </div>
+    `;
+    }
+
+    if (trade.type === 'request') {
+        const requestType = trade.request_type || 'REQUEST';
+        const isBuyRequest = requestType.includes('BUY');
+        icon = isBuyRequest ? '➕' : '➖';
+        action = requestType;
+        color = isBuyRequest ? 'var(--green)' : 'var(--red)';
+    } else {
+        const isBuy = trade.type === 'buy';
+        icon = isBuy ? '↗' : '↘';
+        action = isBuy ? 'BOUGHT' : 'SOLD';
+        color = isBuy ? 'var(--green)' : 'var(--red)';
+    }
+
+    let sourceColor, sourceEmoji;
+    if (trade.source === 'BINANCE') {
+        sourceColor = '#F3BA2F';
+        sourceEmoji = '🟡';
+    } else if (trade.source === 'MEXC') {
+        sourceColor = '#2E55E6';
+        sourceEmoji = '🔵';
+    } else {
+        sourceColor = '#A855F7';
+        sourceEmoji = '🟣';
+    }
+
+    return `
+        <div class="feed-item">
+            <div class="feed-icon ${trade.type}">
+                ${icon}
+            </div>
+            <div class="feed-content">
+                <div class="feed-meta">
+                    <span>${time}</span>
+                    <span>${age}</span>
+                </div>
+                <div class="feed-text">
+                    ${sourceEmoji} <span class="feed-user">${trade.user.substring(0, 15)}</span>
+                    <span style="color:${sourceColor};font-weight:600">(${trade.source})</span>
+                    <b style="color:${color}">${action}</b>
+                    <span class="feed-amount">${trade.vol_usd.toFixed(0)} USDT</span>
+                    @ <span class="feed-price">${trade.price.toFixed(2)} ${FIAT}</span>
+                </div>
+            </div>
+        </div>
+    `;
+}
@@ -0,0 +1,50 @@
+"""Checks for the streaming anomaly detector in main.py (run with: python -m pytest -q)"""
+import main
+
+
+def book(counts, price=180.0, available=100.0):
+    """A snapshot with counts[source] SELL ads per source, all at one price and size"""
+    return [
+        {'source': source, 'ad_type': 'SELL', 'advertiser': f"{source}{i}", 'price': price, 'available': available}
+        for source, n in counts.items() for i in range(n)
+    ]
+
+
+def warm_up(state, counts, snapshots=main.ANOMALY_MIN_SAMPLES + 2):
+    ts = 1000.0
+    for _ in range(snapshots):
+        assert main.detect_anomalies(state, book(counts), 1.0, ts) == []
+        ts += 60
+    return ts
+
+
+def test_flat_series_then_step_alerts():
+    state = {}
+    ts = warm_up(state, {'BINANCE': 20, 'OKX': 20})
+
+    events = main.detect_anomalies(state, book({'BINANCE': 20, 'OKX': 6}), 1.0, ts)
+
+    metrics = {event['metric'] for event in events}
+    assert "ads|OKX" in metrics
+    assert "ads|BINANCE" not in metrics
+    okx = next(event for event in events if event['metric'] == "ads|OKX")
+    assert okx['change_pct'] == -70
+    assert okx['zscore'] <= -main.ANOMALY_Z
+
+
+def test_vanished_source_reads_as_pulled_liquidity():
+    state = {}
+    ts = warm_up(state, {'BINANCE': 20, 'OKX': 20})
+
+    events = main.detect_anomalies(state, book({'BINANCE': 20}), 1.0, ts)
+
+    metrics = {event['metric'] for event in events}
+    assert {"depth|OKX|SELL", "ads|OKX"} <= metrics
+    assert state["depth|OKX|SELL"]['values'][-1] == 0
+
+
+def test_empty_snapshot_is_not_a_pull():
+    state = {}
+    ts = warm_up(state, {'BINANCE': 20, 'OKX': 20})
+
+    assert main.detect_anomalies(state, [], 1.0, ts) == []
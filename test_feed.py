@@ -0,0 +1,53 @@
+"""Round-trip checks for the columnar trade feed in main.py (run with: python -m pytest -q)"""
+import json
+
+import main
+
+
+def round_trip(events):
+    """Encode, push through JSON like the published chunk, decode"""
+    return main.decode_trade_columns(json.loads(json.dumps(main.encode_trade_columns(events))))
+
+
+def test_round_trip_preserves_events():
+    events = [
+        {'type': 'buy', 'source': 'BINANCE', 'user': 'alice', 'timestamp': 1700000000, 'price': 181.25, 'vol_usd': 500},
+        {'type': 'sell', 'source': 'OKX', 'user': 'bob', 'timestamp': 1700000060, 'price': 179.5, 'vol_usd': 1200,
+         'reason': 'partial_fill', 'confidence': 'high'},
+        {'type': 'arbitrage', 'source': 'MEXC', 'user': 'MEXC → OKX', 'timestamp': 1700000060, 'price': 178.0, 'vol_usd': 40,
+         'sell_source': 'OKX', 'sell_price': 180.1, 'spread_pct': 1.1798},
+        {'type': 'buy', 'source': 'BINANCE', 'user': 'alice', 'timestamp': 1700000120, 'price': 181.25, 'vol_usd': 0}
+    ]
+
+    assert round_trip(events) == events
+
+
+def test_round_trip_nulls_and_mixed_extra_columns():
+    events = [
+        {'type': 'anomaly', 'source': 'MARKET', 'user': 'Median rate', 'timestamp': 1700000000, 'price': 180.0, 'vol_usd': 0,
+         'zscore': None, 'detail': 'flat'},
+        {'type': 'anomaly', 'source': 'OKX', 'user': 'OKX ad count', 'timestamp': 1700000300, 'price': 180.0, 'vol_usd': 0,
+         'zscore': -4.5, 'detail': 7},
+        {'type': 'anomaly', 'source': 'OKX', 'user': 'OKX ad count', 'timestamp': 1700000600, 'price': 180.0, 'vol_usd': 0,
+         'detail': None}
+    ]
+
+    assert round_trip(events) == events
+
+
+def test_round_trip_rounds_to_feed_precision():
+    events = [
+        {'type': 'buy', 'source': 'BINANCE', 'user': 'alice', 'timestamp': 1700000000.9, 'price': 181.256, 'vol_usd': 499.6,
+         'spread_pct': 0.123456},
+        {'type': 'sell', 'source': 'OKX', 'user': 'bob', 'timestamp': 1700000030, 'price': None, 'vol_usd': None}
+    ]
+
+    decoded = round_trip(events)
+
+    assert decoded[0]['timestamp'] == 1700000000
+    assert decoded[0]['price'] == round(181.256, 2)
+    assert decoded[0]['vol_usd'] == 500
+    assert decoded[0]['spread_pct'] == 0.1235
+    assert decoded[1]['price'] == 0
+    assert decoded[1]['vol_usd'] == 0
+    assert decoded[1]['timestamp'] == 1700000030